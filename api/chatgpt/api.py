@@ -1,8 +1,13 @@
 import os
 import json
+import threading
+import time
 import openai
 from core import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
+from api.streaming import InferenceStream
+from api.inference_result import InferenceResult
+from api.client_registry import get_client_registry
 
 class ChatGPTAdapter:
     """Adapter for interacting with OpenAI's Chat Completion API."""
@@ -17,11 +22,20 @@ class ChatGPTAdapter:
         # ... (implementation unchanged) ...
         api_key = os.environ.get("OPENAI_API_KEY");
         if not api_key: logging.logger.error("OPENAI_API_KEY needed"); return None
-        try: client=openai.Client(api_key=api_key); logging.logger.debug("OpenAI client created"); return client
+        base_url = self.api_config.get("base_url") # Optional: an OpenAI-compatible server (or a local stub for testing)
+        # Shared with every other user of this key/base URL, over one pooled connection set (api/client_registry.py)
+        try: client=get_client_registry().openai_client(api_key, base_url, self.api_config.get("http_pool")); logging.logger.debug("OpenAI client ready"); return client
         except Exception as e: logging.logger.exception("Failed init OpenAI client"); return None
 
-    def run_inference(self, request_data: dict) -> str:
-        """ Processes the inference request using parameters from request_data. """
+    # Keys of a Voidframe message that the Chat Completions API accepts; everything else ("files", ids, ...) is dropped
+    MESSAGE_FIELDS = ("role", "content", "name", "tool_calls", "tool_call_id")
+
+    def _translate_message(self, msg: dict) -> dict:
+        """ OpenAI message dict for one Voidframe message (a plain field copy; cheaper to redo than to cache). """
+        return {key: msg[key] for key in self.MESSAGE_FIELDS if msg.get(key) is not None}
+
+    def _build_request_kwargs(self, request_data: dict) -> Dict[str, Any]:
+        """ Chat completion arguments from request_data; shared by run_inference and run_inference_stream. """
         if not self.client: raise ConnectionError("OpenAI client not initialized.")
 
         # --- Extract Model and Parameters DIRECTLY from request_data ---
@@ -31,6 +45,7 @@ class ChatGPTAdapter:
         top_p = request_data.get("top_p")
         max_tokens = request_data.get("max_output_tokens") # Use the key provided in request_data
         messages_for_api = request_data.get("messages", [])
+        request_timeout = request_data.get("request_timeout") # Remaining latency budget (seconds), set by DataRouter
         # Add others as needed: presence_penalty = request_data.get("presence_penalty")
 
         # --- Validation / Type Conversion (Essential Here) ---
@@ -50,28 +65,151 @@ class ChatGPTAdapter:
         logging.logger.debug(f"ChatGPT Adapter: Using model='{model_name}', temp={temperature}, max_tokens={max_tokens}")
 
         # Tool Processing (Deferred)
+        messages_for_api = [self._translate_message(msg) for msg in messages_for_api]
+        kwargs = {"model": model_name, "messages": messages_for_api, "temperature": temperature, "top_p": top_p, "max_tokens": max_tokens}
+        if request_timeout is not None: kwargs["timeout"] = float(request_timeout)
+        return kwargs
+
+    def run_inference(self, request_data: dict) -> InferenceResult:
+        """ Processes the inference request using parameters from request_data. Returns the text with its usage and latency. """
+        kwargs = self._build_request_kwargs(request_data)
 
         # --- API Call ---
         try:
-            logging.logger.debug(f"Calling OpenAI API: model={model_name}")
-            response = self.client.chat.completions.create(
-                model=model_name,
-                messages=messages_for_api,
-                temperature=temperature,
-                top_p=top_p,
-                max_tokens=max_tokens,
-                # Add other parameters here
-            )
-
-            # Response Handling (unchanged)
+            logging.logger.debug(f"Calling OpenAI API: model={kwargs['model']}")
+            started = time.monotonic()
+            response = self.client.chat.completions.create(**kwargs)
+            latency = time.monotonic() - started
+
+            # Response Handling
             response_content = response.choices[0].message.content
             logging.logger.debug("OpenAI Response received.")
-            return response_content.strip() if response_content else ""
+            return InferenceResult(response_content.strip() if response_content else "", self._usage_to_dict(getattr(response, "usage", None)),
+                                   response.choices[0].finish_reason, getattr(response, "model", None), latency)
+
+        except Exception as e: raise self._wrap_api_error(e, kwargs.get("timeout")) from e
+
+    def run_inference_stream(self, request_data: dict, cancel_event: Optional[threading.Event] = None) -> InferenceStream:
+        """
+        Streaming variant of run_inference (stream=True, with usage reported in the final chunk).
+        Returns an InferenceStream of text deltas; after it is exhausted, .usage and .finish_reason are set.
+        Cancelling closes the HTTP response, so the server stops generating (and billing) right away.
+        """
+        kwargs = self._build_request_kwargs(request_data)
+
+        def produce(cancel: threading.Event):
+            logging.logger.debug(f"Calling OpenAI API (streaming): model={kwargs['model']}")
+            usage = None; finish_reason = None; model = None; chunks = 0; text_length = 0; response = None
+            try:
+                response = self.client.chat.completions.create(**kwargs, stream=True, stream_options={"include_usage": True})
+                stream.on_cancel(response.close) # Also unblocks a read waiting for the next chunk
+                for chunk in response:
+                    chunks += 1
+                    model = getattr(chunk, "model", None) or model
+                    if getattr(chunk, "usage", None) is not None: usage = chunk.usage # Only on the final (choice-less) chunk
+                    for choice in chunk.choices or []:
+                        if choice.index != 0: continue
+                        if choice.finish_reason: finish_reason = choice.finish_reason
+                        content = getattr(choice.delta, "content", None) if choice.delta else None
+                        if not content: continue
+                        if not text_length: content = content.lstrip() # Match run_inference's strip()
+                        if not content: continue
+                        text_length += len(content)
+                        yield content
+                    if cancel.is_set(): break
+            except GeneratorExit:
+                raise
+            except Exception as e:
+                if not cancel.is_set(): raise self._wrap_api_error(e, kwargs.get("timeout")) from e
+                logging.logger.debug(f"OpenAI stream read ended by cancellation: {type(e).__name__}")
+            finally:
+                if response is not None: response.close()
+            if cancel.is_set() and finish_reason is None:
+                finish_reason = "cancelled"
+                logging.logger.info(f"OpenAI stream cancelled after {chunks} chunks.")
+            elif finish_reason == "length":
+                logging.logger.warning(f"OpenAI response truncated at max_tokens={kwargs['max_tokens']}.")
+            elif finish_reason == "content_filter":
+                logging.logger.warning("OpenAI response stopped by the content filter.")
+            elif finish_reason is None:
+                # Connection dropped before the final chunk: whatever arrived is incomplete
+                raise ConnectionError(f"OpenAI stream ended without a finish reason after {chunks} chunks.")
+            logging.logger.debug(f"OpenAI stream finished. Chunks: {chunks}, text length: {text_length}, finish reason: {finish_reason}")
+            return {"usage": self._usage_to_dict(usage), "finish_reason": finish_reason, "model_version": model, "chunks": chunks}
+
+        stream = InferenceStream(produce, cancel_event)
+        return stream
+
+    # --- Batch jobs (core/batch_jobs.py) ---
+    BATCH_ENDPOINT = "/v1/chat/completions"
+    BATCH_STATES = {"validating": "pending", "in_progress": "running", "finalizing": "running", "cancelling": "running",
+                    "completed": "succeeded", "failed": "failed", "expired": "expired", "cancelled": "cancelled"}
+
+    def submit_batch(self, requests: List[Tuple[str, dict]], display_name: str) -> Dict[str, Any]:
+        """ Uploads the requests as a JSONL input file and creates a batch job over it (24h completion window). """
+        lines = []
+        for request_id, request_data in requests:
+            body = self._build_request_kwargs(request_data)
+            body.pop("timeout", None) # Client-side only; batch requests have no latency budget
+            lines.append(json.dumps({"custom_id": request_id, "method": "POST", "url": self.BATCH_ENDPOINT, "body": body}, ensure_ascii=False))
+        try:
+            input_file = self.client.files.create(file=(f"{display_name}.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch")
+            batch = self.client.batches.create(input_file_id=input_file.id, endpoint=self.BATCH_ENDPOINT, completion_window="24h",
+                                               metadata={"display_name": display_name})
+        except Exception as e: raise self._wrap_api_error(e) from e
+        logging.logger.debug(f"OpenAI batch {batch.id} created from input file {input_file.id} ({len(lines)} requests).")
+        return {"provider_job_id": batch.id, "state": self.BATCH_STATES.get(batch.status, "pending"), "input_file_id": input_file.id}
+
+    def get_batch_status(self, provider_job_id: str) -> Dict[str, Any]:
+        try: batch = self.client.batches.retrieve(provider_job_id)
+        except Exception as e: raise self._wrap_api_error(e) from e
+        counts = getattr(batch, "request_counts", None)
+        errors = [getattr(error, "message", None) or str(error) for error in (getattr(getattr(batch, "errors", None), "data", None) or [])]
+        return {"state": self.BATCH_STATES.get(batch.status, "running"), "status": batch.status,
+                "request_counts": {key: getattr(counts, key, None) for key in ("total", "completed", "failed")} if counts else None,
+                "output_file_id": batch.output_file_id, "error_file_id": batch.error_file_id, "error": "; ".join(errors) or None}
+
+    def fetch_batch_results(self, provider_job_id: str) -> Dict[str, Dict[str, str]]:
+        """ Results by custom_id from the batch's output and error files. """
+        try:
+            batch = self.client.batches.retrieve(provider_job_id)
+            contents = [self.client.files.content(file_id).text for file_id in (batch.error_file_id, batch.output_file_id) if file_id]
+        except Exception as e: raise self._wrap_api_error(e) from e
+        results = {}
+        for line in "\n".join(contents).splitlines():
+            if not line.strip(): continue
+            try: entry = json.loads(line)
+            except ValueError: logging.logger.warning(f"Skipping unreadable line in OpenAI batch {provider_job_id} output."); continue
+            response = entry.get("response") or {}
+            body = response.get("body") or {}
+            error = entry.get("error") or body.get("error")
+            if error or response.get("status_code", 200) >= 400:
+                results[entry.get("custom_id")] = {"error": (error or {}).get("message") or f"HTTP {response.get('status_code')}"}
+                continue
+            try: content = body["choices"][0]["message"]["content"] or ""
+            except (KeyError, IndexError, TypeError): results[entry.get("custom_id")] = {"error": "Response has no message content."}; continue
+            results[entry.get("custom_id")] = {"text": content.strip()} # Match run_inference's strip()
+        return results
+
+    def cancel_batch(self, provider_job_id: str):
+        try: self.client.batches.cancel(provider_job_id)
+        except Exception as e: raise self._wrap_api_error(e) from e
+
+    @staticmethod
+    def _usage_to_dict(usage) -> Optional[Dict[str, Any]]:
+        if usage is None: return None
+        result = {key: getattr(usage, key, None) for key in ("prompt_tokens", "completion_tokens", "total_tokens")}
+        cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+        if cached is not None: result["cached_tokens"] = cached
+        return result
 
-        # Exception Handling (unchanged)
-        except openai.APIConnectionError as e: raise ConnectionError(f"OpenAI connection error: {e}") from e
+    @staticmethod
+    def _wrap_api_error(e: Exception, request_timeout: Optional[float] = None) -> Exception:
+        """ Maps an exception raised around an OpenAI call to the exception the adapter raises. """
+        if isinstance(e, openai.APITimeoutError): return TimeoutError(f"OpenAI request timed out (budget {request_timeout}s): {e}")
+        if isinstance(e, openai.APIConnectionError): return ConnectionError(f"OpenAI connection error: {e}")
         # ... other specific openai exceptions ...
-        except Exception as e: raise RuntimeError(f"OpenAI API Error: {e}") from e
+        return RuntimeError(f"OpenAI API Error: {e}")
 
 
     def update_config(self, new_api_config: dict):
@@ -0,0 +1,129 @@
+import hashlib
+import importlib.util
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from core import logging
+try:
+    import httpx
+except ImportError: # The SDKs then fall back to their own per-client connection handling
+    httpx = None
+
+# Pool settings; the "http_pool" section of an adapter's config.json overrides them for that provider.
+DEFAULT_POOL_SETTINGS = {
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 30.0, # seconds an idle keep-alive connection is kept; httpx drops expired ones on the next request
+    "http2": True, # Only used when the h2 package is installed
+    "connect_timeout": 10.0,
+    "read_timeout": 600.0, # Default per-call budget; request_timeout in request_data still overrides it per call
+}
+
+ClientKey = Tuple[str, str, str] # (provider, API key fingerprint, base URL)
+
+class ClientRegistry:
+    """
+    Shares SDK clients between everything that talks to the same provider account: an adapter, its upload
+    service and its context cache all get the same client for the same (provider, API key, base URL), so
+    keep-alive connections are reused instead of each component paying connection and TLS setup again.
+    Each client is backed by its own httpx connection pool (HTTP/2 when the h2 package is installed) sized
+    by the "http_pool" settings. httpx clients are thread-safe, so worker threads share them freely, and
+    httpx itself never hands out a connection idle for longer than "keepalive_expiry", so a socket the
+    server dropped during a quiet period is not tried again.
+    """
+    def __init__(self):
+        self._entries: Dict[ClientKey, dict] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(provider: str, api_key: str, base_url: Optional[str]) -> ClientKey:
+        return provider, hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16], (base_url or "").rstrip("/")
+
+    @staticmethod
+    def pool_settings(overrides: Optional[dict] = None) -> dict:
+        return dict(DEFAULT_POOL_SETTINGS, **(overrides or {}))
+
+    @staticmethod
+    def _use_http2(settings: dict) -> bool:
+        return httpx is not None and bool(settings["http2"]) and importlib.util.find_spec("h2") is not None
+
+    def _build_http_client(self, settings: dict):
+        """A pooled httpx.Client for one SDK client, or None without httpx."""
+        if httpx is None: return None
+        limits = httpx.Limits(max_connections=int(settings["max_connections"]), max_keepalive_connections=int(settings["max_keepalive_connections"]),
+                              keepalive_expiry=float(settings["keepalive_expiry"]))
+        timeout = httpx.Timeout(float(settings["read_timeout"]), connect=float(settings["connect_timeout"]))
+        return httpx.Client(transport=httpx.HTTPTransport(http2=self._use_http2(settings), limits=limits), timeout=timeout)
+
+    def get(self, provider: str, api_key: str, base_url: Optional[str], factory: Callable[[Any], Any], pool_settings: Optional[dict] = None):
+        """
+        The shared client for (provider, api_key, base_url), created on first request by factory(http_client),
+        where http_client is the pooled httpx.Client to hand to the SDK (None when httpx is unavailable).
+        """
+        if not api_key: raise ValueError(f"An API key is required for a {provider} client.")
+        key = self._key(provider, api_key, base_url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None: return entry["client"]
+            settings = self.pool_settings(pool_settings)
+            http_client = self._build_http_client(settings)
+            try:
+                client = factory(http_client)
+            except Exception:
+                if http_client is not None: http_client.close()
+                raise
+            self._entries[key] = {"client": client, "http_client": http_client, "created_at": time.time()}
+        logging.logger.info(f"Created shared {provider} client (base URL {key[2] or 'default'}, pool {settings['max_connections']} connections, "
+                            f"HTTP/2 {'on' if self._use_http2(settings) else 'off'}{'' if http_client is not None else ', httpx unavailable: SDK default pool'}).")
+        return client
+
+    def openai_client(self, api_key: str, base_url: Optional[str] = None, pool_settings: Optional[dict] = None):
+        import openai
+        return self.get("openai", api_key, base_url, lambda http_client: openai.Client(api_key=api_key, base_url=base_url or None, http_client=http_client), pool_settings)
+
+    def genai_client(self, api_key: str, base_url: Optional[str] = None, pool_settings: Optional[dict] = None):
+        from google import genai
+        from google.genai import types as genai_types
+        def create(http_client):
+            options = {key: value for key, value in (("base_url", base_url), ("httpx_client", http_client)) if value}
+            return genai.Client(api_key=api_key, http_options=genai_types.HttpOptions(**options) if options else None)
+        return self.get("gemini", api_key, base_url, create, pool_settings)
+
+    @staticmethod
+    def _pool_connections(http_client) -> list:
+        """
+        A snapshot of the connections in http_client's pool, read through httpx/httpcore internals for
+        diagnostics only; empty when they are unavailable (no httpx, or a version laid out differently).
+        """
+        pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+        try: return list(getattr(pool, "connections", None) or [])
+        except Exception: return []
+
+    def stats(self) -> Dict[str, dict]:
+        """Connection counts per shared client, for diagnostics."""
+        with self._lock: entries = list(self._entries.items())
+        stats = {}
+        for (provider, fingerprint, base_url), entry in entries:
+            connections = [c for c in self._pool_connections(entry["http_client"]) if not getattr(c, "is_closed", lambda: False)()] # Closed ones are pruned on next use
+            stats[f"{provider}:{fingerprint[:8]}@{base_url or 'default'}"] = {
+                "connections": len(connections), "idle": sum(1 for c in connections if getattr(c, "is_idle", lambda: False)()), "created_at": entry["created_at"]}
+        return stats
+
+    def close_all(self):
+        """Closes every shared client's connections (on application exit). Clients requested later are created anew."""
+        with self._lock: entries, self._entries = list(self._entries.values()), {}
+        for entry in entries:
+            if entry["http_client"] is not None:
+                try: entry["http_client"].close()
+                except Exception as e: logging.logger.warning(f"Error closing HTTP client: {e}")
+        if entries: logging.logger.info(f"Closed {len(entries)} shared API client(s).")
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_client_registry() -> ClientRegistry:
+    """The process-wide ClientRegistry, created on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None: _registry = ClientRegistry()
+        return _registry
@@ -1,6 +1,9 @@
 import os
 import json
 import inspect # *** Import inspect ***
+import itertools
+import threading
+import time
 from google import genai
 try:
     from google.genai import types as genai_types
@@ -22,6 +25,12 @@ except ImportError:
 
 from core import logging # Import the base logging setup
 from typing import Dict, Any, Optional, List, Union # Added Union
+from api.streaming import InferenceStream
+from api.inference_result import InferenceResult
+from api.translation_cache import TranslationCache
+from api.gemini.context_cache import GeminiContextCache
+from api.gemini.upload_manager import get_upload_service, is_file_error
+from api.client_registry import get_client_registry
 
 class GeminiAdapter:
     def __init__(self, api_config: dict, projects_base_path: str):
@@ -29,29 +38,11 @@ class GeminiAdapter:
         self.projects_base_path = projects_base_path
         # Ensure genai_client type hint is valid or Any
         self.client: Optional[Union[genai_client.Client, Any]] = self._initialize_client()
+        self.translation_cache = TranslationCache(api_config.get("translation_cache_size"))
+        self.context_cache = GeminiContextCache(self.client, api_config) if self.client else None
         # Use logger instance
         logging.logger.info("Gemini Adapter Initialized (using Client pattern)")
-
-        # *** Add Inspection Code (Keep this for debugging if needed) ***
-        if self.client and hasattr(self.client, 'models') and hasattr(self.client.models, 'generate_content'):
-            try:
-                sig = inspect.signature(self.client.models.generate_content)
-                # Use logger instance
-                logging.logger.info(f"Detected signature for client.models.generate_content: {sig}")
-                # print(f"DEBUG: Detected signature for client.models.generate_content: {sig}") # Optional console print
-            except Exception as e:
-                # Use logger instance
-                logging.logger.error(f"Could not inspect client.models.generate_content signature: {e}")
-                # print(f"ERROR: Could not inspect client.models.generate_content signature: {e}")
-        elif self.client:
-            # Use logger instance
-            logging.logger.warning("Gemini client initialized, but 'client.models.generate_content' not found for inspection.")
-            # print("WARNING: Gemini client initialized, but 'client.models.generate_content' not found for inspection.")
-        else:
-             # Use logger instance
-             logging.logger.warning("Gemini client failed initialization, cannot inspect methods.")
-             # print("WARNING: Gemini client failed initialization, cannot inspect methods.")
-
+        if not self.client: logging.logger.warning("Gemini client failed initialization; calls to this API will fail.")
 
     def _initialize_client(self) -> Optional[Union[genai_client.Client, Any]]:
         if not genai: # Check if the core library import failed
@@ -67,9 +58,11 @@ class GeminiAdapter:
              # Use the correct class if available
              client_class = getattr(genai, 'Client', None)
              if client_class:
-                  client=client_class(api_key=api_key)
+                  base_url = self.api_config.get("base_url") # Optional override (e.g. a local stub server for testing)
+                  # Shared with the upload service and other users of this key, over one pooled connection set
+                  client = get_client_registry().genai_client(api_key, base_url, self.api_config.get("http_pool"))
                   # Use logger instance
-                  logging.logger.debug("genai.Client created successfully.")
+                  logging.logger.debug("genai.Client ready (shared via client registry).")
                   return client
              else:
                   # Use logger instance
@@ -84,8 +77,74 @@ class GeminiAdapter:
              logging.logger.exception(f"Failed to initialize genai.Client")
              return None
 
-    # --- run_inference using config object ---
-    def run_inference(self, request_data: dict) -> str:
+    def _translate_message(self, msg: dict):
+        """
+        Translates one Voidframe message into (gemini role, parts); "system" parts belong in system_instruction.
+        Returns None for messages that are skipped. Results are cached in self.translation_cache, so they are
+        shared between requests and must not be mutated. Only text is translated here; the parts of the
+        message's "files" are added per request by _file_parts (File API references expire, cached parts don't).
+        """
+        role = msg.get("role")
+        content = msg.get("content")
+        files = msg.get("files")
+
+        if content is None and files is None: # Skip empty messages
+            # Use logger instance
+            logging.logger.debug(f"Skipping message with no content or files: Role={role}")
+            return None
+
+        # Prepare parts for the message (text and future files)
+        message_parts: List[Union[genai_types.Part, str, Dict]] = [] # Use Part if available
+        if content:
+            try:
+                 # Use Part.from_text if available and callable
+                 if hasattr(genai_types, 'Part') and hasattr(genai_types.Part, 'from_text') and callable(genai_types.Part.from_text):
+                      message_parts.append(genai_types.Part.from_text(text=content))
+                 else:
+                      message_parts.append(content) # Fallback to raw string if Part is missing/unusable
+                      # logging.logger.error("genai_types.Part.from_text not available or callable.") # Log only once?
+            except Exception as e:
+                 # Use logger instance
+                 logging.logger.error(f"Error creating text Part for Gemini content: {e}", exc_info=True)
+                 message_parts.append(content) # Add raw string on error
+
+        if not message_parts and not files: # Don't add empty messages (file parts are added by _build_request)
+             # Use logger instance
+             logging.logger.warning(f"Skipping message with role '{role}' as no valid parts could be generated.")
+             return None
+
+        # Map roles (system parts go to system_instruction)
+        if role == "assistant":
+            return "model", tuple(message_parts)
+        elif role == "user":
+            return "user", tuple(message_parts)
+        elif role == "system":
+            logging.logger.debug("Added system message content to be used in system_instruction.")
+            return "system", tuple(message_parts)
+        elif role == "tool":
+            # TODO: Handle tool call results (FunctionResponse) - Phase 5+
+            # Use logger instance
+            logging.logger.warning(f"Skipping message with unhandled role: {role}")
+            return None
+        else:
+            # Use logger instance
+            logging.logger.warning(f"Skipping message with unknown role: {role}")
+            return None
+
+    # --- Request building shared by run_inference and run_inference_stream ---
+    def _file_parts(self, files: List[str], model_name: str) -> list:
+        """
+        Parts for files from storage/file_upload, through the shared UploadService: small files inline, larger
+        ones uploaded once per content hash, media optimized for `model_name` when enabled. Kept in file order.
+        """
+        return get_upload_service().process_files(files, model=model_name)
+
+    def _build_request(self, request_data: dict, use_context_cache: bool = True):
+        """
+        Translates Voidframe request_data into (model name, contents, GenerateContentConfig) for the client.
+        With use_context_cache, a large stable prefix is served from a provider-side cached content
+        (config.cached_content); the returned contents are then only the uncached remainder.
+        """
         if not self.client:
             raise ConnectionError("Gemini client not initialized or failed to initialize.")
         if not genai_types:
@@ -140,61 +199,23 @@ class GeminiAdapter:
         # Translate Voidframe internal messages format to Gemini's 'contents' format
         api_contents: List[Union[genai_types.ContentDict, Dict[str, Any]]] = [] # Use ContentDict if available
         system_instruction_parts = []
+        content_sources: List[dict] = [] # Source message of each api_contents entry (context cache keys)
+        system_sources: List[dict] = []
 
         for msg in request_data.get("messages", []):
-            role = msg.get("role")
-            content = msg.get("content")
-            files = msg.get("files") # Placeholder for future file handling
-
-            if content is None and files is None: # Skip empty messages
-                # Use logger instance
-                logging.logger.debug(f"Skipping message with no content or files: Role={role}")
-                continue
-
-            # Prepare parts for the message (text and future files)
-            message_parts: List[Union[genai_types.Part, str, Dict]] = [] # Use Part if available
-            if content:
-                try:
-                     # Use Part.from_text if available and callable
-                     if hasattr(genai_types, 'Part') and hasattr(genai_types.Part, 'from_text') and callable(genai_types.Part.from_text):
-                          message_parts.append(genai_types.Part.from_text(text=content))
-                     else:
-                          message_parts.append(content) # Fallback to raw string if Part is missing/unusable
-                          # logging.logger.error("genai_types.Part.from_text not available or callable.") # Log only once?
-                except Exception as e:
-                     # Use logger instance
-                     logging.logger.error(f"Error creating text Part for Gemini content: {e}", exc_info=True)
-                     message_parts.append(content) # Add raw string on error
-
-            # TODO: Process 'files' here when file handling is implemented
-            #       - Use upload_manager or similar logic
-            #       - Append FileData or Part objects to message_parts
-
-            if not message_parts: # Don't add empty messages
-                 # Use logger instance
-                 logging.logger.warning(f"Skipping message with role '{role}' as no valid parts could be generated.")
-                 continue
-
-            # Map roles and construct content dictionary
-            if role == "assistant":
-                api_contents.append({"role": "model", "parts": message_parts})
-            elif role == "user":
-                api_contents.append({"role": "user", "parts": message_parts})
-            elif role == "system":
+            # Unchanged messages reuse their translation from earlier turns; only new or edited ones are rebuilt
+            translated = self.translation_cache.translate(msg, self._translate_message)
+            if translated is None: continue
+            api_role, message_parts = translated
+            if msg.get("files"): message_parts = message_parts + tuple(self._file_parts(msg["files"], model_name))
+            if api_role == "system":
                 # Gemini API (v1beta+) often uses a dedicated system_instruction field in config
                 # Accumulate system message parts here, handle later
                 system_instruction_parts.extend(message_parts)
-                # Use logger instance
-                logging.logger.debug("Added system message content to be used in system_instruction.")
-            elif role == "tool":
-                # TODO: Handle tool call results (FunctionResponse) - Phase 5+
-                # Use logger instance
-                logging.logger.warning(f"Skipping message with unhandled role: {role}")
-                continue
+                system_sources.append(msg)
             else:
-                # Use logger instance
-                logging.logger.warning(f"Skipping message with unknown role: {role}")
-                continue
+                api_contents.append({"role": api_role, "parts": list(message_parts)})
+                content_sources.append(msg)
 
         if not api_contents and not system_instruction_parts:
              raise ValueError("No valid messages or system instruction could be constructed for the Gemini API call.")
@@ -232,11 +253,24 @@ class GeminiAdapter:
                       # Add other parameters here if needed
                       # "stop_sequences": stop_sequences
                   }
+                  # Serve the stable prefix (system instruction + earlier turns) from a provider-side cache
+                  cached_content_name = None
+                  if use_context_cache and self.context_cache:
+                      try:
+                          cached_content_name, api_contents = self.context_cache.prepare(model_name_for_api, api_contents, content_sources, system_instruction_content, system_sources)
+                      except Exception:
+                          logging.logger.exception("Gemini context cache lookup failed; sending the full request.")
+                  if cached_content_name:
+                      config_dict["cached_content"] = cached_content_name # The system instruction is part of the cache
                   # Add system_instruction if it was generated and GenerateContentConfig supports it
                   # (Check signature or docs - assuming it does based on documentation)
-                  if system_instruction_content:
+                  elif system_instruction_content:
                       # Pass the Content object or string directly
                       config_dict["system_instruction"] = system_instruction_content
+                  # Remaining request latency budget (seconds, set by DataRouter); HttpOptions takes milliseconds
+                  request_timeout = request_data.get("request_timeout")
+                  if request_timeout is not None and hasattr(genai_types, 'HttpOptions'):
+                      config_dict["http_options"] = genai_types.HttpOptions(timeout=max(1, int(float(request_timeout) * 1000)))
 
                   generation_config_obj = genai_types.GenerateContentConfig(**config_dict)
                   # Use logger instance
@@ -253,96 +287,292 @@ class GeminiAdapter:
              logging.logger.exception("Error creating GenerateContentConfig for Gemini.")
              # Decide whether to raise or proceed without config
 
+        return model_name_for_api, api_contents, generation_config_obj
+
+    # --- run_inference using config object ---
+    def run_inference(self, request_data: dict) -> InferenceResult:
+        model_name_for_api, api_contents, generation_config_obj = self._build_request(request_data)
+        started = time.monotonic()
+
         # --- API Call ---
         # Pass the model, contents, and the config object
         try:
-            # Use logger instance
             logging.logger.debug(f"Attempting Gemini API call to model '{model_name_for_api}'...")
-            # Use logger instance
             logging.logger.debug(f"  Contents: {api_contents}") # Log structure being sent
-            # Use logger instance
             logging.logger.debug(f"  Config: {generation_config_obj}") # Log config object
 
-            # Make the API call using the arguments identified from the signature
-            response: GenerateContentResponse = self.client.models.generate_content(
-                model=model_name_for_api,
-                contents=api_contents, # Should be List[ContentDict] or similar
-                config=generation_config_obj # *** Use the correct parameter name: 'config' ***
-                # TODO: Add 'tools' argument when implementing function calling
-                # TODO: Add 'safety_settings' argument if needed
-            )
+            try:
+                response: GenerateContentResponse = self.client.models.generate_content(
+                    model=model_name_for_api,
+                    contents=api_contents, # Should be List[ContentDict] or similar
+                    config=generation_config_obj # *** Use the correct parameter name: 'config' ***
+                    # TODO: Add 'tools' argument when implementing function calling
+                    # TODO: Add 'safety_settings' argument if needed
+                )
+            except Exception as e:
+                if not (self._drop_failed_context_cache(generation_config_obj, e) or self._drop_failed_uploads(api_contents, e)): raise
+                model_name_for_api, api_contents, generation_config_obj = self._build_request(request_data, use_context_cache=False)
+                response = self.client.models.generate_content(model=model_name_for_api, contents=api_contents, config=generation_config_obj)
 
             # --- Response Handling ---
             if not response:
-                 # Use logger instance
                  logging.logger.error("Gemini API call returned None or empty response.")
                  raise RuntimeError("Gemini API returned no response.")
 
-            # Accessing response text - check GenerateContentResponse structure
-            # Common patterns: response.text, response.candidates[0].content.parts[0].text
-            response_text = ""
+            response_text = self._extract_response_text(response)
+            logging.logger.debug(f"Gemini Response received. Text length: {len(response_text)}")
+            return InferenceResult(response_text.strip(), self._usage_to_dict(getattr(response, 'usage_metadata', None)),
+                                   self._candidate_finish_reason(response), getattr(response, 'model_version', None), time.monotonic() - started)
+        except Exception as e:
+            raise self._wrap_api_error(e, model_name_for_api) from e
+
+    # --- Streaming ---
+    def run_inference_stream(self, request_data: dict, cancel_event: Optional[threading.Event] = None) -> InferenceStream:
+        """
+        Streaming variant of run_inference built on generate_content_stream. Returns an InferenceStream that
+        yields text deltas as chunks arrive; after it is exhausted, .usage holds the usage metadata from the
+        final chunk and .finish_reason the candidate's finish reason.
+        Request building errors (e.g. no valid messages) are raised here, API errors while iterating.
+        """
+        model_name_for_api, api_contents, generation_config_obj = self._build_request(request_data)
+
+        def produce(cancel: threading.Event):
+            logging.logger.debug(f"Attempting streaming Gemini API call to model '{model_name_for_api}'...")
+            chunks = 0; text_length = 0; usage = None; finish_reason = None; model_version = None
+            parts: List[str] = [] # Text of each part of the first candidate, assembled across chunks
             try:
-                 if hasattr(response, 'text') and response.text:
-                      response_text = response.text
-                 elif response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
-                      # Combine text from all parts in the first candidate's content
-                      response_text = "".join(part.text for part in response.candidates[0].content.parts if hasattr(part, 'text'))
-                 else:
-                      # Use logger instance
-                      logging.logger.warning("Could not extract text from Gemini response using common attributes.")
-                      # Maybe log the full response structure for debugging
-                      try:
-                           # Use logger instance
-                           logging.logger.warning(f"Full Gemini response structure: {response}")
-                      except Exception:
-                           # Use logger instance
-                           logging.logger.warning("Could not log full Gemini response structure.")
-                      response_text = "[Error: Could not extract text]"
-
-            except AttributeError as ae:
-                 # Use logger instance
-                 logging.logger.error(f"AttributeError accessing Gemini response text: {ae}. Response structure: {response}", exc_info=True)
-                 response_text = "[Error: Response structure mismatch]"
+                stream = self.client.models.generate_content_stream(model=model_name_for_api, contents=api_contents, config=generation_config_obj)
+                try:
+                    # The SDK stream is lazy: request errors (e.g. an expired context cache) surface with the first chunk
+                    first_chunks = list(itertools.islice(stream, 1))
+                except Exception as e:
+                    if not (self._drop_failed_context_cache(generation_config_obj, e) or self._drop_failed_uploads(api_contents, e)): raise
+                    retry_model, retry_contents, retry_config = self._build_request(request_data, use_context_cache=False)
+                    stream = self.client.models.generate_content_stream(model=retry_model, contents=retry_contents, config=retry_config)
+                    first_chunks = []
+                try:
+                    for chunk in itertools.chain(first_chunks, stream):
+                        chunks += 1
+                        if getattr(chunk, 'usage_metadata', None): usage = chunk.usage_metadata # Cumulative; the last one is final
+                        model_version = getattr(chunk, 'model_version', None) or model_version
+                        candidate_finish = self._candidate_finish_reason(chunk)
+                        if candidate_finish: finish_reason = candidate_finish
+                        for delta, new_part in self._chunk_text_deltas(chunk):
+                            if new_part or not parts: parts.append(delta)
+                            else: parts[-1] += delta
+                            if not text_length: delta = delta.lstrip() # Match run_inference's strip()
+                            if not delta: continue
+                            text_length += len(delta)
+                            yield delta
+                        if cancel.is_set():
+                            logging.logger.info(f"Gemini stream cancelled after {chunks} chunks.")
+                            finish_reason = "CANCELLED"
+                            break
+                finally:
+                    close = getattr(stream, 'close', None)
+                    if callable(close): close()
+            except GeneratorExit:
+                raise
             except Exception as e:
-                 # Use logger instance
-                 logging.logger.exception("Unexpected error processing Gemini response content.")
-                 response_text = "[Error: Processing response failed]"
-
-            # Use logger instance
-            logging.logger.debug(f"Gemini Response received. Text length: {len(response_text)}")
-            # logging.logger.debug(f"Gemini Full Response: {response}") # Optional: Log full response if needed
-            return response_text.strip()
-
-        # --- Exception Handling ---
-        except TypeError as e:
-            # This was the original error, should be fixed by using 'config='
-            # Use logger instance
+                raise self._wrap_api_error(e, model_name_for_api) from e
+            if not chunks:
+                logging.logger.error("Gemini streaming call returned no chunks.")
+                raise RuntimeError("Gemini API Error: Gemini API returned no response.")
+            if not text_length and finish_reason != "CANCELLED":
+                logging.logger.warning(f"Could not extract text from Gemini stream ({chunks} chunks, finish reason: {finish_reason}).")
+                yield "[Error: Could not extract text]"
+            logging.logger.debug(f"Gemini stream finished. Chunks: {chunks}, text length: {text_length}, finish reason: {finish_reason}")
+            return {"usage": self._usage_to_dict(usage), "finish_reason": finish_reason, "model_version": model_version,
+                    "chunks": chunks, "parts": parts}
+
+        return InferenceStream(produce, cancel_event)
+
+    def _drop_failed_context_cache(self, generation_config_obj, error: Exception) -> bool:
+        """If the call failed because of its cached content, forgets that cache and returns True (retry uncached)."""
+        cached_content_name = getattr(generation_config_obj, 'cached_content', None)
+        if not cached_content_name or not self.context_cache or not self.context_cache.is_cache_error(error): return False
+        logging.logger.warning(f"Gemini rejected context cache '{cached_content_name}' ({error}); retrying without it.")
+        self.context_cache.invalidate(cached_content_name)
+        return True
+
+    def _drop_failed_uploads(self, api_contents, error: Exception) -> bool:
+        """
+        If the call failed because of a file it referenced (e.g. deleted early, or uploaded with another key), forgets
+        that upload (every file of the request if the error does not say which) and returns True (retry re-uploads it).
+        """
+        file_uris = [uri for content in api_contents if isinstance(content, dict) for part in content.get("parts") or ()
+                     for uri in [getattr(getattr(part, 'file_data', None), 'file_uri', None)] if uri]
+        if not file_uris or not is_file_error(error): return False
+        message = str(error)
+        named = [uri for uri in file_uris if uri.rstrip("/").rsplit("/", 1)[-1] in message]
+        logging.logger.warning(f"Gemini rejected uploaded file(s) {named or file_uris} ({error}); uploading again.")
+        get_upload_service().forget(named or file_uris)
+        return True
+
+    # --- Response helpers ---
+    def _extract_response_text(self, response) -> str:
+        """Text of a complete response: response.text, else the joined parts of the first candidate."""
+        # Common patterns: response.text, response.candidates[0].content.parts[0].text
+        try:
+             if hasattr(response, 'text') and response.text:
+                  return response.text
+             elif response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
+                  # Combine text from all parts in the first candidate's content
+                  return "".join(part.text for part in response.candidates[0].content.parts if getattr(part, 'text', None))
+             logging.logger.warning("Could not extract text from Gemini response using common attributes.")
+             try:
+                  logging.logger.warning(f"Full Gemini response structure: {response}")
+             except Exception:
+                  logging.logger.warning("Could not log full Gemini response structure.")
+             return "[Error: Could not extract text]"
+        except AttributeError as ae:
+             logging.logger.error(f"AttributeError accessing Gemini response text: {ae}. Response structure: {response}", exc_info=True)
+             return "[Error: Response structure mismatch]"
+        except Exception:
+             logging.logger.exception("Unexpected error processing Gemini response content.")
+             return "[Error: Processing response failed]"
+
+    def _chunk_text_deltas(self, chunk):
+        """
+        Yields (text, starts_new_part) for the text parts of a stream chunk's first candidate.
+        Chunks normally carry one part continuing the previous one; a chunk with several parts, or a
+        non-text part (function call, inline data) in between, starts new parts. Thought parts are skipped.
+        Falls back to chunk.text for chunks without candidate parts.
+        """
+        candidates = getattr(chunk, 'candidates', None)
+        content = getattr(candidates[0], 'content', None) if candidates else None
+        chunk_parts = getattr(content, 'parts', None) if content else None
+        if not chunk_parts:
+            try: text = getattr(chunk, 'text', None)
+            except Exception: text = None # .text raises on some non-text-only chunks
+            if isinstance(text, str) and text: yield text, False
+            return
+        new_part = False
+        for index, part in enumerate(chunk_parts):
+            text = getattr(part, 'text', None)
+            if not isinstance(text, str) or getattr(part, 'thought', False):
+                new_part = True # Whatever text follows belongs to a new part
+                continue
+            if text: yield text, new_part or index > 0
+            new_part = False
+
+    @staticmethod
+    def _candidate_finish_reason(chunk) -> Optional[str]:
+        candidates = getattr(chunk, 'candidates', None)
+        reason = getattr(candidates[0], 'finish_reason', None) if candidates else None
+        if reason is None: return None
+        return getattr(reason, 'name', None) or str(reason)
+
+    @staticmethod
+    def _usage_to_dict(usage) -> Optional[Dict[str, Any]]:
+        """Plain dict of the token counts in GenerateContentResponseUsageMetadata (or a dict stand-in)."""
+        if usage is None: return None
+        fields = ("prompt_token_count", "candidates_token_count", "total_token_count", "cached_content_token_count", "thoughts_token_count")
+        if isinstance(usage, dict): return {f: usage.get(f) for f in fields if usage.get(f) is not None}
+        return {f: getattr(usage, f) for f in fields if getattr(usage, f, None) is not None}
+
+    def _wrap_api_error(self, e: Exception, model_name_for_api: str) -> RuntimeError:
+        """Logs an exception raised around a Gemini API call and returns the RuntimeError to raise."""
+        if isinstance(e, TypeError):
             logging.logger.exception(f"TypeError during Gemini API call (model={model_name_for_api}). Check arguments vs signature: {e}")
-            raise RuntimeError(f"Gemini API parameter error: {e}") from e
-        except AttributeError as e:
+            try: # Inspected only here, not at construction, to keep adapter start-up cheap
+                logging.logger.info(f"Signature of client.models.generate_content: {inspect.signature(self.client.models.generate_content)}")
+            except Exception as sig_error:
+                logging.logger.error(f"Could not inspect client.models.generate_content signature: {sig_error}")
+            return RuntimeError(f"Gemini API parameter error: {e}")
+        if isinstance(e, AttributeError):
             # Could happen if self.client or self.client.models is None or structure changes
-            # Use logger instance
             logging.logger.exception(f"AttributeError during Gemini API call (model={model_name_for_api}). Client structure issue? {e}")
-            raise RuntimeError(f"Gemini client structure or method error: {e}") from e
-        except ImportError as e:
-            # If types were missing
-            # Use logger instance
+            return RuntimeError(f"Gemini client structure or method error: {e}")
+        if isinstance(e, ImportError):
             logging.logger.exception(f"ImportError during Gemini API call. genai types missing? {e}")
-            raise RuntimeError(f"Gemini library import error: {e}") from e
-        except ValueError as e:
-             # Raised if messages are invalid
-             # Use logger instance
+            return RuntimeError(f"Gemini library import error: {e}")
+        if isinstance(e, ValueError):
              logging.logger.exception(f"ValueError during Gemini API call (model={model_name_for_api}): {e}")
-             raise RuntimeError(f"Invalid input data for Gemini API: {e}") from e
-        except Exception as e:
-            # Catch other potential API errors (network, auth, specific Google API errors)
-            # TODO: Catch specific google.api_core.exceptions if possible
-            # Use logger instance
-            logging.logger.exception(f"Unexpected error during Gemini API call (model={model_name_for_api}): {e}")
-            # Try to get more specific error info if available
-            error_details = str(e)
-            if hasattr(e, 'details'): error_details = f"{e} - Details: {e.details()}"
-            raise RuntimeError(f"Gemini API Error: {error_details}") from e
+             return RuntimeError(f"Invalid input data for Gemini API: {e}")
+        # Other API errors (network, auth, specific Google API errors)
+        # TODO: Catch specific google.api_core.exceptions if possible
+        logging.logger.exception(f"Unexpected error during Gemini API call (model={model_name_for_api}): {e}")
+        error_details = str(e)
+        if hasattr(e, 'details'): error_details = f"{e} - Details: {e.details()}"
+        return RuntimeError(f"Gemini API Error: {error_details}")
+
+    # --- Batch jobs (core/batch_jobs.py) ---
+    BATCH_STATES = {"JOB_STATE_QUEUED": "pending", "JOB_STATE_PENDING": "pending", "JOB_STATE_RUNNING": "running",
+                    "JOB_STATE_CANCELLING": "running", "JOB_STATE_PAUSED": "running", "JOB_STATE_UPDATING": "running",
+                    "JOB_STATE_SUCCEEDED": "succeeded", "JOB_STATE_PARTIALLY_SUCCEEDED": "succeeded",
+                    "JOB_STATE_FAILED": "failed", "JOB_STATE_CANCELLED": "cancelled", "JOB_STATE_EXPIRED": "expired"}
+
+    @staticmethod
+    def _job_state_name(batch) -> str:
+        state = getattr(batch, 'state', None)
+        return getattr(state, 'name', None) or str(state)
+
+    def submit_batch(self, requests: List[tuple], display_name: str) -> Dict[str, Any]:
+        """
+        Creates a batch job with the requests inlined; each carries its request ID in metadata so results can be
+        matched back. A batch job runs on one model, so all requests must name the same one. Context caching is
+        not used (batch requests are already billed at a discount).
+        """
+        if not self.client: raise ConnectionError("Gemini client not initialized or failed to initialize.")
+        batch_model = None; inlined = []
+        for request_id, request_data in requests:
+            request_data = {key: value for key, value in request_data.items() if key != "request_timeout"} # No latency budget in a batch
+            model_name_for_api, api_contents, generation_config_obj = self._build_request(request_data, use_context_cache=False)
+            if batch_model and model_name_for_api != batch_model:
+                raise ValueError(f"A Gemini batch job runs on one model; got '{batch_model}' and '{model_name_for_api}'.")
+            batch_model = model_name_for_api
+            inlined.append(genai_types.InlinedRequest(contents=api_contents, config=generation_config_obj, metadata={"request_id": request_id}))
+        try:
+            batch = self.client.batches.create(model=batch_model, src=inlined, config={"display_name": display_name})
+        except Exception as e: raise self._wrap_api_error(e, batch_model) from e
+        logging.logger.debug(f"Gemini batch {batch.name} created ({len(inlined)} inlined requests, model {batch_model}).")
+        return {"provider_job_id": batch.name, "state": self.BATCH_STATES.get(self._job_state_name(batch), "pending"), "model": batch_model}
+
+    def get_batch_status(self, provider_job_id: str) -> Dict[str, Any]:
+        try: batch = self.client.batches.get(name=provider_job_id)
+        except Exception as e: raise self._wrap_api_error(e, provider_job_id) from e
+        state_name = self._job_state_name(batch)
+        error = getattr(batch, 'error', None)
+        return {"state": self.BATCH_STATES.get(state_name, "running"), "status": state_name,
+                "error": (getattr(error, 'message', None) or str(error)) if error else None}
+
+    def fetch_batch_results(self, provider_job_id: str) -> Dict[str, Dict[str, str]]:
+        """Results by request ID from the job's inlined responses (or its result file for file-based jobs)."""
+        try:
+            batch = self.client.batches.get(name=provider_job_id)
+            dest = getattr(batch, 'dest', None)
+            result_file = getattr(dest, 'file_name', None) if dest else None
+            file_content = self.client.files.download(file=result_file) if result_file else None
+        except Exception as e: raise self._wrap_api_error(e, provider_job_id) from e
+        results = {}
+        if file_content is not None: # JSONL lines of {"key" or "metadata", "response" or "error"}
+            for line in file_content.decode("utf-8").splitlines():
+                if not line.strip(): continue
+                try: entry = json.loads(line)
+                except ValueError: logging.logger.warning(f"Skipping unreadable line in Gemini batch {provider_job_id} results."); continue
+                request_id = entry.get("key") or (entry.get("metadata") or {}).get("request_id")
+                if entry.get("error"): results[request_id] = {"error": str(entry["error"].get("message") or entry["error"])}; continue
+                try: parts = entry["response"]["candidates"][0]["content"]["parts"]
+                except (KeyError, IndexError, TypeError): results[request_id] = {"error": "Response has no content."}; continue
+                results[request_id] = {"text": "".join(part.get("text", "") for part in parts if not part.get("thought"))}
+            return results
+        inlined = (getattr(dest, 'inlined_responses', None) or []) if dest else []
+        for index, item in enumerate(inlined):
+            request_id = (getattr(item, 'metadata', None) or {}).get("request_id")
+            if request_id is None:
+                logging.logger.warning(f"Gemini batch {provider_job_id}: response {index} has no request ID metadata; ignored.")
+                continue
+            error = getattr(item, 'error', None)
+            if error or getattr(item, 'response', None) is None:
+                results[request_id] = {"error": (getattr(error, 'message', None) or str(error)) if error else "No response."}
+            else:
+                results[request_id] = {"text": self._extract_response_text(item.response)}
+        return results
+
+    def cancel_batch(self, provider_job_id: str):
+        try: self.client.batches.cancel(name=provider_job_id)
+        except Exception as e: raise self._wrap_api_error(e, provider_job_id) from e
 
     def update_config(self, new_api_config: dict):
         """Updates the adapter's internal configuration."""
@@ -0,0 +1,137 @@
+import hashlib
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from core import logging
+from core.env import ROOT_DIR
+from core.history_sync import message_fingerprint
+from api.gemini.expiring_index import ExpiringIndex
+try:
+    from google.genai import types as genai_types
+except ImportError:
+    genai_types = None
+
+CACHE_INDEX_PATH = ROOT_DIR / "storage" / "gemini_context_cache.json"
+
+class GeminiContextCache:
+    """
+    Moves the stable prefix of a Gemini request (system instruction plus earlier turns) into a provider-side
+    cached content, so it is not re-sent and re-processed on every turn.
+
+    Prefixes are identified by a rolling hash over the model, the system messages and each turn's source
+    message, so the longest cached prefix of a growing conversation is found with one index lookup per turn.
+    The newest turn is never cached. A new, longer cache is only created once the uncached part of the
+    prefix is itself above the minimum size, so a chat does not create a cache on every turn; older caches
+    simply expire. Settings come from the "context_cache" section of the adapter config:
+        "enabled" (true), "min_tokens" (4096, estimated at 4 characters per token), "ttl_seconds" (3600)
+    """
+    CHARS_PER_TOKEN = 4
+    DEFAULT_MIN_TOKENS = 4096
+    DEFAULT_TTL_SECONDS = 3600
+    CREATE_FAILURE_BACKOFF = 600.0 # seconds before retrying cache creation for a model that refused it
+
+    def __init__(self, client, api_config: dict, index: Optional[ExpiringIndex] = None):
+        self.client = client
+        settings = api_config.get("context_cache") or {}
+        self.enabled = bool(settings.get("enabled", True))
+        self.min_tokens = int(settings.get("min_tokens", self.DEFAULT_MIN_TOKENS))
+        self.ttl_seconds = int(settings.get("ttl_seconds", self.DEFAULT_TTL_SECONDS))
+        self.index = index or ExpiringIndex(CACHE_INDEX_PATH, "Gemini context cache index")
+        self._create_lock = threading.Lock() # One creation at a time, so concurrent requests do not create duplicates
+        self._model_backoff: Dict[str, float] = {} # model -> monotonic time before which creation is not retried
+
+    @staticmethod
+    def _content_chars(parts) -> int:
+        total = 0
+        for part in parts or ():
+            if isinstance(part, str): total += len(part)
+            else: total += len(getattr(part, "text", None) or "")
+        return total
+
+    @staticmethod
+    def _prefix_hashes(model: str, system_sources: List[dict], content_sources: List[dict], count: int) -> List[str]:
+        """hashes[i] identifies the prefix made of the system messages and the first i contents."""
+        digest = hashlib.blake2b(f"{model}\0{message_fingerprint(system_sources)}".encode("utf-8"), digest_size=16).digest()
+        hashes = [digest.hex()]
+        for source in content_sources[:count]:
+            digest = hashlib.blake2b(digest + message_fingerprint(source).encode("ascii"), digest_size=16).digest()
+            hashes.append(digest.hex())
+        return hashes
+
+    def prepare(self, model: str, contents: list, content_sources: List[dict], system_instruction, system_sources: List[dict]) -> Tuple[Optional[str], list]:
+        """
+        Returns (cached content name or None, contents still to send). content_sources[i] is the Voidframe
+        message contents[i] was translated from. With a name, the request must set config.cached_content to it
+        and must not repeat the system instruction (it is part of the cache).
+        """
+        if not self.enabled or not self.client or not hasattr(self.client, "caches") or len(contents) < 1: return None, contents
+        # Cheap size check first; small conversations never pay for hashing
+        system_chars = self._content_chars(getattr(system_instruction, "parts", None) or ([system_instruction] if system_instruction else []))
+        chars = [self._content_chars(content.get("parts")) for content in contents]
+        prefix_count = len(contents) - 1 # The newest turn stays out of the cache
+        if (system_chars + sum(chars[:prefix_count])) / self.CHARS_PER_TOKEN < self.min_tokens: return None, contents
+
+        hashes = self._prefix_hashes(model, system_sources, content_sources, prefix_count)
+        cached_count, entry = None, None
+        for count in range(prefix_count, -1, -1): # Longest cached prefix wins
+            entry = self.index.lookup(hashes[count])
+            if entry: cached_count = count; break
+
+        if cached_count is None: uncached_chars = system_chars + sum(chars[:prefix_count])
+        else: uncached_chars = sum(chars[cached_count:prefix_count])
+        if uncached_chars / self.CHARS_PER_TOKEN >= self.min_tokens:
+            created = self._create(model, contents[:prefix_count], system_instruction, hashes[prefix_count], system_chars + sum(chars[:prefix_count]))
+            if created: cached_count, entry = prefix_count, created
+        if cached_count is None: return None, contents
+
+        if entry["expires_at"] - time.time() < self.ttl_seconds / 4: self._extend(hashes[cached_count], entry)
+        logging.logger.debug(f"Using Gemini context cache '{entry['name']}' for {cached_count} of {len(contents)} contents.")
+        return entry["name"], contents[cached_count:]
+
+    def _create(self, model: str, prefix_contents: list, system_instruction, prefix_hash: str, prefix_chars: int) -> Optional[dict]:
+        if genai_types is None or not hasattr(genai_types, "CreateCachedContentConfig"): return None
+        if self._model_backoff.get(model, 0) > time.monotonic(): return None
+        with self._create_lock:
+            existing = self.index.lookup(prefix_hash) # Created by a concurrent request meanwhile
+            if existing: return existing
+            config = {"ttl": f"{self.ttl_seconds}s", "display_name": f"voidframe-{prefix_hash[:16]}"}
+            if prefix_contents: config["contents"] = prefix_contents
+            if system_instruction: config["system_instruction"] = system_instruction
+            started = time.monotonic()
+            try:
+                cached = self.client.caches.create(model=model, config=genai_types.CreateCachedContentConfig(**config))
+            except Exception as e:
+                # Usually a model without caching support or a prefix under the model's minimum size
+                self._model_backoff[model] = time.monotonic() + self.CREATE_FAILURE_BACKOFF
+                logging.logger.warning(f"Could not create Gemini context cache for '{model}' (retrying in {self.CREATE_FAILURE_BACKOFF:.0f}s): {e}")
+                return None
+            entry = {"name": cached.name, "model": model, "expires_at": self._expiry_of(cached),
+                     "contents": len(prefix_contents), "estimated_tokens": prefix_chars // self.CHARS_PER_TOKEN}
+            self.index.store(prefix_hash, entry)
+        logging.logger.info(f"Created Gemini context cache '{cached.name}' ({len(prefix_contents)} contents, ~{entry['estimated_tokens']} tokens) in {time.monotonic() - started:.2f}s.")
+        return entry
+
+    def _extend(self, prefix_hash: str, entry: dict):
+        if genai_types is None or not hasattr(genai_types, "UpdateCachedContentConfig"): return
+        try:
+            cached = self.client.caches.update(name=entry["name"], config=genai_types.UpdateCachedContentConfig(ttl=f"{self.ttl_seconds}s"))
+        except Exception as e:
+            logging.logger.warning(f"Could not extend Gemini context cache '{entry['name']}': {e}")
+            return
+        entry["expires_at"] = self._expiry_of(cached)
+        self.index.store(prefix_hash, entry)
+
+    def _expiry_of(self, cached) -> float:
+        expire_time = getattr(cached, "expire_time", None)
+        try: return expire_time.timestamp()
+        except (AttributeError, OSError, ValueError): return time.time() + self.ttl_seconds
+
+    def invalidate(self, name: str):
+        logging.logger.info(f"Dropping Gemini context cache '{name}' from the local index.")
+        self.index.remove(name)
+
+    @staticmethod
+    def is_cache_error(error: Exception) -> bool:
+        """Whether an API error was caused by the referenced cached content (expired, deleted, wrong model)."""
+        message = str(error).lower()
+        return "cachedcontent" in message or "cached content" in message or "cached_content" in message
@@ -0,0 +1,66 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+from core import logging
+
+class ExpiringIndex:
+    """
+    Small persistent JSON index of provider-side resources with an expiry: key -> entry dict holding at least
+    "name" and "expires_at" (epoch seconds). Used for context caches (key: prefix hash) and File API uploads
+    (key: content hash + MIME type), so resources created in one session are reused by the next while they live.
+    """
+    EXPIRY_MARGIN = 60.0 # seconds; entries this close to expiry count as expired (a request may take that long)
+
+    def __init__(self, path, description: str = "index"):
+        self.path = str(path)
+        self.description = description
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f: entries = json.load(f)
+            if not isinstance(entries, dict): raise ValueError("index is not an object")
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.logger.warning(f"Ignoring unreadable {self.description} {self.path}: {e}")
+            return {}
+        now = time.time()
+        return {h: e for h, e in entries.items() if isinstance(e, dict) and e.get("expires_at", 0) > now}
+
+    def _save(self):
+        # Caller holds the lock. Written to a temp file first so a crash never leaves a truncated index.
+        tmp_path = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f: json.dump(self._entries, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.logger.warning(f"Could not save {self.description} {self.path}: {e}")
+
+    def lookup(self, key: str, margin: float = None) -> Optional[dict]:
+        """The entry for key, unless it expires within `margin` seconds (default EXPIRY_MARGIN)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None: return None
+            if entry["expires_at"] - (self.EXPIRY_MARGIN if margin is None else margin) <= time.time():
+                if entry["expires_at"] <= time.time(): del self._entries[key]; self._save()
+                return None
+            return dict(entry)
+
+    def store(self, key: str, entry: dict):
+        with self._lock:
+            now = time.time()
+            self._entries = {h: e for h, e in self._entries.items() if e["expires_at"] > now} # Prune on write
+            self._entries[key] = dict(entry)
+            self._save()
+
+    def remove(self, name: str, field: str = "name"):
+        """Drops every entry whose `field` (by default the provider resource name) is `name`, e.g. after the API reported it missing."""
+        with self._lock:
+            stale = [h for h, e in self._entries.items() if e.get(field) == name]
+            for key in stale: del self._entries[key]
+            if stale: self._save()
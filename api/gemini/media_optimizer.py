@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from typing import List, Optional, Tuple
+from core import logging
+from core.env import ROOT_DIR
+
+INFO_PATH = os.path.join(os.path.dirname(__file__), "info.json")
+MEDIA_CACHE_DIR = ROOT_DIR / "storage" / "media_cache"
+MANIFEST_NAME = "manifest.json"
+
+# Defaults per media kind; the "media_optimization" section of config.json and of a model's info.json entry override them.
+DEFAULT_PROFILES = {
+    "image": {"max_dimension": 1536, "quality": 85},
+    "video": {"mode": "transcode", "max_dimension": 768, "fps": 1, "crf": 30, "audio_bitrate": "32k", "max_frames": 16},
+    "audio": {"sample_rate": 16000, "bitrate": "32k"},
+}
+KIND_BY_MIME_PREFIX = {"image/": "image", "video/": "video", "audio/": "audio"}
+LOSSLESS_IMAGE_TYPES = ("image/png",) # Scaled but kept lossless; everything else is re-encoded as JPEG
+FFMPEG_TIMEOUT = 600 # seconds
+
+class MediaOptimizer:
+    """
+    Optional pre-upload stage that shrinks media to what the target model actually uses, using the ffmpeg
+    found in PATH:
+      - images are downscaled to "max_dimension" on the long side and re-encoded as JPEG at "quality"
+        (PNGs stay PNG, only scaled);
+      - video is re-encoded at "fps" frames per second, scaled to "max_dimension", with mono 16 kHz audio;
+        with "mode": "keyframes", or for a model whose info.json accepts images but not video, up to
+        "max_frames" keyframes are extracted as JPEG images instead;
+      - audio is downmixed to mono AAC at "sample_rate"/"bitrate".
+    Only kinds listed in the model's "input_types" are touched, and an output is only used when it is smaller
+    than its source. Results are cached in storage/media_cache by source content hash + profile, so a file is
+    processed once. Without ffmpeg, or when disabled ("media_optimization": {"enabled": false}), files pass
+    through unchanged.
+    """
+    def __init__(self, api_config: Optional[dict] = None, model_info: Optional[dict] = None, cache_dir=MEDIA_CACHE_DIR):
+        self.settings = (api_config or {}).get("media_optimization") or {}
+        self.enabled = bool(self.settings.get("enabled", False))
+        self.model_info = model_info if model_info is not None else self._load_model_info()
+        self.cache_dir = str(cache_dir)
+        self.ffmpeg = shutil.which("ffmpeg") or ""
+        self._warned = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_model_info() -> dict:
+        try:
+            with open(INFO_PATH, "r", encoding="utf-8") as f: return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.logger.warning(f"Could not read Gemini model info {INFO_PATH}: {e}")
+            return {}
+
+    def available(self) -> bool:
+        if not self.enabled: return False
+        if not self.ffmpeg:
+            with self._lock:
+                if not self._warned: logging.logger.warning("Media optimization is enabled but ffmpeg was not found in PATH; sending files unchanged.")
+                self._warned = True
+            return False
+        return True
+
+    def profile_for(self, kind: str, model: Optional[str]) -> Optional[dict]:
+        """The effective settings for a media kind and model, or None if the model does not take that kind."""
+        info = (self.model_info.get(model) or {}) if model else {}
+        input_types = info.get("input_types")
+        if input_types is not None and kind not in input_types:
+            if kind == "video" and "image" in input_types: # Still readable as frames
+                return dict(DEFAULT_PROFILES["video"], **(self.settings.get("video") or {}), **((info.get("media_optimization") or {}).get("video") or {}), mode="keyframes")
+            return None
+        return dict(DEFAULT_PROFILES[kind], **(self.settings.get(kind) or {}), **((info.get("media_optimization") or {}).get(kind) or {}))
+
+    def optimize(self, file_path: str, mime_type: str, content_hash: str, model: Optional[str] = None) -> List[Tuple[str, str]]:
+        """
+        Returns [(path, mime_type), ...] to send instead of file_path: the original alone when nothing
+        applies or nothing was gained, one optimized file, or several images for extracted keyframes.
+        content_hash is the SHA-256 of file_path.
+        """
+        original = [(file_path, mime_type)]
+        kind = next((k for prefix, k in KIND_BY_MIME_PREFIX.items() if mime_type.startswith(prefix)), None)
+        if kind is None or not self.available(): return original
+        profile = self.profile_for(kind, model)
+        if profile is None: return original
+        key = hashlib.sha256(f"{content_hash}:{mime_type}:{kind}:{json.dumps(profile, sort_keys=True)}".encode("utf-8")).hexdigest()[:32]
+        cached = self._cached(key)
+        if cached is None:
+            cached = self._process(kind, profile, file_path, mime_type, key)
+        return cached or original
+
+    def _cached(self, key: str) -> Optional[List[Tuple[str, str]]]:
+        """Cached outputs for key ([] means "send the original"), or None if the file was not processed yet."""
+        entry_dir = os.path.join(self.cache_dir, key)
+        try:
+            with open(os.path.join(entry_dir, MANIFEST_NAME), "r", encoding="utf-8") as f: outputs = json.load(f)["outputs"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        outputs = [(os.path.join(entry_dir, name), mime) for name, mime in outputs]
+        return outputs if all(os.path.isfile(path) for path, _ in outputs) else None
+
+    def _process(self, kind: str, profile: dict, file_path: str, mime_type: str, key: str) -> List[Tuple[str, str]]:
+        started = time.monotonic()
+        work_dir = os.path.join(self.cache_dir, f"{key}.tmp-{os.getpid()}-{threading.get_ident()}")
+        os.makedirs(work_dir, exist_ok=True)
+        try:
+            outputs = self._run(kind, profile, file_path, mime_type, work_dir)
+        except (subprocess.SubprocessError, OSError) as e:
+            if isinstance(e, subprocess.CalledProcessError):
+                e = f"ffmpeg exited with status {e.returncode}: {(e.stderr or b'').decode('utf-8', 'replace').strip()[-500:]}"
+            logging.logger.warning(f"Media optimization of '{os.path.basename(file_path)}' failed, sending it unchanged: {e}")
+            shutil.rmtree(work_dir, ignore_errors=True)
+            return [] # Not cached; a transient failure is retried next time
+        source_size = os.path.getsize(file_path)
+        output_size = sum(os.path.getsize(path) for path, _ in outputs)
+        if outputs and profile.get("mode") != "keyframes" and output_size >= source_size:
+            for path, _ in outputs: os.remove(path)
+            outputs = [] # No gain; cached as such so the file is not processed again
+        with open(os.path.join(work_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump({"outputs": [(os.path.basename(path), mime) for path, mime in outputs], "source_size": source_size}, f)
+        entry_dir = os.path.join(self.cache_dir, key)
+        try:
+            os.rename(work_dir, entry_dir) # Atomic publish; a concurrent run for the same file may have won
+        except OSError:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        if outputs:
+            logging.logger.info(f"Optimized '{os.path.basename(file_path)}' ({kind}, {len(outputs)} output(s)) from {source_size} to {output_size} bytes in {time.monotonic() - started:.2f}s.")
+        else:
+            logging.logger.debug(f"Optimizing '{os.path.basename(file_path)}' gained nothing; the original is sent.")
+        return self._cached(key) or []
+
+    def _ffmpeg(self, *args: str):
+        subprocess.run([self.ffmpeg, "-hide_banner", "-v", "error", "-y", *args], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=FFMPEG_TIMEOUT)
+
+    @staticmethod
+    def _scale_filter(max_dimension: int, even: bool = False) -> str:
+        scale = f"scale='min(iw,{int(max_dimension)})':'min(ih,{int(max_dimension)})':force_original_aspect_ratio=decrease"
+        return scale + (":force_divisible_by=2" if even else "")
+
+    def _run(self, kind: str, profile: dict, file_path: str, mime_type: str, work_dir: str) -> List[Tuple[str, str]]:
+        if kind == "image":
+            if mime_type in LOSSLESS_IMAGE_TYPES:
+                output, output_mime, quality_args = os.path.join(work_dir, "image.png"), mime_type, []
+            else:
+                qscale = max(2, min(31, round(31 - int(profile["quality"]) * 29 / 100))) # JPEG quality 0-100 -> ffmpeg qscale 31-2
+                output, output_mime, quality_args = os.path.join(work_dir, "image.jpg"), "image/jpeg", ["-q:v", str(qscale)]
+            self._ffmpeg("-i", file_path, "-vf", self._scale_filter(profile["max_dimension"]), "-frames:v", "1", *quality_args, output)
+            return [(output, output_mime)]
+        if kind == "video" and profile.get("mode") == "keyframes":
+            self._ffmpeg("-i", file_path, "-vf", f"select='eq(pict_type,I)',{self._scale_filter(profile['max_dimension'])}",
+                         "-vsync", "vfr", "-frames:v", str(int(profile["max_frames"])), "-q:v", "3", os.path.join(work_dir, "frame_%03d.jpg"))
+            return [(os.path.join(work_dir, name), "image/jpeg") for name in sorted(os.listdir(work_dir)) if name.startswith("frame_")]
+        if kind == "video":
+            output = os.path.join(work_dir, "video.mp4")
+            self._ffmpeg("-i", file_path, "-vf", f"fps={profile['fps']},{self._scale_filter(profile['max_dimension'], even=True)}",
+                         "-c:v", "libx264", "-preset", "veryfast", "-crf", str(profile["crf"]), "-pix_fmt", "yuv420p",
+                         "-c:a", "aac", "-ac", "1", "-ar", "16000", "-b:a", str(profile["audio_bitrate"]), "-movflags", "+faststart", output)
+            return [(output, "video/mp4")]
+        output = os.path.join(work_dir, "audio.aac")
+        self._ffmpeg("-i", file_path, "-vn", "-ac", "1", "-ar", str(profile["sample_rate"]), "-c:a", "aac", "-b:a", str(profile["bitrate"]), "-f", "adts", output)
+        return [(output, "audio/aac")]
@@ -0,0 +1,181 @@
+import json
+import os
+import random
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+from typing import Callable, Dict, Optional
+from core import logging
+from core.env import ROOT_DIR
+from api.gemini.expiring_index import ExpiringIndex
+
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com"
+SESSION_INDEX_PATH = ROOT_DIR / "storage" / "gemini_upload_sessions.json"
+RETRYABLE_STATUS = (408, 429, 500, 502, 503, 504)
+SESSION_LOST_STATUS = (404, 410) # A chunk sent to an expired or unknown session
+
+ProgressCallback = Callable[[int, int], None] # (bytes confirmed by the server, total bytes)
+
+class UploadSessionLost(Exception):
+    """The server no longer knows the upload session (expired, already finalized or invalid)."""
+
+class ResumableUploader:
+    """
+    Uploads a file to the Gemini File API in chunks with the resumable protocol (X-Goog-Upload-* headers)
+    instead of one client.files.upload call:
+      - the upload URL of each session is kept in storage/gemini_upload_sessions.json under the file's
+        content key, so an upload interrupted by a crash or restart continues from the offset the server
+        reports instead of starting over;
+      - a chunk that fails with a network error or a retryable status is retried with exponential backoff
+        after asking the server how much it actually received, so completed bytes are never re-sent;
+      - `progress(sent, total)` is called after every confirmed chunk.
+    Only one chunk is held in memory at a time. Settings come from the "resumable_upload" section of the
+    adapter config: "enabled" (true), "threshold" (bytes, 32 MiB), "chunk_size" (8 MiB, rounded to the
+    server's granularity), "max_retries" (5 per chunk), "timeout" (60 s per HTTP call).
+    base_url can point at a local stub server for testing.
+    """
+    DEFAULT_THRESHOLD = 32 * 1024 * 1024
+    DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+    DEFAULT_MAX_RETRIES = 5
+    DEFAULT_TIMEOUT = 60.0
+    RETRY_BACKOFF_BASE = 1.0 # seconds; doubled per attempt, with jitter
+    RETRY_BACKOFF_MAX = 30.0
+    SESSION_TTL = 24 * 3600 # seconds a stored session is trusted; the server may drop it sooner
+
+    def __init__(self, api_key: str, api_config: Optional[dict] = None, base_url: str = DEFAULT_BASE_URL, sessions: Optional[ExpiringIndex] = None):
+        if not api_key: raise ValueError("ResumableUploader needs an API key.")
+        settings = (api_config or {}).get("resumable_upload") or {}
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.enabled = bool(settings.get("enabled", True))
+        self.threshold = int(settings.get("threshold", self.DEFAULT_THRESHOLD))
+        self.chunk_size = max(1, int(settings.get("chunk_size", self.DEFAULT_CHUNK_SIZE)))
+        self.max_retries = max(0, int(settings.get("max_retries", self.DEFAULT_MAX_RETRIES)))
+        self.timeout = float(settings.get("timeout", self.DEFAULT_TIMEOUT))
+        self.sessions = sessions or ExpiringIndex(SESSION_INDEX_PATH, "Gemini upload session index")
+
+    def applies_to(self, file_size: int) -> bool:
+        return self.enabled and file_size >= self.threshold
+
+    # --- HTTP ---
+    def _request(self, url: str, headers: Dict[str, str], data: bytes = b""):
+        """Returns (status, headers, body). HTTP errors are raised as urllib.error.HTTPError."""
+        request = urllib.request.Request(url, data=data, headers=headers, method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return response.status, response.headers, response.read()
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, urllib.error.HTTPError): return error.code in RETRYABLE_STATUS
+        return isinstance(error, (urllib.error.URLError, TimeoutError, ConnectionError))
+
+    def _backoff(self, attempt: int, reason: Exception):
+        delay = min(self.RETRY_BACKOFF_BASE * (2 ** attempt), self.RETRY_BACKOFF_MAX) * random.uniform(0.5, 1.0)
+        logging.logger.warning(f"Resumable upload request failed ({reason}); retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries}).")
+        time.sleep(delay)
+
+    def _with_retries(self, call: Callable[[], object]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return call()
+            except Exception as e:
+                if attempt >= self.max_retries or not self._is_retryable(e): raise
+                self._backoff(attempt, e)
+
+    # --- Protocol ---
+    def _start_session(self, file_size: int, mime_type: str, display_name: str) -> Dict:
+        headers = {"x-goog-api-key": self.api_key, "Content-Type": "application/json",
+                   "X-Goog-Upload-Protocol": "resumable", "X-Goog-Upload-Command": "start",
+                   "X-Goog-Upload-Header-Content-Length": str(file_size), "X-Goog-Upload-Header-Content-Type": mime_type}
+        body = json.dumps({"file": {"display_name": display_name}}).encode("utf-8")
+        _, response_headers, _ = self._with_retries(lambda: self._request(f"{self.base_url}/upload/v1beta/files", headers, body))
+        upload_url = response_headers.get("X-Goog-Upload-URL")
+        if not upload_url: raise ConnectionError("Resumable upload start response did not include an upload URL.")
+        granularity = int(response_headers.get("X-Goog-Upload-Chunk-Granularity") or 1)
+        chunk_size = max(granularity, self.chunk_size - self.chunk_size % granularity)
+        return {"name": upload_url, "size": file_size, "mime_type": mime_type, "chunk_size": chunk_size,
+                "expires_at": time.time() + self.SESSION_TTL}
+
+    def _query_offset(self, upload_url: str) -> int:
+        """Bytes the server has received for the session. Raises UploadSessionLost if the session is gone."""
+        headers = {"x-goog-api-key": self.api_key, "X-Goog-Upload-Command": "query"}
+        try:
+            _, response_headers, _ = self._with_retries(lambda: self._request(upload_url, headers))
+        except urllib.error.HTTPError as e:
+            if e.code in RETRYABLE_STATUS: raise
+            raise UploadSessionLost(f"Upload session rejected with HTTP {e.code}.") from e
+        if (response_headers.get("X-Goog-Upload-Status") or "active").lower() != "active":
+            raise UploadSessionLost(f"Upload session is '{response_headers.get('X-Goog-Upload-Status')}'.")
+        return int(response_headers.get("X-Goog-Upload-Size-Received") or 0)
+
+    def _send_chunk(self, upload_url: str, data: bytes, offset: int, final: bool):
+        headers = {"x-goog-api-key": self.api_key, "Content-Length": str(len(data)), "X-Goog-Upload-Offset": str(offset),
+                   "X-Goog-Upload-Command": "upload, finalize" if final else "upload"}
+        return self._request(upload_url, headers, data)
+
+    def _upload_from(self, session: Dict, file_path: str, offset: int, progress: Optional[ProgressCallback]) -> Dict:
+        upload_url, size, chunk_size = session["name"], session["size"], session["chunk_size"]
+        failures = 0 # consecutive failures of the current chunk
+        with open(file_path, "rb") as f:
+            while True:
+                f.seek(offset)
+                data = f.read(chunk_size)
+                final = offset + len(data) >= size
+                try:
+                    _, _, body = self._send_chunk(upload_url, data, offset, final)
+                except Exception as e:
+                    if isinstance(e, urllib.error.HTTPError) and e.code in SESSION_LOST_STATUS:
+                        raise UploadSessionLost(f"Upload chunk rejected with HTTP {e.code}.") from e
+                    if failures >= self.max_retries or not self._is_retryable(e): raise
+                    self._backoff(failures, e); failures += 1
+                    offset = self._query_offset(upload_url) # The failed chunk may have (partly) arrived
+                    continue
+                failures = 0
+                offset += len(data)
+                if progress: progress(offset, size)
+                if final: return (json.loads(body) if body else {}).get("file") or {}
+
+    def upload(self, file_path: str, mime_type: str, key: str, display_name: Optional[str] = None,
+               progress: Optional[ProgressCallback] = None) -> Dict:
+        """
+        Uploads (or resumes uploading) file_path and returns the File API file as a dict with "name", "uri",
+        "mime_type" and "expires_at" (epoch seconds). `key` identifies the content (e.g. SHA-256 + MIME type);
+        a stored session is only resumed for the same key and file size.
+        """
+        file_size = os.path.getsize(file_path)
+        display_name = display_name or os.path.basename(file_path)
+        session = self.sessions.lookup(key)
+        offset = 0
+        if session and session.get("size") == file_size and session.get("mime_type") == mime_type:
+            try:
+                offset = self._query_offset(session["name"])
+                logging.logger.info(f"Resuming upload of '{display_name}' at {offset}/{file_size} bytes.")
+            except UploadSessionLost as e:
+                logging.logger.info(f"Stored upload session for '{display_name}' is no longer usable ({e}); starting over.")
+                self.sessions.remove(session["name"]); session = None
+        else:
+            session = None
+        if session is None:
+            session = self._start_session(file_size, mime_type, display_name)
+            self.sessions.store(key, session)
+        if progress: progress(offset, file_size)
+        started = time.monotonic()
+        try:
+            file_info = self._upload_from(session, file_path, offset, progress)
+        except UploadSessionLost as e: # Dropped by the server mid-upload; one fresh attempt
+            logging.logger.warning(f"Upload session for '{display_name}' was lost ({e}); restarting the upload.")
+            self.sessions.remove(session["name"])
+            session = self._start_session(file_size, mime_type, display_name)
+            self.sessions.store(key, session)
+            file_info = self._upload_from(session, file_path, 0, progress)
+        self.sessions.remove(session["name"])
+        logging.logger.info(f"Resumable upload of '{display_name}' ({file_size} bytes) finished in {time.monotonic() - started:.2f}s.")
+        return {"name": file_info.get("name"), "uri": file_info.get("uri"), "mime_type": file_info.get("mimeType") or mime_type,
+                "expires_at": self._parse_expiry(file_info.get("expirationTime"))}
+
+    @staticmethod
+    def _parse_expiry(value: Optional[str]) -> Optional[float]:
+        if not value: return None
+        try: return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        except ValueError: return None
@@ -1,76 +1,226 @@
 import os
 import base64
+import hashlib
+import mimetypes
+import mmap
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
 from google.genai import types
-from google import genai
 import json
+from core import logging
 from core.env import ROOT_DIR  # Import ROOT_DIR
+from api.gemini.expiring_index import ExpiringIndex
+from api.gemini.resumable_upload import DEFAULT_BASE_URL, ResumableUploader, ProgressCallback
+from api.gemini.media_optimizer import MediaOptimizer
+from api.client_registry import get_client_registry
 
 # Load the Gemini-specific config file once from the same directory.
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.json")
 
+# Uploaded files are remembered by content hash + MIME type, so identical bytes are uploaded once per File API lifetime.
+UPLOAD_INDEX_PATH = ROOT_DIR / "storage" / "gemini_upload_index.json"
+FILE_API_TTL = 48 * 3600 # seconds; File API uploads are deleted after 48 hours
+UPLOAD_REFRESH_MARGIN = 3600 # seconds; references expiring sooner are uploaded again instead of reused
+HASH_CHUNK_SIZE = 1 << 20
+_upload_index = None
+
+def get_upload_index() -> ExpiringIndex:
+    global _upload_index
+    if _upload_index is None: _upload_index = ExpiringIndex(UPLOAD_INDEX_PATH, "Gemini upload index")
+    return _upload_index
+
+def file_sha256(file_path: str) -> str:
+    """
+    Hashes the file from an mmap (no copy into Python memory; hashlib releases the GIL, so several files
+    hash in parallel), falling back to chunked reads where mapping is not possible (e.g. empty files).
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped: digest.update(mapped)
+        except (ValueError, OSError):
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""): digest.update(chunk)
+    return digest.hexdigest()
+
+def _expiry_of(file_ref) -> float:
+    expiration_time = getattr(file_ref, "expiration_time", None)
+    try: return expiration_time.timestamp()
+    except (AttributeError, OSError, ValueError): return time.time() + FILE_API_TTL
+
+def upload_file_deduplicated(client, file_path: str, mime_type: str, index: ExpiringIndex = None,
+                             resumable: Optional[ResumableUploader] = None, progress: Optional[ProgressCallback] = None):
+    """
+    Returns a Part referencing `file_path` through the File API. A reference to identical bytes (same SHA-256
+    and MIME type) uploaded earlier is reused while it has more than UPLOAD_REFRESH_MARGIN left; otherwise the
+    file is uploaded and the index updated, which also refreshes references that are about to expire.
+    Files the `resumable` uploader applies to go up in resumable chunks, reporting `progress(sent, total)`.
+    """
+    index = index or get_upload_index()
+    key = f"{file_sha256(file_path)}:{mime_type}"
+    entry = index.lookup(key, margin=UPLOAD_REFRESH_MARGIN)
+    if entry:
+        logging.logger.debug(f"Reusing uploaded file {entry['name']} for '{os.path.basename(file_path)}'.")
+        return types.Part.from_uri(file_uri=entry["uri"], mime_type=entry["mime_type"])
+    started = time.monotonic()
+    file_size = os.path.getsize(file_path)
+    if resumable is not None and resumable.applies_to(file_size):
+        uploaded = resumable.upload(file_path, mime_type, key, progress=progress)
+        uploaded["expires_at"] = uploaded["expires_at"] or time.time() + FILE_API_TTL
+    else:
+        file_ref = client.files.upload(file=file_path, config=types.UploadFileConfig(mime_type=mime_type, display_name=os.path.basename(file_path)))
+        uploaded = {"name": file_ref.name, "uri": file_ref.uri, "mime_type": file_ref.mime_type or mime_type, "expires_at": _expiry_of(file_ref)}
+        if progress: progress(file_size, file_size)
+    index.store(key, dict(uploaded, size=file_size, uploaded_at=time.time()))
+    logging.logger.info(f"Uploaded '{os.path.basename(file_path)}' as {uploaded['name']} in {time.monotonic() - started:.2f}s.")
+    return types.Part.from_uri(file_uri=uploaded["uri"], mime_type=uploaded["mime_type"])
+
+def forget_uploaded_file(name_or_uri: str, index: ExpiringIndex = None):
+    """Drops a File API reference, by name or URI, from the upload index (e.g. after the API reported it missing)."""
+    index = index or get_upload_index()
+    index.remove(name_or_uri); index.remove(name_or_uri, field="uri")
+
+def is_file_error(error: Exception) -> bool:
+    """Whether an API error was caused by a referenced File API file (deleted, expired, not accessible with this key)."""
+    message = str(error).lower()
+    return "file" in message and any(word in message for word in ("not found", "not exist", "permission", "forbidden", "deleted", "expired", "403", "404"))
+
 def load_config():
     """Loads the Gemini API-specific configuration."""
     with open(CONFIG_PATH, "r") as f:
         return json.load(f)
 
-def process_files(file_list, api_config):
+DEFAULT_UPLOAD_THRESHOLD = 20 * 1024 * 1024
+DEFAULT_UPLOAD_CONCURRENCY = 4
+DEFAULT_MIME_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+    ".heic": "image/heic",
+    ".heif": "image/heif"
+}
+UPLOAD_DIR = os.path.abspath(os.path.join(ROOT_DIR, "storage", "file_upload"))
+
+class UploadService:
     """
-    Processes a list of file names using the Gemini config file.
-    - Uses `base64_upload_threshold` from config.json.
-    - Uses `mime_types` from config.json.
-    - Builds the upload directory relative to the main Voidframe folder.
+    Turns file names from storage/file_upload into Gemini parts. Created once and reused: the config, the
+    client and the worker pool are set up on first use instead of on every call.
+    - Files below `base64_upload_threshold` are sent inline; larger files go through the File API once per
+      content hash (see upload_file_deduplicated), which also hashes them from an mmap. Files above the
+      "resumable_upload" threshold are uploaded in resumable chunks (see ResumableUploader).
+    - With "media_optimization" enabled, media is first shrunk for the target model (see MediaOptimizer);
+      a video may then become several keyframe images.
+    - The files of one call are processed concurrently on a bounded pool ("upload_concurrency" in
+      config.json, default 4), so a message with several attachments takes about as long as its largest
+      file. Parts are returned in the order of the file list.
     """
-    processed_parts = []
-    
-    # Load the local Gemini config.
-    config = load_config()
-    
-    # Retrieve the file size threshold (default: 20MB if not specified)
-    threshold = config.get("base64_upload_threshold", 20 * 1024 * 1024)
-    
-    # Retrieve MIME type mappings from config.json; fallback to defaults if not provided.
-    mime_types = config.get("mime_types", {
-        ".jpg": "image/jpeg",
-        ".jpeg": "image/jpeg",
-        ".png": "image/png",
-        ".webp": "image/webp",
-        ".heic": "image/heic",
-        ".heif": "image/heif"
-    })
-    
-    # Build the upload directory path.
-    # Instead of going up from __file__, use ROOT_DIR.
-    upload_dir = os.path.join(ROOT_DIR, "storage", "file_upload")
-    upload_dir = os.path.abspath(upload_dir)
-    
-    # Initialize the Gemini client using the GEMINI_API_KEY environment variable.
-    gemini_api_key = os.environ.get("GEMINI_API_KEY")
-    if not gemini_api_key:
-        raise ValueError("GEMINI_API_KEY environment variable not set.")
-    client = genai.Client(api_key=gemini_api_key)
-    
-    for filename in file_list:
-        file_path = os.path.join(upload_dir, filename)
+    def __init__(self, client=None, config: Optional[dict] = None, index: Optional[ExpiringIndex] = None):
+        self.config = load_config() if config is None else config
+        self.threshold = self.config.get("base64_upload_threshold", DEFAULT_UPLOAD_THRESHOLD)
+        self.mime_types = self.config.get("mime_types", DEFAULT_MIME_TYPES)
+        self.max_workers = max(1, int(self.config.get("upload_concurrency", DEFAULT_UPLOAD_CONCURRENCY)))
+        self.upload_dir = UPLOAD_DIR
+        self.index = index
+        self.optimizer = MediaOptimizer(self.config)
+        self._client = client
+        self._resumable: Optional[ResumableUploader] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """The Gemini client for GEMINI_API_KEY, shared with the adapter through the client registry, unless one was passed in."""
+        with self._lock:
+            if self._client is None:
+                gemini_api_key = os.environ.get("GEMINI_API_KEY")
+                if not gemini_api_key:
+                    raise ValueError("GEMINI_API_KEY environment variable not set.")
+                self._client = get_client_registry().genai_client(gemini_api_key, self.config.get("base_url"), self.config.get("http_pool"))
+            return self._client
+
+    @property
+    def resumable(self) -> Optional[ResumableUploader]:
+        """The chunked uploader for very large files; None when disabled or without GEMINI_API_KEY."""
+        with self._lock:
+            if self._resumable is None and (self.config.get("resumable_upload") or {}).get("enabled", True) and os.environ.get("GEMINI_API_KEY"):
+                self._resumable = ResumableUploader(os.environ["GEMINI_API_KEY"], self.config, self.config.get("base_url") or DEFAULT_BASE_URL)
+            return self._resumable
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None: self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="gemini-upload")
+            return self._pool
+
+    def mime_type_for(self, filename: str) -> str:
+        # Look up MIME type from the mapping, then the platform's table; default to generic binary if not found.
+        return self.mime_types.get(os.path.splitext(filename)[1].lower()) or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+    def resolve(self, filename: str) -> str:
+        file_path = os.path.join(self.upload_dir, filename)
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File '{filename}' not found in the upload directory.")
-        
+        return file_path
+
+    def process_file(self, filename: str, progress: Optional[Callable[[str, int, int], None]] = None, model: Optional[str] = None) -> list:
+        """
+        Parts for one file: usually one, several when a video was turned into keyframes for `model`.
+        `progress(filename, sent, total)` is called as File API uploads advance (e.g. to drive a progress bar).
+        """
+        file_path = self.resolve(filename)
+        mime_type = self.mime_type_for(filename)
+        sources = [(file_path, mime_type)]
+        if self.optimizer.available(): sources = self.optimizer.optimize(file_path, mime_type, file_sha256(file_path), model)
+        return [self._part_for(filename, path, source_mime_type, progress) for path, source_mime_type in sources]
+
+    def _part_for(self, filename: str, file_path: str, mime_type: str, progress):
         file_size = os.path.getsize(file_path)
-        ext = os.path.splitext(filename)[1].lower()
-        # Look up MIME type from the mapping; default to generic binary if not found.
-        mime_type = mime_types.get(ext, "application/octet-stream")
-        
-        if file_size < threshold:
-            # For files below threshold, encode inline as Base64.
+        if file_size < self.threshold:
+            # Inline data has to be in the request body anyway; read it with a single sized read.
             with open(file_path, "rb") as f:
-                file_bytes = f.read()
-            part = types.Part.from_bytes(data=file_bytes, mime_type=mime_type)
-            processed_parts.append(part)
+                return types.Part.from_bytes(data=f.read(file_size), mime_type=mime_type)
+        try:
+            file_progress = (lambda sent, total: progress(filename, sent, total)) if progress else None
+            return upload_file_deduplicated(self.client, file_path, mime_type, self.index, self.resumable, file_progress)
+        except Exception as e:
+            raise RuntimeError(f"Error uploading file '{filename}': {e}")
+
+    def process_files(self, file_list, progress: Optional[Callable[[str, int, int], None]] = None, model: Optional[str] = None) -> list:
+        """
+        Returns the parts of all files, in the order of file_list. Missing files are reported before anything
+        is uploaded. `model` selects the media optimization profile from info.json. `progress` is called from
+        the worker threads; UI callers should forward it through a queued signal.
+        """
+        for filename in file_list: self.resolve(filename)
+        unique = list(dict.fromkeys(file_list)) # A file attached twice is processed once
+        if len(unique) <= 1 or self.max_workers == 1:
+            parts = {filename: self.process_file(filename, progress, model) for filename in unique}
         else:
-            # For larger files, use the Gemini File API.
-            try:
-                file_ref = client.files.upload(file=file_path)
-                processed_parts.append(file_ref)
-            except Exception as e:
-                raise RuntimeError(f"Error uploading file '{filename}': {e}")
-    
-    return processed_parts
+            parts = dict(zip(unique, self._get_pool().map(lambda filename: self.process_file(filename, progress, model), unique)))
+        return [part for filename in file_list for part in parts[filename]]
+
+    def forget(self, file_uris):
+        """Drops the given File API references from this service's upload index, so the next use uploads them again."""
+        for uri in file_uris: forget_uploaded_file(uri, self.index)
+
+    def close(self):
+        with self._lock: pool, self._pool = self._pool, None
+        if pool: pool.shutdown(wait=True)
+
+_upload_service = None
+_upload_service_lock = threading.Lock()
+
+def get_upload_service() -> UploadService:
+    """The shared UploadService, created on first use."""
+    global _upload_service
+    with _upload_service_lock:
+        if _upload_service is None: _upload_service = UploadService()
+        return _upload_service
+
+def process_files(file_list, api_config=None, progress=None, model=None):
+    """
+    Processes a list of file names from storage/file_upload into Gemini parts, using the shared
+    UploadService (config.json, client and worker pool are loaded once, not on every call).
+    """
+    return get_upload_service().process_files(file_list, progress, model)
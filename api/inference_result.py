@@ -0,0 +1,60 @@
+from typing import Any, Dict, Optional
+
+# Provider usage keys -> the normalized keys used by InferenceResult.usage and the usage ledger
+USAGE_KEYS = {
+    "input_tokens": ("input_tokens", "prompt_tokens", "prompt_token_count"),
+    "output_tokens": ("output_tokens", "completion_tokens", "candidates_token_count"),
+    "total_tokens": ("total_tokens", "total_token_count"),
+    "cached_tokens": ("cached_tokens", "cached_content_token_count"),
+    "reasoning_tokens": ("reasoning_tokens", "thoughts_token_count"),
+}
+
+def normalize_usage(usage: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """Token counts of an adapter's usage dict (OpenAI or Gemini naming) under provider-independent keys."""
+    if not usage: return {}
+    normalized = {}
+    for key, aliases in USAGE_KEYS.items():
+        value = next((usage[alias] for alias in aliases if usage.get(alias) is not None), None)
+        if value is not None: normalized[key] = int(value)
+    return normalized
+
+class InferenceResult(str):
+    """
+    The text of one completion, returned by an adapter's run_inference, together with what the call reported:
+    normalized token usage, finish reason, the model version that answered, and timings (seconds) filled in
+    by the adapter or APIInterface. It is a str, so callers that only want the text use it as before;
+    string operations (strip, concatenation, hooks rewriting it) return plain strings without the metadata.
+    """
+    def __new__(cls, text: str, usage: Optional[Dict[str, Any]] = None, finish_reason: Optional[str] = None,
+                model_version: Optional[str] = None, latency: Optional[float] = None, time_to_first_token: Optional[float] = None):
+        result = super().__new__(cls, text)
+        result.usage = normalize_usage(usage)
+        result.finish_reason = finish_reason
+        result.model_version = model_version
+        result.latency = latency
+        result.time_to_first_token = time_to_first_token
+        return result
+
+    @classmethod
+    def from_stream(cls, stream, latency: Optional[float] = None) -> "InferenceResult":
+        """Result of a finished InferenceStream (api/streaming.py)."""
+        return cls(stream.text, stream.usage, stream.finish_reason, stream.metadata.get("model_version"), latency, stream.time_to_first_delta)
+
+    @property
+    def text(self) -> str:
+        return str.__str__(self)
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """Output tokens per second of generation (after the first token when that time is known)."""
+        output_tokens = self.usage.get("output_tokens")
+        if not output_tokens or not self.latency: return None
+        generation_time = self.latency - (self.time_to_first_token or 0.0)
+        return output_tokens / generation_time if generation_time > 0 else None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"usage": dict(self.usage), "finish_reason": self.finish_reason, "model_version": self.model_version,
+                "latency": self.latency, "time_to_first_token": self.time_to_first_token, "tokens_per_second": self.tokens_per_second}
+
+    def __reduce__(self): # Keep the metadata when pickled (e.g. across a process boundary)
+        return (InferenceResult, (self.text, self.usage, self.finish_reason, self.model_version, self.latency, self.time_to_first_token))
@@ -0,0 +1,148 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from core import logging
+from api.streaming import InferenceStream
+from api.inference_result import InferenceResult
+from api.local_model.storage_handler import ModelStore, llama_cpp
+
+class LocalModelAdapter:
+    """
+    Adapter for quantised models (GGUF) running on the local CPU through llama-cpp-python: no network
+    round-trip and no provider queue. Weights, loading and residency are handled by ModelStore
+    (storage_handler.py) with the settings in the "runtime" section of config.json; with "preload", the
+    default model is loaded in the background at startup so the first request finds it warm.
+    One model instance handles one request at a time; concurrent requests for the same model queue.
+    """
+    # Keys of a Voidframe message passed to the chat template; attachments are not supported locally
+    MESSAGE_FIELDS = ("role", "content")
+
+    def __init__(self, api_config: dict, projects_base_path: str):
+        self.api_config = api_config
+        self.projects_base_path = projects_base_path
+        self.store = ModelStore(api_config.get("runtime"))
+        if llama_cpp is None:
+            logging.logger.warning("llama-cpp-python is not installed; the local_model API is listed but cannot run models.")
+        elif (api_config.get("runtime") or {}).get("preload", True):
+            threading.Thread(target=self.warm_up, name="local-model-preload", daemon=True).start()
+        logging.logger.info(f"Local Model Adapter Initialized (models in {self.store.models_dir})")
+
+    def _default_model(self) -> Optional[str]:
+        model_setting = self.api_config.get("generation_parameters", {}).get("model")
+        return model_setting.get("default") if isinstance(model_setting, dict) else None
+
+    def warm_up(self, model_name: Optional[str] = None):
+        """Loads a model (default: the configured default) so the next request does not wait for it."""
+        model_name = model_name or self._default_model()
+        if not model_name: return
+        try:
+            self.store.release(self.store.acquire(model_name))
+        except Exception as e:
+            logging.logger.warning(f"Could not preload local model '{model_name}': {e}")
+
+    def list_models(self) -> List[str]:
+        return self.store.list_models()
+
+    def _build_completion_kwargs(self, request_data: dict) -> Dict[str, Any]:
+        """ create_chat_completion arguments from request_data; shared by run_inference and run_inference_stream. """
+        messages = [{key: msg[key] for key in self.MESSAGE_FIELDS if msg.get(key) is not None} for msg in request_data.get("messages", [])]
+        if not messages: raise ValueError("Missing 'messages' in request_data")
+        if any(msg.get("files") for msg in request_data.get("messages", [])):
+            logging.logger.warning("Local models take text only; attached files are not sent.")
+        try: # Same fallbacks as the other adapters when a value has the wrong type
+            temperature = float(request_data.get("temperature", 0.7))
+            top_p = float(request_data.get("top_p", 0.95))
+            top_k = int(request_data.get("top_k", 40))
+            max_tokens = int(request_data.get("max_output_tokens", 1024))
+        except (ValueError, TypeError) as e:
+            logging.logger.error(f"Invalid local model parameter type in request_data: {e}. Using defaults.")
+            temperature, top_p, top_k, max_tokens = 0.7, 0.95, 40, 1024
+        return {"messages": messages, "temperature": temperature, "top_p": top_p, "top_k": top_k, "max_tokens": max_tokens}
+
+    def _model_name(self, request_data: dict) -> str:
+        model_name = request_data.get("model_name") or self._default_model()
+        if not model_name: raise ValueError("Missing 'model_name' in request_data")
+        return model_name
+
+    def run_inference(self, request_data: dict) -> InferenceResult:
+        """ Generates a complete response; the model is loaded on first use and stays resident. """
+        kwargs = self._build_completion_kwargs(request_data)
+        model_name = self._model_name(request_data)
+        model = self.store.acquire(model_name)
+        try:
+            with model.lock:
+                started = time.monotonic()
+                logging.logger.debug(f"Running local model '{model_name}' (max_tokens={kwargs['max_tokens']}).")
+                response = model.llm.create_chat_completion(**kwargs)
+                latency = time.monotonic() - started
+        except Exception as e:
+            logging.logger.exception(f"Local model '{model_name}' failed.")
+            raise RuntimeError(f"Local model error: {e}") from e
+        finally:
+            self.store.release(model)
+        choice = (response.get("choices") or [{}])[0]
+        content = (choice.get("message") or {}).get("content") or ""
+        return InferenceResult(content.strip(), response.get("usage"), choice.get("finish_reason"), model_name, latency)
+
+    def run_inference_stream(self, request_data: dict, cancel_event: Optional[threading.Event] = None) -> InferenceStream:
+        """
+        Streaming variant of run_inference; deltas are yielded as the model produces tokens. Cancelling stops
+        generation at the next token. The model is held for this request until the stream ends or is closed.
+        """
+        kwargs = self._build_completion_kwargs(request_data)
+        model_name = self._model_name(request_data)
+
+        def produce(cancel: threading.Event):
+            model = self.store.acquire(model_name)
+            finish_reason = None; chunks = 0; completion_tokens = 0; text_length = 0
+            try:
+                with model.lock:
+                    response = model.llm.create_chat_completion(**kwargs, stream=True)
+                    try:
+                        for chunk in response:
+                            chunks += 1
+                            choice = (chunk.get("choices") or [{}])[0]
+                            if choice.get("finish_reason"): finish_reason = choice["finish_reason"]
+                            content = (choice.get("delta") or {}).get("content")
+                            if content:
+                                completion_tokens += 1 # llama-cpp streams one token per chunk
+                                if not text_length: content = content.lstrip() # Match run_inference's strip()
+                                if content:
+                                    text_length += len(content)
+                                    yield content
+                            if cancel.is_set():
+                                finish_reason = "cancelled"
+                                logging.logger.info(f"Local model stream cancelled after {chunks} chunks.")
+                                break
+                    finally:
+                        close = getattr(response, "close", None)
+                        if callable(close): close() # Stops generation if the stream ended early
+            except GeneratorExit:
+                raise
+            except Exception as e:
+                logging.logger.exception(f"Local model '{model_name}' failed while streaming.")
+                raise RuntimeError(f"Local model error: {e}") from e
+            finally:
+                self.store.release(model)
+            logging.logger.debug(f"Local model stream finished. Chunks: {chunks}, text length: {text_length}, finish reason: {finish_reason}")
+            return {"usage": {"completion_tokens": completion_tokens}, "finish_reason": finish_reason, "model_version": model_name, "chunks": chunks}
+
+        return InferenceStream(produce, cancel_event)
+
+    def update_config(self, new_api_config: dict):
+        """Updates the adapter's configuration. Changed runtime settings unload the resident models (they reload with the new ones)."""
+        logging.logger.info("Local Model Adapter updating config.")
+        runtime_changed = (new_api_config.get("runtime") or {}) != (self.api_config.get("runtime") or {})
+        self.api_config = new_api_config
+        if runtime_changed:
+            old_store, self.store = self.store, ModelStore(new_api_config.get("runtime"))
+            old_store.unload_all()
+
+    def close(self):
+        """Unloads every resident model (on application exit)."""
+        self.store.unload_all()
+
+# --- Factory Function ---
+def get_adapter_instance(api_config: dict, projects_base_path: str) -> LocalModelAdapter:
+    """Creates and returns an instance of the LocalModelAdapter."""
+    return LocalModelAdapter(api_config, projects_base_path)
@@ -0,0 +1,184 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from core import logging
+from core.env import ROOT_DIR
+try:
+    import llama_cpp
+except ImportError: # Optional dependency (pip install llama-cpp-python); the adapter reports it when used
+    llama_cpp = None
+
+DEFAULT_MODELS_DIR = ROOT_DIR / "storage" / "local_models"
+MODEL_EXTENSIONS = (".gguf",)
+DEFAULT_KEEP_ALIVE = 900 # seconds an unused model stays loaded; 0 unloads after each request, negative keeps it forever
+DEFAULT_MAX_LOADED_MODELS = 1
+REAP_INTERVAL = 30 # seconds between idle checks
+
+def default_thread_count() -> int:
+    """llama.cpp runs best on physical cores; half the logical CPUs is a safe estimate (SMT)."""
+    return max(1, (os.cpu_count() or 2) // 2)
+
+class LoadedModel:
+    """
+    A resident llama_cpp.Llama. Llama instances are not thread-safe: hold `lock` while using `llm`.
+    `in_use` counts requests between ModelStore.acquire and release; a model in use is never unloaded.
+    """
+    def __init__(self, key: Tuple, path: str, llm):
+        self.key = key
+        self.path = path
+        self.llm = llm
+        self.lock = threading.Lock()
+        self.loaded_at = time.time()
+        self.last_used = time.monotonic()
+        self.load_seconds = 0.0
+        self.in_use = 0
+
+class ModelStore:
+    """
+    Finds local model weights (GGUF files in "models_dir", default storage/local_models) and keeps loaded
+    models resident between requests, so only the first request for a model pays for loading it.
+      - Weights are memory-mapped ("use_mmap", default true): loading maps the file instead of copying it,
+        and the OS page cache keeps it warm even across restarts. "use_mlock" pins it in RAM.
+      - Up to "max_loaded_models" models stay loaded (least recently used is unloaded first); a model unused
+        for "keep_alive" seconds is unloaded by a background check.
+      - "n_threads" / "n_threads_batch" set the CPU threads for generation / prompt processing (default:
+        physical-core estimate / all logical CPUs). "n_ctx", "n_batch" and "n_gpu_layers" pass through.
+      - "prompt_cache_bytes" (> 0) attaches an in-RAM prompt cache, so a conversation's unchanged prefix is
+        not re-evaluated on the next turn.
+    A model is identified by its file name without extension, or by a path.
+    """
+    def __init__(self, settings: Optional[dict] = None):
+        self.settings = settings or {}
+        self.models_dir = str(self.settings.get("models_dir") or DEFAULT_MODELS_DIR)
+        if not os.path.isabs(self.models_dir): self.models_dir = str(ROOT_DIR / self.models_dir)
+        self.keep_alive = float(self.settings.get("keep_alive", DEFAULT_KEEP_ALIVE))
+        self.max_loaded_models = max(1, int(self.settings.get("max_loaded_models", DEFAULT_MAX_LOADED_MODELS)))
+        self._models: "OrderedDict[Tuple, LoadedModel]" = OrderedDict()
+        self._loading: Dict[Tuple, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+
+    # --- Weights ---
+    def list_models(self) -> list:
+        try:
+            return sorted(os.path.splitext(name)[0] for name in os.listdir(self.models_dir) if name.lower().endswith(MODEL_EXTENSIONS))
+        except OSError:
+            return []
+
+    def resolve(self, model_name: str) -> str:
+        """Path of a model's weights: an existing path as given, else <models_dir>/<name>(.gguf)."""
+        candidates = [model_name] if os.path.isabs(model_name) else []
+        candidates += [os.path.join(self.models_dir, model_name)] + [os.path.join(self.models_dir, model_name + ext) for ext in MODEL_EXTENSIONS]
+        path = next((candidate for candidate in candidates if os.path.isfile(candidate)), None)
+        if path is None: raise FileNotFoundError(f"Local model '{model_name}' not found in {self.models_dir} (expected a .gguf file).")
+        return path
+
+    def _load_params(self) -> Dict[str, Any]:
+        settings = self.settings
+        params = {"n_ctx": int(settings.get("n_ctx", 4096)), "n_batch": int(settings.get("n_batch", 512)),
+                  "n_threads": int(settings.get("n_threads") or default_thread_count()),
+                  "n_threads_batch": int(settings.get("n_threads_batch") or os.cpu_count() or 1),
+                  "n_gpu_layers": int(settings.get("n_gpu_layers", 0)),
+                  "use_mmap": bool(settings.get("use_mmap", True)), "use_mlock": bool(settings.get("use_mlock", False)),
+                  "verbose": bool(settings.get("verbose", False))}
+        if settings.get("chat_format"): params["chat_format"] = settings["chat_format"]
+        return params
+
+    # --- Resident models ---
+    def acquire(self, model_name: str) -> LoadedModel:
+        """
+        The loaded model, loading it first if needed (concurrent requests for the same model share one load).
+        Pair every acquire with release().
+        """
+        if llama_cpp is None: raise ImportError("Local models need the llama-cpp-python package (pip install llama-cpp-python).")
+        path = self.resolve(model_name)
+        params = self._load_params()
+        key = (os.path.realpath(path), tuple(sorted(params.items())))
+        while True:
+            with self._lock:
+                model = self._models.get(key)
+                if model is not None:
+                    self._models.move_to_end(key)
+                    model.last_used = time.monotonic()
+                    model.in_use += 1
+                    return model
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    break
+            loading.wait() # Another thread is loading it; take its result (or retry if it failed)
+        try:
+            model = self._load(key, path, params)
+        finally:
+            with self._lock: self._loading.pop(key, None)
+            loading.set()
+        return model
+
+    def _load(self, key: Tuple, path: str, params: Dict[str, Any]) -> LoadedModel:
+        started = time.monotonic()
+        logging.logger.info(f"Loading local model '{os.path.basename(path)}' (threads {params['n_threads']}/{params['n_threads_batch']}, "
+                            f"ctx {params['n_ctx']}, mmap {params['use_mmap']}).")
+        llm = llama_cpp.Llama(model_path=path, **params)
+        cache_bytes = int(self.settings.get("prompt_cache_bytes", 0) or 0)
+        if cache_bytes > 0: llm.set_cache(llama_cpp.LlamaRAMCache(capacity_bytes=cache_bytes))
+        model = LoadedModel(key, path, llm)
+        model.load_seconds = time.monotonic() - started
+        model.in_use = 1
+        with self._lock:
+            self._models[key] = model
+            # Least recently used first; models serving a request stay (the limit is exceeded until they finish)
+            evicted = []
+            for old_key, old in list(self._models.items()):
+                if len(self._models) <= self.max_loaded_models: break
+                if old_key != key and old.in_use == 0: evicted.append(self._models.pop(old_key))
+            self._start_reaper()
+        for old in evicted: self._unload(old, "making room")
+        logging.logger.info(f"Local model '{os.path.basename(path)}' loaded in {model.load_seconds:.2f}s.")
+        return model
+
+    def release(self, model: LoadedModel):
+        """Marks the end of a request; with keep_alive 0 the model is unloaded right away."""
+        with self._lock:
+            model.in_use -= 1
+            model.last_used = time.monotonic()
+        if self.keep_alive == 0: self.unload_idle(0)
+
+    def _unload(self, model: LoadedModel, reason: str):
+        with model.lock:
+            close = getattr(model.llm, "close", None)
+            if callable(close): close()
+            model.llm = None
+        logging.logger.info(f"Unloaded local model '{os.path.basename(model.path)}' ({reason}).")
+
+    def unload_idle(self, idle_seconds: Optional[float] = None) -> int:
+        """Unloads models unused for idle_seconds (default keep_alive) and returns how many were unloaded."""
+        idle_seconds = self.keep_alive if idle_seconds is None else idle_seconds
+        if idle_seconds < 0: return 0
+        now = time.monotonic()
+        with self._lock:
+            idle = [key for key, model in self._models.items() if model.in_use == 0 and now - model.last_used >= idle_seconds]
+            models = [self._models.pop(key) for key in idle]
+        for model in models: self._unload(model, f"idle for {now - model.last_used:.0f}s")
+        return len(models)
+
+    def unload_all(self):
+        with self._lock: models, self._models = list(self._models.values()), OrderedDict()
+        for model in models: self._unload(model, "shutdown")
+
+    def _start_reaper(self):
+        # Caller holds the lock
+        if self.keep_alive <= 0 or (self._reaper is not None and self._reaper.is_alive()): return
+        self._reaper = threading.Thread(target=self._reap_loop, name="local-model-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(min(REAP_INTERVAL, self.keep_alive))
+            try:
+                self.unload_idle()
+            except Exception:
+                logging.logger.exception("Local model idle check failed.")
+            with self._lock:
+                if not self._models: self._reaper = None; return
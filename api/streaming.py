@@ -0,0 +1,110 @@
+import threading
+import time
+from core import logging
+from typing import Any, Callable, Dict, Generator, List, Optional
+
+class InferenceStream:
+    """
+    Iterator over the text deltas of one streamed completion, returned by an adapter's run_inference_stream.
+
+    The adapter supplies a producer: a function taking the stream's cancel event and returning a generator
+    that yields str deltas and *returns* a dict of end-of-stream metadata ("usage", "finish_reason", ...).
+    Nothing is sent to the API until the first delta is requested. After iteration the assembled text and
+    metadata are available as attributes. cancel() asks the producer to stop at the next chunk boundary and
+    runs the callbacks the producer registered with on_cancel (e.g. closing the HTTP response, which also
+    unblocks a read that is waiting for the next chunk).
+    """
+    def __init__(self, producer: Callable[[threading.Event], Generator[str, None, Optional[Dict[str, Any]]]], cancel_event: Optional[threading.Event] = None):
+        self.cancel_event = cancel_event or threading.Event()
+        self._cancel_callbacks: List[Callable[[], Any]] = []
+        self._finish_callbacks: List[Callable[["InferenceStream", Optional[BaseException]], Any]] = []
+        self._cancel_lock = threading.Lock()
+        self._generator = producer(self.cancel_event)
+        self._deltas: List[str] = []
+        self._started_at: Optional[float] = None
+        self.time_to_first_delta: Optional[float] = None # seconds from the first next() to the first delta
+        self.metadata: Dict[str, Any] = {}
+        self.usage: Optional[Dict[str, Any]] = None
+        self.finish_reason: Optional[str] = None
+        self.done = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if self.done: raise StopIteration
+        if self._started_at is None: self._started_at = time.monotonic()
+        try:
+            delta = next(self._generator)
+        except StopIteration as stop:
+            self._finish(stop.value)
+            raise
+        except BaseException as e:
+            self.done = True
+            self._run_finish_callbacks(e)
+            raise
+        if self.time_to_first_delta is None: self.time_to_first_delta = time.monotonic() - self._started_at
+        self._deltas.append(delta)
+        return delta
+
+    def _finish(self, metadata: Optional[Dict[str, Any]]):
+        self.done = True
+        self.metadata = dict(metadata or {})
+        self.usage = self.metadata.get("usage")
+        self.finish_reason = self.metadata.get("finish_reason")
+        self._run_finish_callbacks(None)
+
+    def on_finish(self, callback: Callable[["InferenceStream", Optional[BaseException]], Any]):
+        """Registers callback(stream, error) for when the stream ends: exhausted (error None), failed or closed early."""
+        self._finish_callbacks.append(callback)
+
+    def _run_finish_callbacks(self, error: Optional[BaseException]):
+        callbacks, self._finish_callbacks = self._finish_callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self, error)
+            except Exception as e:
+                logging.logger.warning(f"Stream finish callback failed: {e}")
+
+    @property
+    def text(self) -> str:
+        """Everything received so far, stripped like the non-streaming run_inference result."""
+        return "".join(self._deltas).strip()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def consume(self) -> str:
+        """Drains the stream and returns the full text."""
+        for _ in self: pass
+        return self.text
+
+    def on_cancel(self, callback: Callable[[], Any]):
+        """Registers a callback for cancel(); runs it right away if the stream was already cancelled."""
+        with self._cancel_lock:
+            if not self.cancel_event.is_set():
+                self._cancel_callbacks.append(callback)
+                return
+        self._run_cancel_callback(callback)
+
+    def cancel(self):
+        """Thread-safe; may be called from the UI while another thread iterates."""
+        with self._cancel_lock:
+            self.cancel_event.set()
+            callbacks, self._cancel_callbacks = self._cancel_callbacks, []
+        for callback in callbacks: self._run_cancel_callback(callback)
+
+    def _run_cancel_callback(self, callback: Callable[[], Any]):
+        try:
+            callback()
+        except Exception as e:
+            logging.logger.warning(f"Stream cancel callback failed: {e}")
+
+    def close(self):
+        """Stops the producer immediately (closing its generator releases the underlying connection)."""
+        self.cancel()
+        if not self.done:
+            self.done = True
+            self._generator.close()
+            self._run_finish_callbacks(None)
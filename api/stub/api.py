@@ -0,0 +1,206 @@
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+from core import logging
+from api.streaming import InferenceStream
+from api.inference_result import InferenceResult
+
+CHARS_PER_TOKEN = 4
+MAX_TRACKED_REQUESTS = 100000 # Distinct request contents whose repeat count is remembered
+# Filler vocabulary for generated responses (about one token per word)
+WORDS = ("the", "system", "response", "latency", "model", "stream", "token", "request", "plugin", "router", "queue", "window",
+         "signal", "worker", "budget", "cache", "context", "message", "history", "simulated", "result", "value", "chunk", "load")
+
+class SimulatedRateLimitError(RuntimeError):
+    """A simulated HTTP 429; retry_after is the suggested wait in seconds."""
+    status_code = 429
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def sample(spec: Any, rng: random.Random, minimum: float = 0.0) -> float:
+    """
+    Draws from a distribution spec: a number (fixed), or {"distribution": ...} with
+      "fixed" (value), "uniform" (min, max), "normal" (mean, stddev), "lognormal" (median, p95) or
+      "exponential" (mean); optional "min"/"max" clamp the draw.
+    """
+    if spec is None: return minimum
+    if isinstance(spec, (int, float)): return max(minimum, float(spec))
+    kind = spec.get("distribution", "fixed")
+    if kind == "fixed": value = float(spec.get("value", 0.0))
+    elif kind == "uniform": value = rng.uniform(float(spec.get("min", 0.0)), float(spec.get("max", 1.0)))
+    elif kind == "normal": value = rng.gauss(float(spec.get("mean", 0.0)), float(spec.get("stddev", 0.0)))
+    elif kind == "lognormal": # Parameterised by median and 95th percentile, the numbers usually quoted for latency
+        median = float(spec.get("median", 1.0)); p95 = max(float(spec.get("p95", median)), median)
+        value = rng.lognormvariate(math.log(median), math.log(p95 / median) / 1.6449 if p95 > median else 0.0)
+    elif kind == "exponential": value = rng.expovariate(1.0 / max(float(spec.get("mean", 1.0)), 1e-9))
+    else: raise ValueError(f"Unknown distribution '{kind}'.")
+    if kind != "uniform": # For uniform, min/max are the range itself
+        if "min" in spec: value = max(value, float(spec["min"]))
+        if "max" in spec: value = min(value, float(spec["max"]))
+    return max(minimum, value)
+
+class StubAdapter:
+    """
+    Offline stand-in for a cloud API, for load- and soak-testing the router, plugins and UI without cost or
+    real rate limits. Responses are generated locally with the behaviour described by the "simulation"
+    section of config.json (per-model overrides under "simulation"."models"):
+      - "latency": total time of a non-streamed call; "ttft", "chunk_interval": time to the first streamed
+        chunk and between chunks; "chunk_tokens": tokens per chunk; "response_tokens": response size. Each is
+        a number or a distribution spec (see sample()).
+      - "error_rate", "rate_limit_rate", "timeout_rate": probability of a failed call, a 429
+        (SimulatedRateLimitError) and of hanging until the request's latency budget runs out.
+      - "requests_per_minute", "max_concurrency" (0 = unlimited): calls beyond them fail with a 429, like a
+        provider's limits.
+      - "echo": start the response with the last user message.
+    Every random choice comes from an RNG seeded with "seed" and the request's content (plus how many times
+    that content was seen), so a run is reproducible even when calls complete in a different order.
+    """
+    def __init__(self, api_config: dict, projects_base_path: str):
+        self.api_config = api_config
+        self.projects_base_path = projects_base_path
+        self._lock = threading.Lock()
+        self._seen: Dict[str, int] = {}
+        self._recent: deque = deque() # Start times of calls in the last minute
+        self._active = 0
+        logging.logger.info("Stub Adapter Initialized (simulated responses, no network)")
+
+    # --- Settings and randomness ---
+    def _settings(self, model_name: Optional[str]) -> Dict[str, Any]:
+        simulation = dict(self.api_config.get("simulation") or {})
+        overrides = (simulation.pop("models", None) or {}).get(model_name or "") or {}
+        return dict(simulation, **overrides)
+
+    def _rng(self, request_data: dict, settings: dict) -> random.Random:
+        content = json.dumps([request_data.get("model_name"), [(m.get("role"), m.get("content")) for m in request_data.get("messages", [])]],
+                             sort_keys=True, default=str)
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+        with self._lock:
+            if len(self._seen) >= MAX_TRACKED_REQUESTS: self._seen.clear() # Bounded for long soak runs
+            occurrence = self._seen.get(digest, 0)
+            self._seen[digest] = occurrence + 1
+        return random.Random(f"{settings.get('seed', 0)}:{digest}:{occurrence}")
+
+    def _response_text(self, request_data: dict, settings: dict, rng: random.Random) -> str:
+        tokens = int(sample(settings.get("response_tokens", 60), rng, minimum=1))
+        words = [rng.choice(WORDS) for _ in range(tokens)]
+        text = " ".join(words).capitalize() + "."
+        if settings.get("echo"):
+            last_user = next((m.get("content") for m in reversed(request_data.get("messages", [])) if m.get("role") == "user"), None)
+            if last_user: text = f"[stub] {last_user}\n{text}"
+        return text
+
+    @staticmethod
+    def _usage(request_data: dict, text: str) -> Dict[str, int]:
+        prompt_chars = sum(len(str(m.get("content") or "")) for m in request_data.get("messages", []))
+        input_tokens, output_tokens = prompt_chars // CHARS_PER_TOKEN, max(1, len(text) // CHARS_PER_TOKEN)
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    # --- Failure injection ---
+    def _admit(self, settings: dict, rng: random.Random):
+        """Counts the call against the simulated limits; raises a 429 when it does not fit."""
+        rpm = int(settings.get("requests_per_minute", 0) or 0)
+        max_concurrency = int(settings.get("max_concurrency", 0) or 0)
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] >= 60.0: self._recent.popleft()
+            if rpm and len(self._recent) >= rpm:
+                raise SimulatedRateLimitError("Stub API Error: 429 Too Many Requests (requests_per_minute exceeded)", 60.0 - (now - self._recent[0]))
+            if max_concurrency and self._active >= max_concurrency:
+                raise SimulatedRateLimitError("Stub API Error: 429 Too Many Requests (max_concurrency exceeded)", 1.0)
+            self._recent.append(now)
+            self._active += 1
+        if rng.random() < float(settings.get("rate_limit_rate", 0.0)):
+            self._leave()
+            raise SimulatedRateLimitError("Stub API Error: 429 Too Many Requests (simulated)", round(rng.uniform(1.0, 10.0), 1))
+
+    def _leave(self):
+        with self._lock: self._active -= 1
+
+    @staticmethod
+    def _wait(seconds: float, cancel: Optional[threading.Event]) -> bool:
+        """Sleeps; returns True if cancelled meanwhile."""
+        if seconds <= 0: return bool(cancel and cancel.is_set())
+        if cancel is None: time.sleep(seconds); return False
+        return cancel.wait(seconds)
+
+    def _plan(self, request_data: dict):
+        """(settings, rng, failure) for one call; failure is None, "error" or "timeout"."""
+        settings = self._settings(request_data.get("model_name"))
+        rng = self._rng(request_data, settings)
+        if not request_data.get("messages"): raise ValueError("Missing 'messages' in request_data")
+        draw = rng.random()
+        error_rate, timeout_rate = float(settings.get("error_rate", 0.0)), float(settings.get("timeout_rate", 0.0))
+        failure = "error" if draw < error_rate else "timeout" if draw < error_rate + timeout_rate else None
+        return settings, rng, failure
+
+    def _fail(self, failure: str, request_data: dict, cancel: Optional[threading.Event] = None):
+        if failure == "error": raise RuntimeError("Stub API Error: 500 Internal Server Error (simulated)")
+        budget = request_data.get("request_timeout")
+        self._wait(float(budget) if budget is not None else 600.0, cancel) # Hangs like an unresponsive server
+        raise TimeoutError(f"Stub request timed out (budget {budget}s, simulated)")
+
+    # --- Inference ---
+    def run_inference(self, request_data: dict) -> InferenceResult:
+        settings, rng, failure = self._plan(request_data)
+        self._admit(settings, rng)
+        try:
+            started = time.monotonic()
+            latency = sample(settings.get("latency", 0.5), rng)
+            if failure == "error": self._wait(latency * rng.random(), None)
+            if failure: self._fail(failure, request_data)
+            text = self._response_text(request_data, settings, rng)
+            budget = request_data.get("request_timeout")
+            if budget is not None and latency > float(budget):
+                self._wait(float(budget), None)
+                raise TimeoutError(f"Stub request timed out (budget {budget}s, simulated latency {latency:.2f}s)")
+            self._wait(latency, None)
+            return InferenceResult(text, self._usage(request_data, text), "stop", request_data.get("model_name"), time.monotonic() - started)
+        finally:
+            self._leave()
+
+    def run_inference_stream(self, request_data: dict, cancel_event: Optional[threading.Event] = None) -> InferenceStream:
+        settings, rng, failure = self._plan(request_data)
+
+        def produce(cancel: threading.Event):
+            self._admit(settings, rng)
+            chunks = 0; finish_reason = None; sent: List[str] = []
+            try:
+                if failure == "timeout": self._fail(failure, request_data, cancel)
+                if self._wait(sample(settings.get("ttft", 0.3), rng), cancel): return {"finish_reason": "cancelled", "chunks": 0}
+                if failure == "error": self._fail(failure, request_data)
+                words = self._response_text(request_data, settings, rng).split(" ")
+                while words:
+                    size = int(sample(settings.get("chunk_tokens", 3), rng, minimum=1))
+                    piece, words = words[:size], words[size:]
+                    chunks += 1
+                    sent.append(("" if chunks == 1 else " ") + " ".join(piece))
+                    yield sent[-1]
+                    if words and self._wait(sample(settings.get("chunk_interval", 0.03), rng), cancel):
+                        finish_reason = "cancelled"
+                        break
+                else:
+                    finish_reason = "stop"
+            finally:
+                self._leave()
+            return {"usage": self._usage(request_data, "".join(sent)), "finish_reason": finish_reason,
+                    "model_version": request_data.get("model_name"), "chunks": chunks}
+
+        return InferenceStream(produce, cancel_event)
+
+    def list_models(self) -> List[str]:
+        return list(((self.api_config.get("simulation") or {}).get("models") or {}).keys())
+
+    def update_config(self, new_api_config: dict):
+        logging.logger.info("Stub Adapter updating config.")
+        self.api_config = new_api_config
+
+# --- Factory Function ---
+def get_adapter_instance(api_config: dict, projects_base_path: str) -> StubAdapter:
+    """Creates and returns an instance of the StubAdapter."""
+    return StubAdapter(api_config, projects_base_path)
@@ -0,0 +1,53 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+from core.history_sync import message_fingerprint
+
+class TranslationCache:
+    """
+    LRU cache of provider-native message representations, for adapters where building them costs more than a
+    lookup (GeminiAdapter's content parts; a plain dict copy such as an OpenAI message is cheaper uncached).
+    Entries are keyed by the message's fields (including its "id", if it has one), so an edited message is
+    translated again while every unchanged message of a long conversation is reused. Scalar fields go into
+    the key as they are (str hashes are computed natively); only nested values such as "files" are
+    fingerprinted, which keeps a lookup several times cheaper than even a single Part construction.
+    Cached values are shared between requests and must not be mutated by the adapter.
+    """
+    DEFAULT_MAX_ENTRIES = 4096
+    _MISSING = object()
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or self.DEFAULT_MAX_ENTRIES
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(message: dict, variant: Hashable = None) -> Hashable:
+        """variant separates translations of the same message that depend on something else (e.g. the model)."""
+        fields = tuple(sorted((name, value if value is None or isinstance(value, (str, int, float)) else message_fingerprint(value))
+                              for name, value in message.items()))
+        return (fields, variant)
+
+    def translate(self, message: dict, translator: Callable[[dict], Any], variant: Hashable = None) -> Any:
+        """Returns the cached translation of `message`, calling `translator(message)` on a miss. None results are cached too."""
+        key = self.key(message, variant)
+        with self._lock:
+            value = self._entries.get(key, self._MISSING)
+            if value is not self._MISSING:
+                self._entries.move_to_end(key); self.hits += 1
+                return value
+            self.misses += 1
+        value = translator(message) # Outside the lock; a concurrent miss on the same message just translates twice
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries: self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock: self._entries.clear(); self.hits = 0; self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock: return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
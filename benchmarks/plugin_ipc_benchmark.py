@@ -0,0 +1,279 @@
+"""
+Plugin IPC micro-benchmark for PluginManager.
+
+Generates synthetic echo plugins in a temporary directory, loads them through a real PluginManager
+(one executor subprocess per plugin, JSON-RPC over stdin/stdout) and measures:
+  - payload:     call_plugin_method latency and throughput for payloads from 100 B to 10 MB
+  - plugins:     startup time and aggregate throughput with 1..N plugins
+  - concurrency: latency/throughput with several caller threads sharing one plugin
+  - restart:     crash detection and recovery time under the supervisor, plus a direct reset_plugin()
+Results are written as JSON so runs can be compared across commits. Runs offline; needs no Qt.
+
+Usage (from the repository root):
+    python benchmarks/plugin_ipc_benchmark.py [--output results.json] [--quick] [--scenarios payload,restart]
+By default results go to benchmarks/results/plugin_ipc_<timestamp>.json (git-ignored); use --output - for stdout.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from core import logging # noqa: E402  (after sys.path setup)
+from core.plugin_manager import PluginManager # noqa: E402
+
+SCENARIOS = ("payload", "plugins", "concurrency", "restart")
+
+ECHO_PLUGIN_SOURCE = '''import os
+import time
+
+class PluginBase:
+    def __init__(self, plugin_path, config):
+        self.config = config
+
+    def echo(self, payload):
+        return payload
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+        return seconds
+
+    def crash(self):
+        os._exit(1)
+'''
+
+# --- Helpers ---
+def percentile(sorted_values: list, q: float):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values: return None
+    index = max(0, min(len(sorted_values) - 1, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def summarize(latencies_s: list, wall_s: float, payload_bytes: int = 0) -> dict:
+    values = sorted(l * 1000.0 for l in latencies_s)
+    calls = len(values)
+    return {
+        'calls': calls, 'wall_s': round(wall_s, 4),
+        'min_ms': round(values[0], 3) if values else None, 'mean_ms': round(sum(values) / calls, 3) if calls else None,
+        'p50_ms': round(percentile(values, 0.50), 3) if values else None,
+        'p95_ms': round(percentile(values, 0.95), 3) if values else None,
+        'p99_ms': round(percentile(values, 0.99), 3) if values else None,
+        'max_ms': round(values[-1], 3) if values else None,
+        'calls_per_s': round(calls / wall_s, 2) if wall_s > 0 else None,
+        # Payload travels both ways (request + echoed response)
+        'mb_per_s': round(2 * payload_bytes * calls / wall_s / 1e6, 2) if wall_s > 0 and payload_bytes else None,
+    }
+
+def git_commit() -> str:
+    try: return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception: return None
+
+class BenchmarkEnvironment:
+    """A temporary plugin tree with `count` echo plugins and a PluginManager loaded from it."""
+    def __init__(self, count: int, extra_config: dict = None):
+        self.count = count
+        self.extra_config = extra_config or {}
+        self._tmp = None
+        self.manager = None
+        self.startup_s = None
+
+    def __enter__(self):
+        self._tmp = tempfile.TemporaryDirectory(prefix="voidframe_bench_")
+        base = Path(self._tmp.name)
+        (base / "interfaces").mkdir()
+        extensions = base / "extensions"; extensions.mkdir()
+        for i in range(self.count):
+            plugin_dir = extensions / f"echo_{i}"; plugin_dir.mkdir()
+            (plugin_dir / "plugin.py").write_text(ECHO_PLUGIN_SOURCE, encoding='utf-8')
+            config = {"name": f"bench_echo_{i}", "hooks": {}, **self.extra_config}
+            (plugin_dir / "config.json").write_text(json.dumps(config), encoding='utf-8')
+        project_config = {"plugins_interfaces_dir": str(base / "interfaces"), "plugins_extensions_dir": str(extensions),
+                          "plugin_hot_reload": False}
+        started = time.perf_counter()
+        self.manager = PluginManager(None, project_config)
+        # Startup is complete once every plugin answers
+        for name in self.plugin_names: self._wait_ready(name)
+        self.startup_s = time.perf_counter() - started
+        return self
+
+    @property
+    def plugin_names(self) -> list:
+        return [f"bench_echo_{i}" for i in range(self.count)]
+
+    def _wait_ready(self, name: str, timeout: float = 30.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not PluginManager.is_error_result(self.manager.call_plugin_method(name, "echo", {"payload": ""})): return
+            time.sleep(0.01)
+        raise RuntimeError(f"Benchmark plugin '{name}' did not become ready within {timeout}s.")
+
+    def __exit__(self, *exc):
+        if self.manager:
+            self.manager.stop_supervisor(); self.manager.stop_plugin_watcher()
+            self.manager.observer_dispatcher.shutdown()
+            self.manager.shutdown_all_plugins()
+        if self._tmp: self._tmp.cleanup()
+
+def run_calls(manager: PluginManager, targets: list, payload: str, calls: int, concurrency: int, timeout: float) -> dict:
+    """Issues `calls` echo calls spread over `targets` from `concurrency` threads. Returns the summary."""
+    latencies = []; errors = [0]; lock = threading.Lock(); counter = iter(range(calls))
+    params = {"payload": payload}
+
+    def worker():
+        local = []; local_errors = 0
+        while True:
+            with lock: index = next(counter, None)
+            if index is None: break
+            target = targets[index % len(targets)]
+            started = time.perf_counter()
+            result = manager.call_plugin_method(target, "echo", params, timeout)
+            elapsed = time.perf_counter() - started
+            if PluginManager.is_error_result(result) or (isinstance(result, str) and len(result) != len(payload)): local_errors += 1
+            else: local.append(elapsed)
+        with lock: latencies.extend(local); errors[0] += local_errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency): pool.submit(worker)
+    wall = time.perf_counter() - started
+    summary = summarize(latencies, wall, len(payload.encode('utf-8')))
+    summary['errors'] = errors[0]
+    return summary
+
+# --- Scenarios ---
+def bench_payload(args) -> list:
+    sizes = [100, 1_000, 10_000, 100_000, 1_000_000] + ([] if args.quick else [10_000_000])
+    results = []
+    with BenchmarkEnvironment(1) as env:
+        target = env.plugin_names[0]
+        for size in sizes:
+            # Keep the total volume per size bounded so the 10 MB case stays reasonable
+            calls = max(5, min(args.iterations, int(200_000_000 / size)))
+            payload = "x" * size
+            run_calls(env.manager, [target], payload, min(3, calls), 1, args.timeout) # Warm-up
+            summary = run_calls(env.manager, [target], payload, calls, 1, args.timeout)
+            summary['payload_bytes'] = size
+            results.append(summary)
+            log(f"payload {size:>10} B: p50 {summary['p50_ms']} ms, p99 {summary['p99_ms']} ms, {summary['calls_per_s']} calls/s")
+    return results
+
+def bench_plugins(args) -> list:
+    counts = [1, 2, 4] if args.quick else [1, 2, 4, 8, 16]
+    payload = "x" * 1_000
+    results = []
+    for count in counts:
+        with BenchmarkEnvironment(count) as env:
+            summary = run_calls(env.manager, env.plugin_names, payload, args.iterations * count, count, args.timeout)
+            summary.update({'plugins': count, 'concurrency': count, 'payload_bytes': len(payload), 'startup_s': round(env.startup_s, 4)})
+            results.append(summary)
+            log(f"plugins {count:>3}: startup {summary['startup_s']} s, p50 {summary['p50_ms']} ms, {summary['calls_per_s']} calls/s")
+    return results
+
+def bench_concurrency(args) -> list:
+    levels = [1, 2, 4, 8] if args.quick else [1, 2, 4, 8, 16, 32]
+    payload = "x" * 1_000
+    results = []
+    with BenchmarkEnvironment(1) as env:
+        target = env.plugin_names[0]
+        for level in levels:
+            summary = run_calls(env.manager, [target], payload, args.iterations * 2, level, args.timeout)
+            summary.update({'plugins': 1, 'concurrency': level, 'payload_bytes': len(payload)})
+            results.append(summary)
+            log(f"concurrency {level:>3}: p50 {summary['p50_ms']} ms, p99 {summary['p99_ms']} ms, {summary['calls_per_s']} calls/s")
+        # Sleeping calls show whether the plugin process serves independent requests in parallel
+        for level in (1, 4):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=level) as pool:
+                list(pool.map(lambda _: env.manager.call_plugin_method(target, "sleep", {"seconds": 0.1}, args.timeout), range(level)))
+            wall = time.perf_counter() - started
+            results.append({'plugins': 1, 'concurrency': level, 'method': 'sleep(0.1)', 'wall_s': round(wall, 4)})
+            log(f"concurrency {level:>3}: {level} x sleep(0.1) took {wall:.3f} s")
+    return results
+
+def bench_restart(args) -> dict:
+    repetitions = 2 if args.quick else 3
+    supervised = []; direct = []
+    with BenchmarkEnvironment(1) as env:
+        manager = env.manager; target = env.plugin_names[0]
+        for _ in range(repetitions):
+            crashed_at = time.perf_counter()
+            manager.call_plugin_method(target, "crash", None, 2)
+            detected_at = None
+            deadline = time.monotonic() + manager.HEARTBEAT_INTERVAL + manager.RESTART_BACKOFF_MAX + 30
+            while time.monotonic() < deadline:
+                if detected_at is None and not manager.is_plugin_healthy(target): detected_at = time.perf_counter()
+                if detected_at is not None and manager.is_plugin_healthy(target) \
+                        and not PluginManager.is_error_result(manager.call_plugin_method(target, "echo", {"payload": "ok"}, 2)):
+                    break
+                time.sleep(0.005)
+            recovered_at = time.perf_counter()
+            supervised.append({'detect_ms': round(((detected_at or recovered_at) - crashed_at) * 1000, 2),
+                               'recover_ms': round((recovered_at - crashed_at) * 1000, 2)})
+            log(f"restart (supervised): detected {supervised[-1]['detect_ms']} ms, recovered {supervised[-1]['recover_ms']} ms")
+            manager.reset_plugin(target) # Clear the failure history so repetitions do not trip the crash-loop quarantine
+        for _ in range(repetitions):
+            started = time.perf_counter()
+            manager.reset_plugin(target)
+            env._wait_ready(target)
+            direct.append(round((time.perf_counter() - started) * 1000, 2))
+            log(f"restart (reset_plugin): {direct[-1]} ms")
+    return {'supervised': supervised, 'reset_plugin_ms': direct,
+            'policy': {'heartbeat_interval_s': PluginManager.HEARTBEAT_INTERVAL, 'restart_backoff_base_s': PluginManager.RESTART_BACKOFF_BASE}}
+
+# --- Entry point ---
+_quiet = False
+def log(message: str):
+    if not _quiet: print(message, file=sys.stderr)
+
+def main(argv=None):
+    global _quiet
+    parser = argparse.ArgumentParser(description="Benchmark PluginManager IPC overhead with synthetic echo plugins.")
+    parser.add_argument("--output", "-o", default=None, help="JSON results file ('-' for stdout; default: benchmarks/results/plugin_ipc_<timestamp>.json)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--iterations", type=int, default=200, help="Calls per measurement point (scaled down for large payloads)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-call timeout in seconds")
+    parser.add_argument("--quick", action="store_true", help="Smaller sweep (no 10 MB payload, fewer plugins/threads)")
+    parser.add_argument("--log-level", default="WARNING", help="Voidframe logger level during the run (DEBUG logging dominates timings)")
+    parser.add_argument("--quiet", action="store_true", help="No progress output on stderr")
+    args = parser.parse_args(argv)
+    _quiet = args.quiet
+    logging.logger.setLevel(args.log_level.upper())
+
+    selected = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in selected if s not in SCENARIOS]
+    if unknown: parser.error(f"Unknown scenario(s): {', '.join(unknown)}")
+
+    results = {
+        'meta': {'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S%z"), 'git_commit': git_commit(),
+                 'python': sys.version.split()[0], 'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+                 'iterations': args.iterations, 'quick': args.quick},
+        'scenarios': {},
+    }
+    runners = {'payload': bench_payload, 'plugins': bench_plugins, 'concurrency': bench_concurrency, 'restart': bench_restart}
+    for name in selected:
+        log(f"--- {name} ---")
+        started = time.perf_counter()
+        results['scenarios'][name] = runners[name](args)
+        log(f"--- {name} done in {time.perf_counter() - started:.1f} s ---")
+
+    output = json.dumps(results, indent=2)
+    if args.output == "-":
+        print(output)
+    else:
+        output_path = Path(args.output) if args.output else ROOT_DIR / "benchmarks" / "results" / f"plugin_ipc_{time.strftime('%Y%m%d-%H%M%S')}.json"
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_text(output + "\n", encoding='utf-8')
+        log(f"Results written to {output_path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
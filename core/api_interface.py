@@ -1,182 +1,277 @@
+import importlib
+import json
 import os
-import subprocess
-import tempfile
-import shutil
-import tkinter as tk
-from tkinter import filedialog, messagebox
-
-
-def find_ffmpeg():
-    """Try to locate ffmpeg in PATH; return path or empty string."""
-    return shutil.which("ffmpeg") or ""
-
-
-def is_valid_mp4(path, ffmpeg_exec):
-    """
-    Probes the file for a valid MP4 structure (moov atom). Returns True if valid.
-    """
-    try:
-        subprocess.run([
-            ffmpeg_exec,
-            "-v", "error",
-            "-i", path,
-            "-t", "1",
-            "-f", "null",
-            "-"
-        ], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        return True
-    except subprocess.CalledProcessError:
-        return False
-
-
-def remux_clip(orig_path, ffmpeg_exec):
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from core import logging
+from core.env import ROOT_DIR
+from core.batch_jobs import BatchJobTracker, BatchRequests
+from core.usage_ledger import UsageLedger
+from api.inference_result import InferenceResult
+
+API_DIR = ROOT_DIR / "api"
+MANIFEST_PATH = ROOT_DIR / "storage" / "api_manifest.json"
+MANIFEST_VERSION = 1
+MANIFEST_FILES = ("api.py", "config.json", "info.json")
+DEFAULT_MODEL_INFO = {"input_types": ["text"], "output_types": ["text"]}
+
+class APIInterface:
     """
-    Attempts to remux a corrupted clip to rebuild its moov atom.
-    Returns the new temp file path if successful, else None.
+    Bridge between the core and the API adapters in api/<name>/ (see docs/Documentation.txt). Every
+    sub-directory with an api.py and a config.json is an API named after the folder; api.py provides
+    get_adapter_instance(api_config, projects_base_path) and the adapter's run_inference(request_data).
+    info.json (optional) describes each model's capabilities.
+
+    APIs, models and capabilities come from a manifest of every config.json and info.json, cached in
+    storage/api_manifest.json and re-read only for APIs whose files changed. An adapter (and its SDK) is
+    imported and constructed on first use (get_adapter, e.g. the first run_inference) or ahead of it with
+    warm_up_adapter(). An adapter that fails to load (e.g. its SDK is not installed) keeps its API listed, so
+    its stored settings survive; calls to it raise with the load error instead, until LOAD_RETRY_INTERVAL has
+    passed or the API's files change, when the next call tries to load it again.
     """
-    fd, tmp_path = tempfile.mkstemp(suffix=".mp4")
-    os.close(fd)
-    try:
-        subprocess.run([
-            ffmpeg_exec,
-            "-y",
-            "-i", orig_path,
-            "-c", "copy",
-            tmp_path
-        ], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        if is_valid_mp4(tmp_path, ffmpeg_exec):
-            return tmp_path
-        else:
-            os.remove(tmp_path)
+    LOAD_RETRY_INTERVAL = 60.0 # seconds before an adapter that failed to load is tried again
+    def __init__(self, api_dir=API_DIR, projects_base_path=None, manifest_path=MANIFEST_PATH):
+        self.api_dir = str(api_dir)
+        self.projects_base_path = str(projects_base_path or ROOT_DIR / "storage" / "projects")
+        self.manifest_path = str(manifest_path) if manifest_path else None
+        self.api_configs: Dict[str, dict] = {}
+        self.model_info: Dict[str, dict] = {}
+        self.adapters: Dict[str, Any] = {}
+        self.load_errors: Dict[str, str] = {}
+        self._load_failures: Dict[str, tuple] = {} # api_name -> (monotonic time of the failure, file stamps then)
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._discover()
+        self.batch_jobs = BatchJobTracker(self.get_adapter)
+        self.usage_ledger = UsageLedger()
+
+    # --- Discovery ---
+    def _discover(self):
+        try: entries = sorted(os.listdir(self.api_dir))
+        except OSError as e:
+            logging.logger.error(f"Could not list API directory {self.api_dir}: {e}")
+            return
+        cached = self._read_manifest()
+        manifest, refreshed = {}, []
+        for api_name in entries:
+            api_path = os.path.join(self.api_dir, api_name)
+            stamps = self._file_stamps(api_path)
+            if stamps.get("api.py") is None or stamps.get("config.json") is None: continue
+            entry = cached.get(api_name)
+            if not entry or entry.get("stamps") != stamps:
+                entry = self._read_api_files(api_name, api_path, stamps)
+                if entry is None: continue
+                refreshed.append(api_name)
+            manifest[api_name] = entry
+            self.api_configs[api_name] = entry["config"]
+            self.model_info[api_name] = entry["info"]
+        if refreshed or set(manifest) != set(cached): self._write_manifest(manifest)
+        logging.logger.info(f"APIInterface discovered APIs: {list(self.api_configs)} (manifest entries re-read: {refreshed or 'none'})")
+
+    @staticmethod
+    def _file_stamps(api_path: str) -> Dict[str, Optional[list]]:
+        """[mtime_ns, size] of each manifest file of an API (None if missing); a changed stamp invalidates its manifest entry."""
+        stamps = {}
+        for name in MANIFEST_FILES:
+            try:
+                stat = os.stat(os.path.join(api_path, name))
+                stamps[name] = [stat.st_mtime_ns, stat.st_size]
+            except OSError:
+                stamps[name] = None
+        return stamps
+
+    def _read_api_files(self, api_name: str, api_path: str, stamps: dict) -> Optional[dict]:
+        try:
+            with open(os.path.join(api_path, "config.json"), "r", encoding="utf-8") as f: config = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.logger.error(f"Skipping API '{api_name}': could not read config.json: {e}")
             return None
-    except subprocess.CalledProcessError:
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
+        return {"stamps": stamps, "config": config, "info": self._load_model_info(api_name, api_path)}
+
+    @staticmethod
+    def _load_model_info(api_name: str, api_path: str) -> dict:
+        info_path = os.path.join(api_path, "info.json")
+        if not os.path.isfile(info_path): return {}
+        try:
+            with open(info_path, "r", encoding="utf-8") as f: return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.logger.warning(f"Could not read info.json of API '{api_name}': {e}")
+            return {}
+
+    def _read_manifest(self) -> Dict[str, dict]:
+        if not self.manifest_path or not os.path.isfile(self.manifest_path): return {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f: manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.logger.warning(f"Ignoring unreadable API manifest {self.manifest_path}: {e}")
+            return {}
+        if manifest.get("version") != MANIFEST_VERSION or manifest.get("api_dir") != os.path.abspath(self.api_dir): return {}
+        return manifest.get("apis") or {}
+
+    def _write_manifest(self, apis: Dict[str, dict]):
+        if not self.manifest_path: return
+        tmp_path = self.manifest_path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": MANIFEST_VERSION, "api_dir": os.path.abspath(self.api_dir), "apis": apis}, f)
+            os.replace(tmp_path, self.manifest_path)
+        except OSError as e:
+            logging.logger.warning(f"Could not save API manifest {self.manifest_path}: {e}")
+
+    # --- Adapters (loaded on first use) ---
+    def _load_adapter(self, api_name: str):
+        try:
+            started = time.monotonic()
+            module = importlib.import_module(f"api.{api_name}.api")
+            self.adapters[api_name] = module.get_adapter_instance(self.api_configs[api_name], self.projects_base_path)
+            logging.logger.info(f"Loaded adapter for API '{api_name}' in {time.monotonic() - started:.2f}s.")
+        except Exception as e:
+            self.load_errors[api_name] = f"{type(e).__name__}: {e}"
+            self._load_failures[api_name] = (time.monotonic(), self._file_stamps(os.path.join(self.api_dir, api_name)))
+            logging.logger.exception(f"Failed to load adapter for API '{api_name}'")
+
+    def _load_error(self, api_name: str) -> Optional[str]:
+        """
+        The error of the API's last failed load while it stands. Once LOAD_RETRY_INTERVAL has passed, or the
+        API's files changed (its config is then re-read), the error is cleared so the next call loads again.
+        """
+        failure = self._load_failures.get(api_name)
+        if failure is None: return None
+        failed_at, stamps = failure
+        current = self._file_stamps(os.path.join(self.api_dir, api_name))
+        if current == stamps and time.monotonic() - failed_at < self.LOAD_RETRY_INTERVAL: return self.load_errors.get(api_name)
+        if current != stamps:
+            entry = self._read_api_files(api_name, os.path.join(self.api_dir, api_name), current)
+            if entry is not None: self.api_configs[api_name], self.model_info[api_name] = entry["config"], entry["info"]
+        self._load_failures.pop(api_name, None); self.load_errors.pop(api_name, None)
+        importlib.invalidate_caches() # An SDK installed since the failure is then found
+        logging.logger.info(f"Retrying to load adapter for API '{api_name}'.")
         return None
 
+    def get_adapter(self, api_name: str):
+        """The API's adapter, importing and constructing it on the first call (concurrent first calls share one load)."""
+        adapter = self.adapters.get(api_name)
+        if adapter is not None: return adapter
+        if api_name not in self.api_configs: raise KeyError(f"Unknown API '{api_name}'. Available: {self.list_available_apis()}")
+        with self._lock: load_lock = self._load_locks.setdefault(api_name, threading.Lock())
+        with load_lock:
+            if api_name not in self.adapters and self._load_error(api_name) is None: self._load_adapter(api_name)
+        adapter = self.adapters.get(api_name)
+        if adapter is not None: return adapter
+        raise RuntimeError(f"API '{api_name}' failed to load: {self.load_errors[api_name]}")
+
+    def warm_up_adapter(self, api_name: str, wait: bool = False) -> bool:
+        """Hint that an API will be used soon: loads its adapter in the background (or inline with wait=True). False if it cannot load."""
+        if api_name in self.adapters: return True
+        if api_name not in self.api_configs or self._load_error(api_name) is not None: return False
+        if wait:
+            try: self.get_adapter(api_name)
+            except RuntimeError: return False
+            return True
+        threading.Thread(target=self.warm_up_adapter, args=(api_name, True), name=f"AdapterWarmUp-{api_name}", daemon=True).start()
+        return True
 
-def combine_clips(input_dir, output_path, ffmpeg_exec):
-    """
-    Combines clips into one video, re-encoding audio to AAC, remuxing corrupt clips if needed.
-    """
-    clips = []
-    remuxed_files = []
-
-    for hour in sorted(os.listdir(input_dir), key=lambda x: int(x)):
-        hour_dir = os.path.join(input_dir, hour)
-        if not os.path.isdir(hour_dir):
-            continue
-        for minute_file in sorted(os.listdir(hour_dir), key=lambda x: int(os.path.splitext(x)[0])):
-            orig = os.path.join(hour_dir, minute_file)
-            if not os.path.isfile(orig):
-                continue
-
-            if is_valid_mp4(orig, ffmpeg_exec):
-                clips.append(orig)
-            else:
-                print(f"Attempting to remux corrupted clip: {orig}")
-                fixed = remux_clip(orig, ffmpeg_exec)
-                if fixed:
-                    clips.append(fixed)
-                    remuxed_files.append(fixed)
-                else:
-                    print(f"Skipping clip after failed remux: {orig}")
-
-    if not clips:
-        raise ValueError(f"No valid clips found in {input_dir}")
-
-    # Write concat list
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as list_file:
-        for clip in clips:
-            entry = clip.replace('\\', '/')
-            list_file.write(f"file '{entry}'\n")
-        list_path = list_file.name
-
-    cmd = [
-        ffmpeg_exec,
-        "-y",
-        "-f", "concat",
-        "-safe", "0",
-        "-i", list_path,
-        "-c:v", "copy",
-        "-c:a", "aac",
-        "-b:a", "128k",
-        output_path
-    ]
-    subprocess.run(cmd, check=True)
-    os.remove(list_path)
-
-    # Clean up remuxed temp files
-    for temp_file in remuxed_files:
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
-
-
-def select_folder():
-    folder = filedialog.askdirectory(title="Select Parent Folder")
-    if folder:
-        folder_var.set(folder)
-
-
-def select_ffmpeg():
-    exe = filedialog.askopenfilename(
-        title="Select ffmpeg executable",
-        filetypes=[("Executable", "*.exe"), ("All files", "*")]
-    )
-    if exe:
-        ffmpeg_var.set(exe)
-
-
-def compile_video():
-    input_dir = folder_var.get()
-    if not input_dir:
-        messagebox.showerror("Error", "Please select a folder first.")
-        return
-
-    output_file = filedialog.asksaveasfilename(
-        title="Save Combined Video As",
-        defaultextension=".mp4",
-        filetypes=[("MP4 files", "*.mp4")]
-    )
-    if not output_file:
-        return
-
-    ffmpeg_exec = ffmpeg_var.get() or find_ffmpeg()
-    if not ffmpeg_exec or not os.path.isfile(ffmpeg_exec):
-        messagebox.showerror("Error", "ffmpeg executable not found. Please set its path.")
-        return
-
-    try:
-        combine_clips(input_dir, output_file, ffmpeg_exec)
-        messagebox.showinfo("Success", f"Video saved to {output_file}")
-    except subprocess.CalledProcessError:
-        messagebox.showerror("Error", "ffmpeg encountered an error. Check the console for details.")
-    except Exception as e:
-        messagebox.showerror("Error", str(e))
-
-
-def main():
-    global folder_var, ffmpeg_var
-    root = tk.Tk()
-    root.title("Roku Daily Video Combiner")
-
-    folder_var = tk.StringVar()
-    ffmpeg_var = tk.StringVar(value=find_ffmpeg())
-
-    frame = tk.Frame(root, padx=10, pady=10)
-    frame.pack()
-
-    tk.Label(frame, text="Selected Folder:").grid(row=0, column=0, sticky="w")
-    tk.Entry(frame, textvariable=folder_var, width=40).grid(row=0, column=1, padx=5)
-    tk.Button(frame, text="Select Folder", command=select_folder).grid(row=0, column=2)
-
-    tk.Label(frame, text="ffmpeg Path:").grid(row=1, column=0, sticky="w")
-    tk.Entry(frame, textvariable=ffmpeg_var, width=40).grid(row=1, column=1, padx=5)
-    tk.Button(frame, text="Browse...", command=select_ffmpeg).grid(row=1, column=2)
-
-    tk.Button(frame, text="Compile Video", command=compile_video).grid(row=2, column=0, columnspan=3, pady=10)
-
-    root.mainloop()
-
-if __name__ == "__main__":
-    main()
+    def is_adapter_loaded(self, api_name: str) -> bool:
+        return api_name in self.adapters
+
+    # --- Queries (from the manifest; no adapter is loaded) ---
+    def list_available_apis(self) -> List[str]:
+        return list(self.api_configs)
+
+    def list_models(self, api_name: str) -> List[str]:
+        """
+        Models offered in the API's model dropdown, falling back to the models described in info.json, plus any
+        an already loaded adapter discovers itself (list_models(), e.g. local model files).
+        """
+        model_setting = self.api_configs.get(api_name, {}).get("generation_parameters", {}).get("model")
+        options = model_setting.get("options") if isinstance(model_setting, dict) else None
+        models = list(options) if options else list(self.model_info.get(api_name, {}))
+        adapter = self.adapters.get(api_name)
+        if hasattr(adapter, "list_models"):
+            try: models += [model for model in adapter.list_models() if model not in models]
+            except Exception as e: logging.logger.warning(f"Could not list models of API '{api_name}': {e}")
+        return models
+
+    def get_model_info(self, api_name: str, model_name: str) -> dict:
+        """Capabilities of a model from info.json; text-only if it is not described."""
+        return dict(DEFAULT_MODEL_INFO, **self.model_info.get(api_name, {}).get(model_name, {}))
+
+    # --- Inference ---
+    def run_inference(self, api_name: str, request_data: dict) -> InferenceResult:
+        """
+        Runs one call and returns its InferenceResult (a str; plain-string adapter results are wrapped).
+        Every call, failed ones included, is recorded in the usage ledger.
+        """
+        adapter = self.get_adapter(api_name)
+        model_name = request_data.get("model_name")
+        if model_name and model_name not in self.list_models(api_name) and model_name not in self.model_info.get(api_name, {}):
+            logging.logger.warning(f"Model '{model_name}' is not listed for API '{api_name}'; sending the request anyway.")
+        started = time.monotonic()
+        try:
+            result = adapter.run_inference(request_data)
+        except Exception:
+            self._record_usage(api_name, request_data, None, time.monotonic() - started, ok=False)
+            raise
+        if not isinstance(result, InferenceResult): result = InferenceResult(result or "")
+        if result.latency is None: result.latency = time.monotonic() - started
+        self._record_usage(api_name, request_data, result)
+        return result
+
+    def run_inference_stream(self, api_name: str, request_data: dict, cancel_event: Optional[threading.Event] = None):
+        """Streaming variant; returns the adapter's InferenceStream (api/streaming.py). Recorded in the usage ledger when it ends."""
+        adapter = self.get_adapter(api_name)
+        if not hasattr(adapter, "run_inference_stream"): raise NotImplementedError(f"API '{api_name}' does not support streaming.")
+        started = time.monotonic()
+        stream = adapter.run_inference_stream(request_data, cancel_event)
+        stream.on_finish(lambda finished, error: self._record_usage(
+            api_name, request_data, InferenceResult.from_stream(finished, time.monotonic() - started), ok=error is None, mode="stream"))
+        return stream
+
+    def _record_usage(self, api_name: str, request_data: dict, result: Optional[InferenceResult], latency: Optional[float] = None,
+                      ok: bool = True, mode: str = "call"):
+        self.usage_ledger.record(api_name, request_data.get("model_name"), result.usage if result is not None else None,
+                                 result.latency if result is not None else latency, result.time_to_first_token if result is not None else None,
+                                 result.finish_reason if result is not None else None, ok, request_data.get("plugin"), request_data.get("project_id"), mode)
+
+    def usage_summary(self, group_by=("api", "model"), since: Optional[float] = None, until: Optional[float] = None) -> List[dict]:
+        """Aggregated usage and latency from the usage ledger (see core/usage_ledger.py)."""
+        return self.usage_ledger.summary(group_by, since, until)
+
+    # --- Batch jobs (see core/batch_jobs.py) ---
+    def supports_batch(self, api_name: str) -> bool:
+        try: return hasattr(self.get_adapter(api_name), "submit_batch")
+        except (KeyError, RuntimeError): return False
+
+    def submit_batch(self, api_name: str, requests: BatchRequests, display_name: Optional[str] = None) -> str:
+        """Submits {request_id: request_data} as one provider batch job and returns the local job ID."""
+        return self.batch_jobs.submit(api_name, requests, display_name)["job_id"]
+
+    def poll_batch(self, job_id: str) -> dict:
+        return self.batch_jobs.poll(job_id)
+
+    def wait_for_batch(self, job_id: str, poll_interval: float = 60.0, timeout: Optional[float] = None) -> dict:
+        return self.batch_jobs.wait(job_id, poll_interval, timeout)
+
+    def get_batch_results(self, job_id: str) -> Dict[str, dict]:
+        """{request_id: {"text": ...} or {"error": ...}} for a finished job."""
+        return self.batch_jobs.results(job_id)
+
+    def cancel_batch(self, job_id: str) -> dict:
+        return self.batch_jobs.cancel(job_id)
+
+    def list_batch_jobs(self, active_only: bool = False) -> List[dict]:
+        return self.batch_jobs.list_jobs(active_only)
+
+    def close(self):
+        """Closes the adapters (close(), if they have one), their shared HTTP connections (api/client_registry.py) and the usage ledger; call on application exit."""
+        for api_name, adapter in list(self.adapters.items()):
+            close = getattr(adapter, "close", None)
+            if not callable(close): continue
+            try: close()
+            except Exception as e: logging.logger.warning(f"Error closing adapter '{api_name}': {e}")
+        client_registry = sys.modules.get("api.client_registry") # Only if an adapter created pooled clients
+        if client_registry is not None: client_registry.get_client_registry().close_all()
+        self.usage_ledger.close()
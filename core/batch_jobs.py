@@ -0,0 +1,188 @@
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from core import logging
+from core.env import ROOT_DIR
+
+BATCH_JOBS_PATH = ROOT_DIR / "storage" / "batch_jobs.json"
+BATCH_RESULTS_DIR = ROOT_DIR / "storage" / "batch_results"
+
+# Provider-independent job states; adapters map their own states onto these
+BATCH_PENDING = "pending"
+BATCH_RUNNING = "running"
+BATCH_SUCCEEDED = "succeeded"
+BATCH_FAILED = "failed"
+BATCH_CANCELLED = "cancelled"
+BATCH_EXPIRED = "expired"
+TERMINAL_STATES = (BATCH_SUCCEEDED, BATCH_FAILED, BATCH_CANCELLED, BATCH_EXPIRED)
+
+BatchRequests = Union[Dict[str, dict], Iterable[Tuple[str, dict]]]
+
+class BatchJobTracker:
+    """
+    Submits sets of requests as provider batch jobs (cheaper, higher limits, results within hours) and
+    tracks them in storage/batch_jobs.json, so jobs submitted in one session can be polled and collected
+    in a later one. Results are stored under storage/batch_results/<job id>.json once fetched, keyed by the
+    caller's request IDs: {request_id: {"text": str} or {"error": str}}. The job record keeps that path
+    relative to ROOT_DIR, so the storage folder can be moved with the install.
+
+    Adapters opt in by implementing:
+        submit_batch(requests: [(request_id, request_data)], display_name) -> {"provider_job_id", "state", ...}
+        get_batch_status(provider_job_id) -> {"state", ...}
+        fetch_batch_results(provider_job_id) -> {request_id: {"text"} or {"error"}}
+        cancel_batch(provider_job_id)
+    with "state" being one of the BATCH_* constants.
+    """
+    def __init__(self, get_adapter: Callable[[str], Any], path=BATCH_JOBS_PATH, results_dir=BATCH_RESULTS_DIR):
+        self.get_adapter = get_adapter
+        self.path = str(path)
+        self.results_dir = str(results_dir)
+        self._lock = threading.RLock()
+        self._jobs: Dict[str, dict] = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f: jobs = json.load(f)
+            if not isinstance(jobs, dict): raise ValueError("job list is not an object")
+            return jobs
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.logger.error(f"Could not read batch job list {self.path}: {e}")
+            return {}
+
+    def _save(self):
+        # Caller holds the lock. Written to a temp file first so a crash never leaves a truncated job list.
+        tmp_path = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f: json.dump(self._jobs, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.logger.error(f"Could not save batch job list {self.path}: {e}")
+
+    def _adapter_for(self, api_name: str):
+        adapter = self.get_adapter(api_name)
+        if not hasattr(adapter, "submit_batch"): raise NotImplementedError(f"API '{api_name}' does not support batch jobs.")
+        return adapter
+
+    @staticmethod
+    def _stored_path(path: str) -> str:
+        """`path` relative to ROOT_DIR (with "/" separators) when it is inside it, else unchanged."""
+        try: return Path(path).resolve().relative_to(Path(ROOT_DIR).resolve()).as_posix()
+        except ValueError: return path
+
+    @staticmethod
+    def _resolved_path(stored: Optional[str]) -> Optional[str]:
+        """Absolute path of a stored results path; absolute paths from older job lists are kept as they are."""
+        return os.path.join(str(ROOT_DIR), stored) if stored else None
+
+    def _job(self, job_id: str) -> dict:
+        job = self._jobs.get(job_id)
+        if job is None: raise KeyError(f"Unknown batch job '{job_id}'.")
+        return job
+
+    def submit(self, api_name: str, requests: BatchRequests, display_name: Optional[str] = None) -> dict:
+        """Submits the requests as one batch job and returns its record. Request IDs must be unique strings."""
+        items: List[Tuple[str, dict]] = list(requests.items()) if isinstance(requests, dict) else list(requests)
+        if not items: raise ValueError("A batch job needs at least one request.")
+        request_ids = [str(request_id) for request_id, _ in items]
+        if len(set(request_ids)) != len(request_ids): raise ValueError("Batch request IDs must be unique.")
+        adapter = self._adapter_for(api_name)
+        job_id = uuid.uuid4().hex[:12]
+        display_name = display_name or f"voidframe-{job_id}"
+        submitted = adapter.submit_batch([(request_id, data) for request_id, (_, data) in zip(request_ids, items)], display_name)
+        now = time.time()
+        job = {"job_id": job_id, "api_name": api_name, "display_name": display_name, "provider_job_id": submitted.pop("provider_job_id"),
+               "state": submitted.pop("state", BATCH_PENDING), "request_ids": request_ids, "created_at": now, "updated_at": now,
+               "results_path": None, "provider": submitted}
+        with self._lock:
+            self._jobs[job_id] = job
+            self._save()
+        logging.logger.info(f"Submitted batch job {job_id} ({len(items)} requests) to '{api_name}' as {job['provider_job_id']}.")
+        return dict(job)
+
+    def get(self, job_id: str) -> dict:
+        with self._lock: return dict(self._job(job_id))
+
+    def list_jobs(self, active_only: bool = False) -> List[dict]:
+        with self._lock:
+            jobs = [dict(job) for job in self._jobs.values() if not active_only or job["state"] not in TERMINAL_STATES]
+        return sorted(jobs, key=lambda job: job["created_at"])
+
+    def poll(self, job_id: str) -> dict:
+        """Refreshes the job's state from the provider; terminal jobs are not polled again."""
+        with self._lock: job = dict(self._job(job_id))
+        if job["state"] in TERMINAL_STATES: return job
+        status = self._adapter_for(job["api_name"]).get_batch_status(job["provider_job_id"])
+        with self._lock:
+            job = self._job(job_id)
+            previous = job["state"]
+            job["state"] = status.pop("state", previous)
+            job["provider"].update(status)
+            job["updated_at"] = time.time()
+            self._save()
+            job = dict(job)
+        if job["state"] != previous: logging.logger.info(f"Batch job {job_id}: {previous} -> {job['state']}.")
+        return job
+
+    def poll_active(self) -> List[dict]:
+        """Polls every unfinished job (e.g. on startup, for jobs submitted in an earlier session)."""
+        jobs = []
+        for job in self.list_jobs(active_only=True):
+            try:
+                jobs.append(self.poll(job["job_id"]))
+            except Exception as e:
+                logging.logger.warning(f"Could not poll batch job {job['job_id']}: {e}")
+        return jobs
+
+    def wait(self, job_id: str, poll_interval: float = 60.0, timeout: Optional[float] = None, cancel_event: Optional[threading.Event] = None) -> dict:
+        """Polls until the job is in a terminal state. Raises TimeoutError after `timeout` seconds."""
+        started = time.monotonic()
+        while True:
+            job = self.poll(job_id)
+            if job["state"] in TERMINAL_STATES: return job
+            if timeout is not None and time.monotonic() - started >= timeout:
+                raise TimeoutError(f"Batch job {job_id} still '{job['state']}' after {timeout}s.")
+            if cancel_event is not None:
+                if cancel_event.wait(poll_interval): return job
+            else: time.sleep(poll_interval)
+
+    def results(self, job_id: str) -> Dict[str, dict]:
+        """
+        Results keyed by the original request IDs, fetched once and then read from storage/batch_results.
+        Requests the provider returned nothing for get an "error" entry. Only available for finished jobs;
+        cancelled or expired jobs return whatever part of the batch completed.
+        """
+        with self._lock: job = dict(self._job(job_id))
+        stored_results = self._resolved_path(job["results_path"])
+        if stored_results and os.path.exists(stored_results):
+            with open(stored_results, "r", encoding="utf-8") as f: return json.load(f)
+        if job["state"] not in TERMINAL_STATES: job = self.poll(job_id)
+        if job["state"] not in TERMINAL_STATES: raise RuntimeError(f"Batch job {job_id} is still '{job['state']}'.")
+        if job["state"] == BATCH_FAILED:
+            raise RuntimeError(f"Batch job {job_id} failed: {job['provider'].get('error') or 'no details'}")
+        fetched = self._adapter_for(job["api_name"]).fetch_batch_results(job["provider_job_id"])
+        results = {request_id: fetched.get(request_id) or {"error": "No result returned for this request."} for request_id in job["request_ids"]}
+        unknown = set(fetched) - set(results)
+        if unknown: logging.logger.warning(f"Batch job {job_id} returned {len(unknown)} result(s) for unknown request IDs; ignored.")
+        results_path = os.path.join(self.results_dir, f"{job_id}.json")
+        os.makedirs(self.results_dir, exist_ok=True)
+        with open(f"{results_path}.tmp", "w", encoding="utf-8") as f: json.dump(results, f, indent=2, ensure_ascii=False)
+        os.replace(f"{results_path}.tmp", results_path)
+        with self._lock:
+            self._job(job_id)["results_path"] = self._stored_path(results_path)
+            self._save()
+        failed = sum(1 for result in results.values() if "error" in result)
+        logging.logger.info(f"Fetched results of batch job {job_id}: {len(results) - failed} succeeded, {failed} failed.")
+        return results
+
+    def cancel(self, job_id: str) -> dict:
+        with self._lock: job = dict(self._job(job_id))
+        if job["state"] in TERMINAL_STATES: return job
+        self._adapter_for(job["api_name"]).cancel_batch(job["provider_job_id"])
+        return self.poll(job_id)
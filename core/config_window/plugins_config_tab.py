@@ -1,9 +1,18 @@
-from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QHBoxLayout, QCheckBox
+from PyQt6.QtWidgets import (
+    QWidget, QVBoxLayout, QLabel, QHBoxLayout, QCheckBox, QGroupBox, QPushButton,
+    QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView
+)
+from core import logging # Use Voidframe logger
 
 class PluginsConfigWidget(QWidget):
+    METHOD_COLUMNS = ["Plugin", "Method", "Calls", "Errors", "Timeouts", "p50 ms", "p95 ms", "p99 ms", "Max ms", "Sent KB", "Recv KB"]
+    PROCESS_COLUMNS = ["Plugin", "State", "PID", "CPU s", "CPU %", "RSS MB", "Restarts", "Notes"]
+
     def __init__(self, data_router, parent=None):
         super().__init__(parent)
         self.data_router = data_router
+        self.process_table = None
+        self.method_table = None
         self.init_ui()
 
     def init_ui(self):
@@ -21,4 +30,89 @@ class PluginsConfigWidget(QWidget):
                 h_layout.addWidget(checkbox)
                 h_layout.addWidget(mode_label)
                 layout.addLayout(h_layout)
+        if hasattr(plugin_manager, 'get_plugin_metrics'):
+            layout.addWidget(self._create_performance_section())
+            self.refresh_performance()
         self.setLayout(layout)
+
+    # --- Performance Section ---
+    def _create_performance_section(self) -> QGroupBox:
+        group = QGroupBox("Performance")
+        group_layout = QVBoxLayout(group)
+
+        self.process_table = self._create_table(self.PROCESS_COLUMNS)
+        self.process_table.setToolTip("Plugin process health and resource usage (sampled by the plugin supervisor).")
+        group_layout.addWidget(self.process_table)
+
+        self.method_table = self._create_table(self.METHOD_COLUMNS)
+        self.method_table.setToolTip("Per-method call latency and payload sizes since the application started.")
+        group_layout.addWidget(self.method_table)
+
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        refresh_button = QPushButton("Refresh")
+        refresh_button.clicked.connect(self.refresh_performance)
+        reset_button = QPushButton("Reset Counters")
+        reset_button.setToolTip("Clear the collected call statistics for all plugins.")
+        reset_button.clicked.connect(self._reset_performance_counters)
+        button_layout.addWidget(refresh_button)
+        button_layout.addWidget(reset_button)
+        group_layout.addLayout(button_layout)
+        return group
+
+    def _create_table(self, columns) -> QTableWidget:
+        table = QTableWidget(0, len(columns))
+        table.setHorizontalHeaderLabels(columns)
+        table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        table.verticalHeader().setVisible(False)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        return table
+
+    @staticmethod
+    def _fmt(value, digits: int = 1) -> str:
+        if value is None: return "-"
+        return f"{value:.{digits}f}" if isinstance(value, float) else str(value)
+
+    def _set_row(self, table: QTableWidget, row: int, values: list):
+        for column, value in enumerate(values):
+            table.setItem(row, column, QTableWidgetItem(value))
+
+    def refresh_performance(self):
+        """Re-reads the PluginManager query API and repopulates both tables."""
+        if self.process_table is None or self.method_table is None: return
+        try:
+            metrics = self.data_router.plugin_manager.get_plugin_metrics()
+        except Exception as e:
+            logging.logger.error(f"Could not read plugin metrics: {e}", exc_info=True)
+            return
+
+        self.process_table.setRowCount(len(metrics))
+        method_rows = []
+        for row, (plugin_name, entry) in enumerate(sorted(metrics.items())):
+            process = entry.get('process') or {}
+            health = entry.get('health') or {}
+            rss_bytes = process.get('rss_bytes')
+            notes = "; ".join(health.get('limit_breaches') or []) or (health.get('last_error') or "")
+            observers = entry.get('observers') or {}
+            if observers.get('dropped') or observers.get('errors'):
+                notes = "; ".join(filter(None, [notes, f"observer: {observers['errors']} errors, {observers['dropped']} dropped"]))
+            self._set_row(self.process_table, row, [
+                plugin_name, health.get('state', "-"), self._fmt(process.get('pid')),
+                self._fmt(process.get('cpu_seconds'), 2), self._fmt(process.get('cpu_percent')),
+                self._fmt(rss_bytes / (1024 * 1024) if rss_bytes is not None else None),
+                self._fmt(health.get('restart_count')), notes
+            ])
+            for method, stats in sorted(entry.get('methods', {}).items()):
+                method_rows.append([
+                    plugin_name, method, str(stats['calls']), str(stats['errors']), str(stats['timeouts']),
+                    self._fmt(stats['p50_latency_ms']), self._fmt(stats['p95_latency_ms']), self._fmt(stats['p99_latency_ms']),
+                    self._fmt(stats['max_latency_ms']), self._fmt(stats['bytes_sent'] / 1024), self._fmt(stats['bytes_received'] / 1024)
+                ])
+
+        self.method_table.setRowCount(len(method_rows))
+        for row, values in enumerate(method_rows):
+            self._set_row(self.method_table, row, values)
+
+    def _reset_performance_counters(self):
+        self.data_router.plugin_manager.reset_plugin_metrics()
+        self.refresh_performance()
@@ -1,3 +1,4 @@
+import copy
 import threading
 import time
 import os
@@ -6,6 +7,9 @@ from typing import TYPE_CHECKING, Optional, List, Dict, Any
 from pathlib import Path
 from PyQt6.QtCore import QObject, pyqtSignal, QRunnable, QThreadPool, pyqtSlot
 from core import logging # Import the logging module setup
+from core.history_sync import HistorySnapshot
+from core.deadline import Deadline, DeadlineExceeded
+from core.map_reduce import MapReduceJob, load_settings as load_map_reduce_settings
 from core.env import ROOT_DIR
 
 STATE_FILE_PATH = ROOT_DIR / "storage" / "program_state.json"
@@ -31,11 +35,13 @@ class ApiWorker(QRunnable):
     Worker thread for executing API calls asynchronously.
     Emits signals on completion or error.
     """
-    def __init__(self, data_router: 'DataRouter', api_name: str, request_data: dict):
+    def __init__(self, data_router: 'DataRouter', api_name: str, request_data: dict, deadline: Optional[Deadline] = None, map_reduce_settings: Optional[dict] = None):
         super().__init__()
         self.data_router = data_router # Store reference to DataRouter
         self.api_name = api_name
         self.request_data = request_data
+        self.deadline = deadline or Deadline()
+        self.map_reduce_settings = map_reduce_settings # None disables map-reduce for over-long requests
 
     @pyqtSlot()
     def run(self):
@@ -46,16 +52,26 @@ class ApiWorker(QRunnable):
                  raise RuntimeError("APIInterface not available in DataRouter for worker.")
 
             logging.logger.info(f"API Worker started for API: '{self.api_name}'")
+            if self.deadline.expired():
+                 raise DeadlineExceeded(f"Request latency budget ({self.deadline.budget}s) used up before the API call.")
             start_time = time.monotonic()
-            # Call the APIInterface's run_inference method
-            response_text = self.data_router.api_interface.run_inference(
-                self.api_name, self.request_data
-            )
+            if self.map_reduce_settings and MapReduceJob.needs_map_reduce(self.request_data, self.map_reduce_settings):
+                response_text = self._run_map_reduce()
+                self.deadline = Deadline(self.deadline.budget) # The job ran on its own budget; post hooks get a fresh interactive one
+            else:
+                remaining = self.deadline.remaining()
+                if remaining is not None: self.request_data["request_timeout"] = remaining # Adapters use it as the SDK timeout
+                # Call the APIInterface's run_inference method
+                response_text = self.data_router.api_interface.run_inference(
+                    self.api_name, self.request_data
+                )
             end_time = time.monotonic()
-            logging.logger.info(f"API Worker finished for '{self.api_name}'. Duration: {end_time - start_time:.2f}s")
+            usage = getattr(response_text, "usage", None) # InferenceResult metadata; already recorded in the usage ledger
+            throughput = f", tokens in/out: {usage.get('input_tokens')}/{usage.get('output_tokens')}, {response_text.tokens_per_second or 0:.1f} tok/s" if usage else ""
+            logging.logger.info(f"API Worker finished for '{self.api_name}'. Duration: {end_time - start_time:.2f}s{throughput}")
 
             # --- Post-API Hooks ---
-            modified_response = self.data_router._apply_post_api_hooks(response_text, self.request_data)
+            modified_response = self.data_router._apply_post_api_hooks(response_text, self.request_data, self.deadline)
             if modified_response is None: # Hook indicated stop
                  logging.logger.warning("API call aborted after post_api hooks.")
                  return
@@ -82,7 +98,7 @@ class ApiWorker(QRunnable):
 
             # --- Post-History Hooks ---
             current_history = self.data_router.chat_manager.get_chat_history() if self.data_router.chat_manager else []
-            final_history = self.data_router._apply_post_history_hooks(current_history)
+            final_history = self.data_router._apply_post_history_hooks(current_history, self.deadline)
             if final_history is None:
                  logging.logger.warning("Processing stopped after post_history hooks.")
                  return
@@ -92,12 +108,30 @@ class ApiWorker(QRunnable):
             error_message = f"API call to '{self.api_name}' failed:\n{type(e).__name__}: {e}"
             self.data_router.apiErrorOccurred.emit(error_message)
 
+    def _run_map_reduce(self) -> str:
+        """
+        Answers an over-long request in chunks (core/map_reduce.py); progress and partial results are sent to the UI.
+        The job is bounded by its own "time_budget", not the interactive request latency budget.
+        """
+        api_interface = self.data_router.api_interface
+        progress_signal = self.data_router.mapReduceProgress
+        job = MapReduceJob(lambda request_data: api_interface.run_inference(self.api_name, request_data),
+                           self.request_data, self.map_reduce_settings,
+                           on_progress=progress_signal.emit,
+                           on_partial=lambda partial: progress_signal.emit({"stage": "partial", **partial}))
+        return job.run()
+
 # --- Data Router Class ---
 class DataRouter(QObject):
     newMessageReady = pyqtSignal(dict)
     apiErrorOccurred = pyqtSignal(str)
     showMessageRequest = pyqtSignal(dict)
     clearDisplayRequest = pyqtSignal()
+    mapReduceProgress = pyqtSignal(dict) # {"stage": "map"|"reduce", "done", "total"} or {"stage": "partial", "index", "total", "text"}
+
+    # Overall latency budget (seconds) of one user request, across hooks and the API call.
+    # Overridden by "request_latency_budget" in project_config.json; None/0 disables it.
+    DEFAULT_REQUEST_LATENCY_BUDGET = None
 
     def __init__(self):
         super().__init__()
@@ -328,8 +362,12 @@ class DataRouter(QObject):
              self.config_window.activateWindow()
              self.config_window.raise_()
 
-    def handle_user_input(self, user_input: str):
-        # [ Remains the same ]
+    def handle_user_input(self, user_input: str, origin: Optional[str] = None):
+        """
+        Runs one chat turn for user_input. `origin` names the interface or plugin the input came from; it is
+        set as request_data["plugin"] (unless a pre_api hook set one), which attributes the call in the usage
+        ledger. Defaults to the selected UI.
+        """
         logging.logger.info(f"Handling user input: '{user_input[:100]}...'")
         if not self.api_interface:
              logging.logger.error("Cannot handle input: APIInterface is not registered.")
@@ -351,8 +389,12 @@ class DataRouter(QObject):
              self.apiErrorOccurred.emit(f"Error: No model selected for '{self.active_api_name}'. Please select a model in configuration.")
              return
 
-        logging.logger.debug("Applying pre_history hooks...")
-        modified_input = self._apply_pre_history_hooks(user_input)
+        deadline = Deadline(self._request_latency_budget())
+        self.api_interface.warm_up_adapter(self.active_api_name) # Imports the adapter while the pre hooks run (first turn only)
+        if self.plugin_manager: # Lazy plugins needed after the API call can start while it runs
+            self.plugin_manager.warm_up_hook_subscribers(('pre_api', 'post_api', 'post_history'))
+        logging.logger.debug(f"Applying pre_history hooks... ({deadline})")
+        modified_input = self._apply_pre_history_hooks(user_input, deadline)
         if modified_input is None:
              logging.logger.info("Input processing stopped by pre_history hook.")
              return
@@ -393,18 +435,33 @@ class DataRouter(QObject):
              return
 
         logging.logger.debug("Applying pre_api hooks...")
-        modified_request_data = self._apply_pre_api_hooks(request_data)
+        modified_request_data = self._apply_pre_api_hooks(request_data, deadline)
         if modified_request_data is None:
              logging.logger.info("API call stopped by pre_api hook.")
              return
         request_data = modified_request_data
+        request_data.setdefault("plugin", origin or self._request_origin())
 
         logging.logger.info(f"Dispatching API call to worker thread for API: '{self.active_api_name}'...")
-        worker = ApiWorker(self, self.active_api_name, request_data)
+        project_config = getattr(self.plugin_manager, 'project_config', None) or {}
+        worker = ApiWorker(self, self.active_api_name, request_data, deadline, load_map_reduce_settings(project_config))
         self.threadpool.start(worker)
         logging.logger.debug("API worker started in thread pool.")
 
 
+    def _request_origin(self) -> str:
+        """The interface chat turns come from by default: the selected UI plugin."""
+        project_config = getattr(self.plugin_manager, 'project_config', None) or {}
+        return project_config.get("selected_ui") or "chat"
+
+    def _request_latency_budget(self) -> Optional[float]:
+        project_config = getattr(self.plugin_manager, 'project_config', None) or {}
+        budget = project_config.get("request_latency_budget", self.DEFAULT_REQUEST_LATENCY_BUDGET)
+        try: return float(budget) if budget else None
+        except (TypeError, ValueError):
+            logging.logger.error(f"Invalid request_latency_budget '{budget}' in project config. Running without a budget.")
+            return None
+
     # --- Prompt Loading Helpers ---
     def _load_system_prompt(self) -> str:
         """Loads the global system prompt from storage (expects plain text in .json file)."""
@@ -524,98 +581,80 @@ class DataRouter(QObject):
         return request_data
 
 
-    # Plugin Hooks (_get_plugin_name, _apply_..._hooks)
-    # [ Remain the same ]
-    def _get_plugin_name(self, plugin_instance):
-        try:
-            if hasattr(plugin_instance, 'config') and isinstance(plugin_instance.config, dict):
-                return plugin_instance.config.get('name', type(plugin_instance).__name__)
-            else:
-                return type(plugin_instance).__name__
-        except Exception:
-            return "UnknownPlugin"
-
-    def _apply_pre_history_hooks(self, input_text: str) -> Optional[str]:
+    # Plugin Hooks (_run_hook_chain, _apply_..._hooks)
+    # Hooks are dispatched over JSON-RPC, only to plugins that implement them (see PluginManager.get_hook_subscribers).
+    # Mutators run in order and may modify the value or stop processing (by returning None);
+    # observers get the final value afterwards on a background dispatcher and cannot change or stop anything.
+    # Mutators share the request's Deadline: each call is bounded by the remaining budget. Once it is used up,
+    # optional plugins are skipped and a plugin marked "required" in its config.json aborts the request.
+    def _run_hook_chain(self, hook_name: str, value_param: str, value: Any, extra_params: Optional[dict] = None, expected_type: Optional[type] = None, deadline: Optional[Deadline] = None) -> Any:
+        """Pipes `value` through every mutating subscriber of `hook_name`. Returns None if a plugin requested stop."""
+        current_value = value
+        deadline = deadline or Deadline()
+        for plugin_name, mode in self.plugin_manager.get_hook_subscribers(hook_name, self.plugin_manager.HOOK_MUTATE):
+            required = self.plugin_manager.is_plugin_required(plugin_name)
+            if deadline.expired():
+                if required: return self._abort_on_deadline(hook_name, plugin_name, deadline)
+                logging.logger.warning(f"Skipping {hook_name} hook of optional plugin '{plugin_name}': request latency budget used up ({deadline.elapsed():.2f}s).")
+                continue
+            logging.logger.debug(f"Calling {hook_name} hook for plugin: {plugin_name}")
+            result = self._call_hook(plugin_name, hook_name, value_param, current_value, extra_params, deadline.timeout(self.plugin_manager.DEFAULT_PLUGIN_TIMEOUT))
+            if self.plugin_manager.is_error_result(result):
+                if required and deadline.expired(): return self._abort_on_deadline(hook_name, plugin_name, deadline)
+                logging.logger.error(f"Error executing {hook_name} hook in plugin '{plugin_name}': {result['error'].get('message')}. Skipping hook.")
+                continue
+            if result is None:
+                logging.logger.info(f"Plugin '{plugin_name}' {hook_name} hook requested stop (returned None).")
+                return None
+            if expected_type is not None and not isinstance(result, expected_type):
+                logging.logger.error(f"Plugin '{plugin_name}' {hook_name} hook returned non-{expected_type.__name__} type ({type(result).__name__}). Discarding changes from this hook.")
+                continue
+            current_value = HistorySnapshot(current_value.chat_id, result) if isinstance(current_value, HistorySnapshot) else result
+        self._notify_hook_observers(hook_name, value_param, current_value, extra_params)
+        return current_value
+
+    def _call_hook(self, plugin_name: str, hook_name: str, value_param: str, value: Any, extra_params: Optional[dict] = None, timeout: Optional[float] = None) -> Any:
+        """History snapshots go through the incremental sync protocol; everything else is sent as-is."""
+        if isinstance(value, HistorySnapshot):
+            return self.plugin_manager.call_plugin_with_history(plugin_name, hook_name, value, extra_params, timeout)
+        return self.plugin_manager.call_plugin_method(plugin_name, hook_name, {value_param: value, **(extra_params or {})}, timeout)
+
+    def _abort_on_deadline(self, hook_name: str, plugin_name: str, deadline: Deadline) -> None:
+        message = f"Request exceeded its latency budget of {deadline.budget}s before required plugin '{plugin_name}' finished its {hook_name} hook."
+        logging.logger.error(message)
+        self.apiErrorOccurred.emit(message)
+        return None
+
+    def _notify_hook_observers(self, hook_name: str, value_param: str, value: Any, extra_params: Optional[dict] = None):
+        """Queues the final value for observer subscribers and returns immediately (see ObserverDispatcher)."""
+        subscribers = self.plugin_manager.get_hook_subscribers(hook_name, self.plugin_manager.HOOK_OBSERVE)
+        if not subscribers: return
+        # The request path keeps using (and may mutate) the originals while observers are still queued
+        if not isinstance(value, HistorySnapshot): value = copy.deepcopy(value)
+        extra_params = copy.deepcopy(extra_params)
+        for plugin_name, mode in subscribers:
+            logging.logger.debug(f"Queueing {hook_name} observer: {plugin_name}")
+            self.plugin_manager.observer_dispatcher.submit(plugin_name, hook_name,
+                lambda plugin_name=plugin_name: self._call_hook(plugin_name, hook_name, value_param, value, extra_params))
+
+    def _apply_pre_history_hooks(self, input_text: str, deadline: Optional[Deadline] = None) -> Optional[str]:
         if not self.plugin_manager: return input_text
-        current_text = input_text
-        enabled_plugins = self.plugin_manager.get_enabled_plugins()
-        extension_plugins = [p for p in enabled_plugins if self.plugin_manager.get_plugin_type(self._get_plugin_name(p)) == 'extension']
-        for plugin in extension_plugins:
-            plugin_name = self._get_plugin_name(plugin)
-            if hasattr(plugin, 'pre_history') and callable(plugin.pre_history):
-                try:
-                    logging.logger.debug(f"Calling pre_history hook for plugin: {plugin_name}")
-                    modified_text = plugin.pre_history(current_text)
-                    if modified_text is None:
-                        logging.logger.info(f"Plugin '{plugin_name}' pre_history hook requested stop (returned None).")
-                        return None
-                    current_text = modified_text
-                except Exception as e:
-                    logging.logger.exception(f"Error executing pre_history hook in plugin '{plugin_name}'. Skipping hook.")
-        return current_text
-
-    def _apply_pre_api_hooks(self, request_data: dict) -> Optional[dict]:
+        return self._run_hook_chain('pre_history', 'input_text', input_text, deadline=deadline)
+
+    def _apply_pre_api_hooks(self, request_data: dict, deadline: Optional[Deadline] = None) -> Optional[dict]:
         if not self.plugin_manager: return request_data
-        current_data = request_data
-        enabled_plugins = self.plugin_manager.get_enabled_plugins()
-        extension_plugins = [p for p in enabled_plugins if self.plugin_manager.get_plugin_type(self._get_plugin_name(p)) == 'extension']
-        for plugin in extension_plugins:
-            plugin_name = self._get_plugin_name(plugin)
-            if hasattr(plugin, 'pre_api') and callable(plugin.pre_api):
-                try:
-                    logging.logger.debug(f"Calling pre_api hook for plugin: {plugin_name}")
-                    modified_data = plugin.pre_api(current_data)
-                    if modified_data is None:
-                        logging.logger.info(f"Plugin '{plugin_name}' pre_api hook requested stop (returned None).")
-                        return None
-                    if not isinstance(modified_data, dict):
-                         logging.logger.error(f"Plugin '{plugin_name}' pre_api hook returned non-dict type ({type(modified_data).__name__}). Discarding changes from this hook.")
-                    else:
-                         current_data = modified_data
-                except Exception as e:
-                    logging.logger.exception(f"Error executing pre_api hook in plugin '{plugin_name}'. Skipping hook.")
-        return current_data
-
-    def _apply_post_api_hooks(self, response_text: str, request_data: dict) -> Optional[str]:
+        return self._run_hook_chain('pre_api', 'prompt', request_data, expected_type=dict, deadline=deadline)
+
+    def _apply_post_api_hooks(self, response_text: str, request_data: dict, deadline: Optional[Deadline] = None) -> Optional[str]:
         if not self.plugin_manager: return response_text
-        current_text = response_text
-        enabled_plugins = self.plugin_manager.get_enabled_plugins()
-        extension_plugins = [p for p in enabled_plugins if self.plugin_manager.get_plugin_type(self._get_plugin_name(p)) == 'extension']
-        for plugin in extension_plugins:
-            plugin_name = self._get_plugin_name(plugin)
-            if hasattr(plugin, 'post_api') and callable(plugin.post_api):
-                try:
-                    logging.logger.debug(f"Calling post_api hook for plugin: {plugin_name}")
-                    modified_text = plugin.post_api(current_text, request_data)
-                    if modified_text is None:
-                        logging.logger.info(f"Plugin '{plugin_name}' post_api hook requested stop (returned None).")
-                        return None
-                    current_text = modified_text
-                except Exception as e:
-                    logging.logger.exception(f"Error executing post_api hook in plugin '{plugin_name}'. Skipping hook.")
-        return current_text
-
-    def _apply_post_history_hooks(self, chat_history: list) -> Optional[list]:
+        return self._run_hook_chain('post_api', 'response_text', response_text, {'prompt': request_data}, deadline=deadline)
+
+    def _apply_post_history_hooks(self, chat_history: list, deadline: Optional[Deadline] = None) -> Optional[list]:
         if not self.plugin_manager: return chat_history
-        current_history = chat_history
-        enabled_plugins = self.plugin_manager.get_enabled_plugins()
-        extension_plugins = [p for p in enabled_plugins if self.plugin_manager.get_plugin_type(self._get_plugin_name(p)) == 'extension']
-        for plugin in extension_plugins:
-            plugin_name = self._get_plugin_name(plugin)
-            if hasattr(plugin, 'post_history') and callable(plugin.post_history):
-                try:
-                    logging.logger.debug(f"Calling post_history hook for plugin: {plugin_name}")
-                    modified_history = plugin.post_history(list(current_history))
-                    if modified_history is None:
-                        logging.logger.info(f"Plugin '{plugin_name}' post_history hook requested stop (returned None).")
-                        return None
-                    if not isinstance(modified_history, list):
-                         logging.logger.error(f"Plugin '{plugin_name}' post_history hook returned non-list type ({type(modified_history).__name__}). Discarding changes from this hook.")
-                    else:
-                         current_history = modified_history
-                except Exception as e:
-                    logging.logger.exception(f"Error executing post_history hook in plugin '{plugin_name}'. Skipping hook.")
-        return current_history
+        # Plugins keep a mirror of the conversation; only appended/edited messages are sent (core/history_sync.py)
+        chat_id = getattr(self.chat_manager, 'current_file', None) if self.chat_manager else None
+        result = self._run_hook_chain('post_history', 'chat_history', HistorySnapshot(chat_id, list(chat_history)), expected_type=list, deadline=deadline)
+        return result.messages if isinstance(result, HistorySnapshot) else result
 
     # Chat Management Passthrough
     # [ Remain the same ]
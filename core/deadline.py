@@ -0,0 +1,37 @@
+import time
+from typing import Optional
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request runs out of its latency budget."""
+    pass
+
+class Deadline:
+    """
+    Overall latency budget of one user request, created in DataRouter.handle_user_input and
+    handed to every hook call and the adapter call, which each get min(remaining, their own timeout).
+    A budget of None (or <= 0) means unbounded: every call keeps its own default timeout.
+    """
+    def __init__(self, budget: Optional[float] = None):
+        self.budget = budget if budget and budget > 0 else None
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + self.budget if self.budget is not None else None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left (never negative), or None if unbounded."""
+        if self.expires_at is None: return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def timeout(self, default: float) -> float:
+        """The timeout to use for a call whose own limit is `default`."""
+        remaining = self.remaining()
+        return default if remaining is None else min(default, remaining)
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def __repr__(self):
+        remaining = self.remaining()
+        return f"Deadline(budget={self.budget}, remaining={'unbounded' if remaining is None else f'{remaining:.2f}s'})"
@@ -0,0 +1,135 @@
+"""
+Versioned, incremental chat-history sync between the host and plugin processes.
+
+Instead of sending the whole conversation on every history hook, the host keeps, per plugin,
+the fingerprints of the history it last sent. Each call carries only appended or edited
+messages plus a version number. The plugin process keeps a mirror of the conversation and
+applies those deltas. A full resync is sent on the first call, after a chat switch, after a
+plugin restart, or whenever the plugin reports a version mismatch.
+
+Wire format (the "history_sync" param):
+    full:  {"full": true, "chat_id": ..., "version": v, "messages": [...]}
+    delta: {"full": false, "chat_id": ..., "base_version": b, "version": v, "length": n, "changes": [[index, message], ...]}
+A mutating hook that returns a list is answered with {"history_delta": {"length": n, "changes": [...]}},
+relative to the history it was given.
+"""
+import copy
+import hashlib
+import json
+from collections.abc import Sequence
+
+# JSON-RPC error code a plugin process returns when a delta does not match its mirror.
+HISTORY_OUT_OF_SYNC = -32010
+
+# Above this share of changed messages a full resync is sent instead of a delta.
+FULL_RESYNC_RATIO = 0.5
+
+class HistoryOutOfSync(Exception):
+    """Raised by HistoryMirror.apply() when a delta is based on a different version or chat."""
+    pass
+
+def message_fingerprint(message) -> str:
+    encoded = json.dumps(message, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+# --- Host side ---
+class HistorySnapshot:
+    """One version of the host's history. Fingerprints are computed once and shared by all plugins."""
+    def __init__(self, chat_id, messages: list):
+        self.chat_id = chat_id
+        self.messages = messages
+        self._fingerprints = None
+
+    @property
+    def fingerprints(self) -> list:
+        if self._fingerprints is None:
+            self._fingerprints = [message_fingerprint(m) for m in self.messages]
+        return self._fingerprints
+
+class HistorySyncState:
+    """What the host believes one plugin process's mirror contains."""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.chat_id = None
+        self.version = 0
+        self.fingerprints = None # None means the plugin has no mirror yet
+
+    def build_delta(self, snapshot: HistorySnapshot, force_full: bool = False) -> dict:
+        """Builds the next delta (or a full resync) and records it as sent."""
+        new_fingerprints = snapshot.fingerprints
+        version = self.version + 1
+        delta = None
+        if not force_full and self.fingerprints is not None and self.chat_id == snapshot.chat_id:
+            old = self.fingerprints
+            changes = [[i, snapshot.messages[i]] for i, fp in enumerate(new_fingerprints) if i >= len(old) or old[i] != fp]
+            if len(changes) <= max(1, FULL_RESYNC_RATIO * len(new_fingerprints)):
+                delta = {"full": False, "chat_id": snapshot.chat_id, "base_version": self.version, "version": version,
+                         "length": len(new_fingerprints), "changes": changes}
+        if delta is None:
+            delta = {"full": True, "chat_id": snapshot.chat_id, "version": version, "messages": list(snapshot.messages)}
+        # Committed optimistically: if the plugin never applied it, the next delta's base_version will not
+        # match its mirror and the plugin answers HISTORY_OUT_OF_SYNC, which triggers a full resync.
+        self.chat_id = snapshot.chat_id; self.version = version; self.fingerprints = list(new_fingerprints)
+        return delta
+
+def apply_history_delta(messages: list, history_delta: dict) -> list:
+    """Applies a {"length", "changes"} delta returned by a plugin to the history it was given. Returns a new list."""
+    length = history_delta.get("length", len(messages))
+    result = list(messages[:length])
+    for index, message in history_delta.get("changes", []):
+        if index < len(result): result[index] = message
+        else: result.append(message)
+    return result
+
+# --- Plugin side ---
+class LazyHistoryView(Sequence):
+    """
+    Read-only view over a mirror version handed to plugin hooks. Building it is O(1);
+    messages are copied only when accessed, so plugins cannot corrupt the mirror.
+    """
+    def __init__(self, messages: tuple):
+        self._messages = messages
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice): return [copy.deepcopy(m) for m in self._messages[index]]
+        return copy.deepcopy(self._messages[index])
+
+    def __repr__(self):
+        return f"LazyHistoryView(len={len(self._messages)})"
+
+class HistoryMirror:
+    """A plugin process's copy of the conversation, kept current by host deltas."""
+    def __init__(self):
+        self.chat_id = None
+        self.version = 0
+        self.messages = ()
+
+    def apply(self, sync: dict) -> LazyHistoryView:
+        if sync.get("full"):
+            messages = tuple(sync.get("messages", []))
+        else:
+            if self.version == 0 or sync.get("chat_id") != self.chat_id or sync.get("base_version") != self.version:
+                raise HistoryOutOfSync(f"Mirror at version {self.version} (chat {self.chat_id}), delta based on {sync.get('base_version')} (chat {sync.get('chat_id')}).")
+            # Copy-on-write so views handed out earlier stay consistent
+            result = list(self.messages[:sync["length"]])
+            for index, message in sync.get("changes", []):
+                if index < len(result): result[index] = message
+                elif index == len(result): result.append(message)
+                else: raise HistoryOutOfSync(f"Delta change at index {index} leaves a gap (mirror length {len(result)}).")
+            if len(result) != sync["length"]:
+                raise HistoryOutOfSync(f"Delta expected length {sync['length']}, mirror has {len(result)}.")
+            messages = tuple(result)
+        self.chat_id = sync.get("chat_id"); self.version = sync.get("version", self.version + 1); self.messages = messages
+        return LazyHistoryView(messages)
+
+    def diff(self, base: LazyHistoryView, result) -> dict:
+        """Encodes a hook's returned history relative to the view it was given."""
+        if result is base: return {"length": len(base), "changes": []}
+        base_messages = base._messages
+        changes = [[i, m] for i, m in enumerate(result) if i >= len(base_messages) or m != base_messages[i]]
+        return {"length": len(result), "changes": changes}
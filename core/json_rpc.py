@@ -0,0 +1,50 @@
+"""
+Minimal JSON-RPC 2.0 helpers shared by the PluginManager (host) and plugin_executor (plugin process).
+Messages are exchanged as one JSON object per line over the plugin's stdin/stdout.
+"""
+import json
+import uuid
+
+JSONRPC_VERSION = "2.0"
+
+# Standard JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+# Implementation-defined server errors (-32000 to -32099)
+PLUGIN_ERROR = -32000     # Plugin process unavailable, pipe broken, plugin raised, ...
+PLUGIN_TIMEOUT = -32001   # No response within the allowed time
+
+def create_request(method: str, params: dict = None, request_id: str = None) -> dict:
+    """Builds a request object. A fresh UUID is used when no id is given."""
+    request = {"jsonrpc": JSONRPC_VERSION, "method": method, "id": request_id if request_id is not None else str(uuid.uuid4())}
+    if params is not None: request["params"] = params
+    return request
+
+def create_notification(method: str, params: dict = None) -> dict:
+    """Builds a notification (a request without id; no response is expected)."""
+    notification = {"jsonrpc": JSONRPC_VERSION, "method": method}
+    if params is not None: notification["params"] = params
+    return notification
+
+def create_response(request_id, result) -> dict:
+    return {"jsonrpc": JSONRPC_VERSION, "id": request_id, "result": result}
+
+def create_error_response(request_id, code: int, message: str, data=None) -> dict:
+    error = {"code": code, "message": message}
+    if data is not None: error["data"] = data
+    return {"jsonrpc": JSONRPC_VERSION, "id": request_id, "error": error}
+
+def is_error_response(message) -> bool:
+    return isinstance(message, dict) and "error" in message and message.get("jsonrpc") == JSONRPC_VERSION
+
+def serialize_message(message: dict) -> str:
+    """Serializes to a single line (compact separators, raw UTF-8) suitable for line-delimited framing."""
+    return json.dumps(message, ensure_ascii=False, separators=(',', ':'))
+
+def deserialize_message(line: str) -> dict:
+    """Parses one line. Raises json.JSONDecodeError on malformed input."""
+    return json.loads(line)
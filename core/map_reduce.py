@@ -0,0 +1,300 @@
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+from core import logging
+from core.deadline import Deadline, DeadlineExceeded
+from core.env import ROOT_DIR
+
+CHARS_PER_TOKEN = 4 # Rough estimate; good enough to size chunks well below a model's context window
+UPLOAD_DIR = ROOT_DIR / "storage" / "file_upload"
+SEGMENT_SUBDIR = "segments" # Media segments go to storage/file_upload/segments/<content key>/
+MEDIA_EXTENSIONS = (".mp3", ".wav", ".m4a", ".aac", ".flac", ".ogg", ".mp4", ".mov", ".mkv", ".webm", ".avi")
+
+DEFAULT_SETTINGS = {
+    "enabled": False,           # Opt-in: long-context models take most long inputs whole, which answers better than chunks
+    "threshold_tokens": 32000,  # Requests whose last user message is longer than this are mapped/reduced
+    "chunk_tokens": 8000,
+    "overlap_tokens": 200,
+    "segment_seconds": 600,     # Media longer than this is split into segments of this length
+    "max_concurrency": 4,
+    "requests_per_minute": 60,
+    "max_retries": 2,
+    "time_budget": None,        # Seconds for the whole job; None = unbounded (the interactive request budget does not apply)
+    "map_prompt": ("This is part {index} of {total} of a longer input. The original request was:\n{request}\n\n"
+                   "Extract everything from this part that is relevant to the request, keeping facts, names and figures. "
+                   "Do not answer the request yet.\n\n--- Part {index}/{total} ---\n{chunk}"),
+    "reduce_prompt": ("Below are the results of processing {total} consecutive parts of a longer input, in order. "
+                      "The original request was:\n{request}\n\nUsing these results, give one complete response to the "
+                      "original request.\n\n{results}"),
+}
+
+def load_settings(project_config: Optional[dict]) -> Optional[dict]:
+    """Map-reduce settings from the "map_reduce" section of project_config.json, or None unless it is enabled there."""
+    section = (project_config or {}).get("map_reduce") or {}
+    settings = dict(DEFAULT_SETTINGS, **section)
+    return settings if settings.get("enabled") else None
+
+def estimate_tokens(text: Optional[str]) -> int:
+    return len(text or "") // CHARS_PER_TOKEN
+
+def chunk_text(text: str, chunk_tokens: int, overlap_tokens: int = 0) -> List[str]:
+    """
+    Splits text into chunks of at most chunk_tokens (estimated), preferring paragraph, line, sentence and
+    word boundaries in the last fifth of each window. Consecutive chunks overlap by about overlap_tokens.
+    """
+    size = max(1, int(chunk_tokens) * CHARS_PER_TOKEN)
+    overlap = max(0, min(int(overlap_tokens) * CHARS_PER_TOKEN, size // 2))
+    chunks, start = [], 0
+    while start < len(text):
+        end = min(len(text), start + size)
+        if end < len(text):
+            floor = start + size * 4 // 5
+            for separator in ("\n\n", "\n", ". ", " "):
+                cut = text.rfind(separator, floor, end)
+                if cut != -1: end = cut + len(separator); break
+        chunks.append(text[start:end])
+        if end >= len(text): break
+        start = max(start + 1, end - overlap)
+    return chunks
+
+def media_duration(path: str) -> Optional[float]:
+    """
+    Duration in seconds via ffprobe (or ffmpeg's banner), or None if it cannot be determined. Probed once per
+    file version (path, size, mtime), since every request with the file attached asks again.
+    """
+    try: stat = os.stat(path)
+    except OSError: return None
+    return _probe_duration(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+@lru_cache(maxsize=256)
+def _probe_duration(path: str, size: int, mtime_ns: int) -> Optional[float]:
+    ffprobe = shutil.which("ffprobe")
+    try:
+        if ffprobe:
+            result = subprocess.run([ffprobe, "-v", "error", "-show_entries", "format=duration", "-of", "default=nw=1:nk=1", path],
+                                    capture_output=True, text=True, timeout=60)
+            return float(result.stdout.strip())
+        ffmpeg = shutil.which("ffmpeg")
+        if not ffmpeg: return None
+        result = subprocess.run([ffmpeg, "-hide_banner", "-i", path], capture_output=True, text=True, timeout=60)
+        match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", result.stderr)
+        return int(match[1]) * 3600 + int(match[2]) * 60 + float(match[3]) if match else None
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return None
+
+def segment_media(filename: str, segment_seconds: float) -> List[str]:
+    """
+    Splits storage/file_upload/<filename> into segments of segment_seconds with ffmpeg (stream copy, no
+    re-encode) and returns their names relative to the upload directory. Segments are kept per file (path,
+    size, mtime) and segment length, so the same file is segmented once.
+    """
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg: raise RuntimeError("ffmpeg was not found in PATH; long media cannot be segmented.")
+    source = os.path.join(str(UPLOAD_DIR), filename)
+    stat = os.stat(source)
+    key = hashlib.sha256(f"{os.path.abspath(source)}:{stat.st_size}:{stat.st_mtime_ns}:{segment_seconds}".encode("utf-8")).hexdigest()[:24]
+    relative_dir = os.path.join(SEGMENT_SUBDIR, key)
+    output_dir = os.path.join(str(UPLOAD_DIR), relative_dir)
+    extension = os.path.splitext(filename)[1].lower()
+    if not os.path.isdir(output_dir):
+        work_dir = f"{output_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+        os.makedirs(work_dir, exist_ok=True)
+        try:
+            subprocess.run([ffmpeg, "-hide_banner", "-v", "error", "-y", "-i", source, "-map", "0", "-c", "copy", "-f", "segment",
+                            "-segment_time", str(segment_seconds), "-reset_timestamps", "1", os.path.join(work_dir, f"part_%04d{extension}")],
+                           check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=3600)
+            os.rename(work_dir, output_dir)
+        except (OSError, subprocess.SubprocessError):
+            shutil.rmtree(work_dir, ignore_errors=True)
+            if not os.path.isdir(output_dir): raise # A concurrent run may have published the same segments
+    return [os.path.join(relative_dir, name) for name in sorted(os.listdir(output_dir)) if name.startswith("part_")]
+
+class RateLimiter:
+    """Spaces calls evenly to at most requests_per_minute across threads. None/0 means unlimited."""
+    def __init__(self, requests_per_minute: Optional[float]):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, cancel_event: Optional[threading.Event] = None):
+        if not self.interval: return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            if cancel_event is not None: cancel_event.wait(delay)
+            else: time.sleep(delay)
+
+class MapReduceCancelled(Exception):
+    """The job was cancelled before it finished."""
+
+class MapReduceJob:
+    """
+    Answers a request whose last user message is too long for one call: the message is split into chunks
+    (text by token budget, long audio/video by duration), the map prompt runs on every chunk concurrently
+    (at most "max_concurrency" calls in flight, paced to "requests_per_minute", each retried up to
+    "max_retries" times), and the reduce prompt merges the partial results in order. When the partial
+    results are themselves too long for one call they are reduced in batches first.
+
+    `infer(request_data) -> str` performs one call (e.g. APIInterface.run_inference for the active API).
+    Map calls keep the base request's system messages, so the system prompt still applies; reduce calls also
+    get the conversation before the long message, so the answer fits the chat. The job runs on its own
+    `deadline` ("time_budget" by default), not the interactive request's. Callbacks run on worker threads:
+        on_progress({"stage": "map" | "reduce", "done": int, "total": int})
+        on_partial({"index": int, "total": int, "text": str})  # per finished map chunk
+    """
+    REQUEST_EXCERPT_CHARS = 1000 # From each end of the original message, passed as {request}
+    MAX_REDUCE_ROUNDS = 3 # The last round merges everything in one call, however long
+
+    def __init__(self, infer: Callable[[dict], str], base_request: dict, settings: dict,
+                 on_progress: Optional[Callable[[dict], Any]] = None, on_partial: Optional[Callable[[dict], Any]] = None,
+                 cancel_event: Optional[threading.Event] = None, deadline: Optional[Deadline] = None):
+        self.infer = infer
+        self.base_request = base_request
+        self.settings = dict(DEFAULT_SETTINGS, **settings)
+        self.on_progress = on_progress
+        self.on_partial = on_partial
+        self.cancel_event = cancel_event or threading.Event()
+        self.deadline = deadline or Deadline(self.settings.get("time_budget"))
+        self.rate_limiter = RateLimiter(self.settings.get("requests_per_minute"))
+        messages = base_request.get("messages") or []
+        target_index = next((i for i in range(len(messages) - 1, -1, -1) if messages[i].get("role") == "user"), None)
+        self.target = messages[target_index] if target_index is not None else None
+        self.history = messages[:target_index] if target_index is not None else list(messages) # System messages included
+        self.system_messages = [m for m in self.history if m.get("role") == "system"]
+        self.units: Optional[List[Dict[str, Any]]] = None
+
+    @staticmethod
+    def needs_map_reduce(request_data: dict, settings: dict) -> bool:
+        """Whether the last user message is over the token threshold or carries media longer than one segment."""
+        target = next((m for m in reversed(request_data.get("messages") or []) if m.get("role") == "user"), None)
+        if not target: return False
+        if estimate_tokens(target.get("content")) > settings["threshold_tokens"]: return True
+        for filename in target.get("files") or ():
+            if os.path.splitext(filename)[1].lower() not in MEDIA_EXTENSIONS: continue
+            duration = media_duration(os.path.join(str(UPLOAD_DIR), filename))
+            if duration and duration > settings["segment_seconds"]: return True
+        return False
+
+    def plan(self) -> List[Dict[str, Any]]:
+        """The map units: {"chunk": text, "files": [names]}. Short text travels with every media segment."""
+        if self.units is not None: return self.units
+        content = (self.target or {}).get("content") or ""
+        files = list((self.target or {}).get("files") or ())
+        long_text = estimate_tokens(content) > self.settings["threshold_tokens"]
+        units = [{"chunk": chunk, "files": []} for chunk in chunk_text(content, self.settings["chunk_tokens"], self.settings["overlap_tokens"])] if long_text else []
+        static_files = []
+        for filename in files:
+            if os.path.splitext(filename)[1].lower() in MEDIA_EXTENSIONS:
+                duration = media_duration(os.path.join(str(UPLOAD_DIR), filename))
+                if duration and duration > self.settings["segment_seconds"]:
+                    units += [{"chunk": "" if long_text else content, "files": [segment]} for segment in segment_media(filename, self.settings["segment_seconds"])]
+                    continue
+            static_files.append(filename)
+        if static_files: # Small attachments go along with the first unit
+            if units: units[0]["files"] = static_files + units[0]["files"]
+            else: units.append({"chunk": content, "files": static_files})
+        self.units = units or [{"chunk": content, "files": []}]
+        return self.units
+
+    def _request_excerpt(self) -> str:
+        content = (self.target or {}).get("content") or ""
+        if len(content) <= 2 * self.REQUEST_EXCERPT_CHARS: return content
+        return f"{content[:self.REQUEST_EXCERPT_CHARS]}\n[...]\n{content[-self.REQUEST_EXCERPT_CHARS:]}"
+
+    def _build_request(self, prompt: str, files: List[str], with_history: bool = False) -> dict:
+        request_data = dict(self.base_request)
+        request_data.pop("request_timeout", None) # The interactive request's timeout; the job's deadline sets its own
+        context = self.history if with_history else self.system_messages
+        request_data["messages"] = [*context, {"role": "user", "content": prompt, "files": files or None}]
+        return request_data
+
+    def _call(self, prompt: str, files: List[str], with_history: bool = False) -> str:
+        """One call with pacing, retries, the job's deadline and cancellation."""
+        retries = int(self.settings.get("max_retries", 0))
+        for attempt in range(retries + 1):
+            self.rate_limiter.acquire(self.cancel_event)
+            if self.cancel_event.is_set(): raise MapReduceCancelled("Map-reduce job cancelled.")
+            if self.deadline.expired(): raise DeadlineExceeded(f"Map-reduce time budget ({self.deadline.budget}s) used up.")
+            request_data = self._build_request(prompt, files, with_history)
+            remaining = self.deadline.remaining()
+            if remaining is not None: request_data["request_timeout"] = remaining
+            try:
+                return self.infer(request_data)
+            except (MapReduceCancelled, DeadlineExceeded):
+                raise
+            except Exception as e:
+                if attempt >= retries: raise
+                delay = min(2.0 ** attempt, 30.0)
+                logging.logger.warning(f"Map-reduce call failed ({type(e).__name__}: {e}); retrying in {delay:.0f}s (attempt {attempt + 1}/{retries}).")
+                if self.cancel_event.wait(delay): raise MapReduceCancelled("Map-reduce job cancelled.")
+
+    def _emit(self, callback: Optional[Callable[[dict], Any]], payload: dict):
+        if callback is None: return
+        try: callback(payload)
+        except Exception as e: logging.logger.warning(f"Map-reduce callback failed: {e}")
+
+    def _run_stage(self, stage: str, prompts: List[tuple], on_result: Optional[Callable[[int, str], None]] = None) -> List[str]:
+        """Runs (prompt, files[, with_history]) tuples concurrently; results keep the input order."""
+        results: List[Optional[str]] = [None] * len(prompts)
+        done = 0
+        done_lock = threading.Lock()
+        def run_one(index: int):
+            nonlocal done
+            results[index] = self._call(*prompts[index])
+            with done_lock: done += 1; finished = done
+            if on_result: on_result(index, results[index])
+            self._emit(self.on_progress, {"stage": stage, "done": finished, "total": len(prompts)})
+        self._emit(self.on_progress, {"stage": stage, "done": 0, "total": len(prompts)})
+        workers = max(1, min(int(self.settings["max_concurrency"]), len(prompts)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"map-reduce-{stage}") as pool:
+            futures = [pool.submit(run_one, index) for index in range(len(prompts))]
+            try:
+                for future in futures: future.result()
+            except BaseException:
+                self.cancel_event.set() # Stop the remaining calls; one failed chunk fails the job
+                raise
+        return results
+
+    def run(self) -> str:
+        started = time.monotonic()
+        units = self.plan()
+        total = len(units)
+        request = self._request_excerpt()
+        logging.logger.info(f"Map-reduce: {total} part(s), up to {self.settings['max_concurrency']} concurrent calls.")
+        if total == 1 and not units[0]["files"] and estimate_tokens(units[0]["chunk"]) <= self.settings["threshold_tokens"]:
+            return self._call(units[0]["chunk"], units[0]["files"], True) # Nothing to split after all
+        map_prompts = [(self.settings["map_prompt"].format(index=i + 1, total=total, request=request, chunk=unit["chunk"]), unit["files"])
+                       for i, unit in enumerate(units)]
+        partials = self._run_stage("map", map_prompts,
+                                   lambda index, text: self._emit(self.on_partial, {"index": index, "total": total, "text": text}))
+
+        # Reduce in batches until everything fits into one call
+        for reduce_round in range(self.MAX_REDUCE_ROUNDS):
+            limit = self.settings["threshold_tokens"] if reduce_round < self.MAX_REDUCE_ROUNDS - 1 else float("inf")
+            batches, batch, batch_tokens = [], [], 0
+            for index, text in enumerate(partials):
+                tokens = estimate_tokens(text)
+                if batch and batch_tokens + tokens > limit:
+                    batches.append(batch); batch, batch_tokens = [], 0
+                batch.append((index, text)); batch_tokens += tokens
+            batches.append(batch)
+            reduce_prompts = [(self.settings["reduce_prompt"].format(total=len(partials), request=request,
+                                                                     results="\n\n".join(f"--- Result {i + 1} ---\n{text}" for i, text in batch)), [], True)
+                              for batch in batches]
+            partials = self._run_stage("reduce", reduce_prompts)
+            if len(partials) == 1: break
+        logging.logger.info(f"Map-reduce finished: {total} part(s) in {time.monotonic() - started:.2f}s.")
+        return partials[0]
+
+    def cancel(self):
+        self.cancel_event.set()
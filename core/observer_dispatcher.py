@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from core import logging
+
+class ObserverDispatcher:
+    """
+    Runs observer-mode hook calls off the request path.
+    Different plugins are notified concurrently on a small thread pool; notifications for the same
+    plugin run one at a time and in submission order, so an observer sees turns in sequence.
+    The number of queued notifications is bounded: when it is full, new notifications are dropped
+    (and counted) instead of letting a slow observer build up an unbounded backlog.
+    Failures are isolated per call, logged and counted; they never reach the caller.
+    """
+    DEFAULT_MAX_WORKERS = 4
+    DEFAULT_MAX_PENDING = 64
+
+    def __init__(self, max_workers: int = None, max_pending: int = None, is_error=None):
+        self.max_pending = max_pending or self.DEFAULT_MAX_PENDING
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or self.DEFAULT_MAX_WORKERS, thread_name_prefix="plugin-observer")
+        self._is_error = is_error or (lambda result: False)
+        self._lock = threading.Lock()
+        self._queues = {}   # plugin -> deque of (hook_name, call, submitted_at)
+        self._active = set() # plugins with a drain task scheduled or running
+        self._pending = 0
+        self._stats = {}    # plugin -> counters
+        self._closed = False
+
+    def _plugin_stats(self, plugin_name: str) -> dict:
+        stats = self._stats.get(plugin_name)
+        if stats is None:
+            stats = self._stats[plugin_name] = {'submitted': 0, 'completed': 0, 'errors': 0, 'dropped': 0,
+                                                'max_queue_wait_ms': 0.0, 'last_error': None}
+        return stats
+
+    def submit(self, plugin_name: str, hook_name: str, call) -> bool:
+        """Queues `call()` for `plugin_name`. Returns False if the notification was dropped."""
+        with self._lock:
+            stats = self._plugin_stats(plugin_name)
+            if self._closed or self._pending >= self.max_pending:
+                stats['dropped'] += 1
+                dropped = stats['dropped']
+            else:
+                dropped = 0
+                stats['submitted'] += 1; self._pending += 1
+                self._queues.setdefault(plugin_name, deque()).append((hook_name, call, time.monotonic()))
+                schedule = plugin_name not in self._active
+                if schedule: self._active.add(plugin_name)
+        if dropped:
+            logging.logger.warning(f"Observer queue full ({self.max_pending}); dropped {hook_name} notification for '{plugin_name}' ({dropped} dropped so far).")
+            return False
+        if schedule:
+            try:
+                self._executor.submit(self._drain, plugin_name)
+            except RuntimeError: # Executor already shut down
+                with self._lock:
+                    queued = self._queues.pop(plugin_name, deque())
+                    self._pending -= len(queued); self._active.discard(plugin_name); stats['dropped'] += len(queued)
+                return False
+        return True
+
+    def _drain(self, plugin_name: str):
+        while True:
+            with self._lock:
+                queue = self._queues.get(plugin_name)
+                if not queue:
+                    self._queues.pop(plugin_name, None); self._active.discard(plugin_name)
+                    return
+                hook_name, call, submitted_at = queue.popleft()
+            wait_ms = (time.monotonic() - submitted_at) * 1000.0
+            error = None
+            try:
+                result = call()
+                if self._is_error(result): error = result['error'].get('message')
+            except Exception as e:
+                logging.logger.exception(f"Observer {hook_name} for '{plugin_name}' raised on the host side.")
+                error = f"{type(e).__name__}: {e}"
+            if error is not None:
+                logging.logger.error(f"Error executing {hook_name} observer in plugin '{plugin_name}': {error}.")
+            with self._lock:
+                self._pending -= 1
+                stats = self._plugin_stats(plugin_name)
+                stats['completed'] += 1
+                stats['max_queue_wait_ms'] = max(stats['max_queue_wait_ms'], wait_ms)
+                if error is not None: stats['errors'] += 1; stats['last_error'] = error
+
+    def pending_count(self) -> int:
+        with self._lock: return self._pending
+
+    def snapshot(self, plugin_name: str = None) -> dict:
+        """Returns per-plugin counters: submitted, completed, errors, dropped, max_queue_wait_ms, last_error."""
+        with self._lock:
+            if plugin_name is not None:
+                stats = self._stats.get(plugin_name)
+                return dict(stats) if stats else None
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+    def reset(self, plugin_name: str = None):
+        with self._lock:
+            if plugin_name is None: self._stats.clear()
+            else: self._stats.pop(plugin_name, None)
+
+    def shutdown(self, wait: bool = False):
+        with self._lock: self._closed = True
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
@@ -0,0 +1,232 @@
+"""
+Plugin host process, launched by the PluginManager once per plugin:
+    python core/plugin_executor.py <plugins subdir> <plugin folder> <main class>
+
+Speaks line-delimited JSON-RPC 2.0 (core/json_rpc.py) on stdin/stdout:
+  - The plugin's methods are resolved once into a dispatch table; each request is a dict lookup.
+  - Requests run concurrently on a thread pool ("max_concurrency" in config.json, default 4; set 1 for
+    plugins that are not thread-safe). Heartbeat pings and history deltas are handled in order on the reader thread.
+  - Responses are serialized on the worker threads and written by a single writer thread that flushes once
+    per batch instead of once per line.
+  - Anything the plugin prints goes to stderr (fd 1 is redirected), so it cannot corrupt the protocol stream.
+  - On startup a "ready" notification reports the implemented hooks and startup timings; every response
+    carries "timing" (queue/exec ms) so the host can separate plugin time from IPC overhead.
+"""
+import os
+import sys
+import time
+
+_PROCESS_STARTED = time.perf_counter()
+
+# Run as a script, sys.path[0] is core/ itself, where core/logging.py would shadow the stdlib logging
+# module (imported by concurrent.futures). Swap it for the project root before importing anything else.
+_CORE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(_CORE_DIR)
+sys.path[:] = [p for p in sys.path if os.path.abspath(p or os.curdir) != _CORE_DIR]
+if ROOT_DIR not in sys.path: sys.path.insert(0, ROOT_DIR)
+
+import importlib.util
+import inspect
+import json
+import queue
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from core import json_rpc
+from core.history_sync import HistoryMirror, HistoryOutOfSync, LazyHistoryView, HISTORY_OUT_OF_SYNC
+
+DEFAULT_MAX_CONCURRENCY = 4
+HOOK_NAMES = ("pre_history", "pre_api", "post_api", "post_history")
+LIFECYCLE_METHODS = ("on_load", "on_unload") # Missing lifecycle methods are no-ops, not errors
+WRITE_BUFFER_SIZE = 1 << 16
+
+class ResponseWriter:
+    """Single writer for the protocol stream. Batches whatever is queued and flushes once per batch."""
+    def __init__(self, stream):
+        self._stream = stream
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="rpc-writer", daemon=True)
+        self._thread.start()
+
+    def send(self, message: dict):
+        self._queue.put(json_rpc.serialize_message(message).encode('utf-8') + b"\n")
+
+    def _run(self):
+        try:
+            while True:
+                data = self._queue.get()
+                while data is not None:
+                    self._stream.write(data)
+                    try: data = self._queue.get_nowait()
+                    except queue.Empty: break
+                self._stream.flush()
+                if data is None: return
+        except (BrokenPipeError, OSError, ValueError):
+            pass # Host went away; the reader loop will see EOF
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+def _redirect_stdout_to_stderr():
+    """Keeps a private handle on the real stdout for the protocol and points fd 1 / sys.stdout at stderr."""
+    sys.stdout.flush()
+    protocol_fd = os.dup(1)
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+    return os.fdopen(protocol_fd, 'wb', buffering=WRITE_BUFFER_SIZE)
+
+def _load_plugin(plugin_dir: str, main_class: str, config: dict):
+    started = time.perf_counter()
+    if plugin_dir not in sys.path: sys.path.insert(0, plugin_dir) # Plugin-local imports
+    module_name = f"voidframe_plugin_{os.path.basename(plugin_dir)}"
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(plugin_dir, "plugin.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    imported = time.perf_counter()
+    plugin_class = getattr(module, main_class, None)
+    if plugin_class is None: raise AttributeError(f"plugin.py has no class '{main_class}'")
+    instance = plugin_class(plugin_dir, config)
+    return instance, (imported - started) * 1000.0, (time.perf_counter() - imported) * 1000.0
+
+def build_dispatch_table(instance) -> dict:
+    """Resolves every public callable of the plugin once, so dispatch is a dict lookup."""
+    table = {}
+    for name in dir(instance):
+        if name.startswith('_'): continue
+        try: static = inspect.getattr_static(instance, name)
+        except AttributeError: continue
+        if isinstance(static, property): continue # Never evaluate properties just to find methods
+        attribute = getattr(instance, name, None)
+        if callable(attribute): table[name] = attribute
+    return table
+
+def detect_hooks(instance) -> dict:
+    """
+    Hooks the plugin actually implements, as {hook: mode}. Methods inherited unchanged from
+    PluginInterface (pass-through defaults) are not reported. Modes come from the class's
+    optional `hook_modes` attribute; anything not listed there mutates.
+    """
+    try:
+        from core.plugin_interface import PluginInterface
+    except Exception:
+        PluginInterface = None
+    modes = getattr(instance, "hook_modes", None) or {}
+    hooks = {}
+    for hook in HOOK_NAMES:
+        implementation = getattr(type(instance), hook, None)
+        if implementation is None or not callable(implementation): continue
+        if PluginInterface is not None and implementation is getattr(PluginInterface, hook, None): continue
+        hooks[hook] = modes.get(hook, "mutate")
+    return hooks
+
+class PluginExecutor:
+    def __init__(self, instance, config: dict, writer: ResponseWriter):
+        self.instance = instance
+        self.writer = writer
+        self.dispatch = build_dispatch_table(instance)
+        self.history_mirror = HistoryMirror()
+        self.max_concurrency = max(1, int(config.get("max_concurrency", DEFAULT_MAX_CONCURRENCY)))
+        self.pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="plugin-worker")
+
+    def serve(self, input_stream):
+        for line in input_stream:
+            if not line.strip(): continue
+            try:
+                message = json.loads(line)
+            except ValueError as e:
+                self.writer.send(json_rpc.create_error_response(None, json_rpc.PARSE_ERROR, f"Parse error: {e}"))
+                continue
+            if not isinstance(message, dict) or not isinstance(message.get("method"), str):
+                self.writer.send(json_rpc.create_error_response(message.get("id") if isinstance(message, dict) else None, json_rpc.INVALID_REQUEST, "Invalid request"))
+                continue
+            self._accept(message, time.perf_counter())
+
+    def _accept(self, message: dict, received_at: float):
+        request_id = message.get("id"); method = message["method"]; params = message.get("params")
+        if method == "ping":
+            if request_id is not None: self.writer.send(json_rpc.create_response(request_id, "pong"))
+            return
+        history_view = None
+        if isinstance(params, dict) and "history_sync" in params:
+            # Deltas arrive in version order; apply them here, before the pool can reorder calls
+            params = dict(params)
+            try:
+                history_view = self.history_mirror.apply(params.pop("history_sync"))
+            except HistoryOutOfSync as e:
+                if request_id is not None: self.writer.send(json_rpc.create_error_response(request_id, HISTORY_OUT_OF_SYNC, str(e)))
+                return
+            params["chat_history"] = history_view
+        self.pool.submit(self._execute, request_id, method, params, history_view, received_at)
+
+    def _execute(self, request_id, method: str, params, history_view, received_at: float):
+        started = time.perf_counter()
+        handler = self.dispatch.get(method)
+        try:
+            if handler is None and method not in LIFECYCLE_METHODS:
+                response = json_rpc.create_error_response(request_id, json_rpc.METHOD_NOT_FOUND, f"Method '{method}' not found")
+            else:
+                if handler is None: result = None
+                elif isinstance(params, dict): result = handler(**params)
+                elif isinstance(params, list): result = handler(*params)
+                else: result = handler()
+                if history_view is not None and isinstance(result, (list, tuple, LazyHistoryView)):
+                    result = {"history_delta": self.history_mirror.diff(history_view, result)}
+                response = json_rpc.create_response(request_id, result)
+        except Exception as e:
+            trace = traceback.format_exc()
+            print(f"Plugin method '{method}' raised:\n{trace}", file=sys.stderr, flush=True)
+            response = json_rpc.create_error_response(request_id, json_rpc.PLUGIN_ERROR, f"{type(e).__name__}: {e}", {"traceback": trace[-4000:]})
+        if request_id is None: return # Notification
+        timing = {"queue_ms": round((started - received_at) * 1000.0, 3), "exec_ms": round((time.perf_counter() - started) * 1000.0, 3)}
+        response["timing"] = timing
+        try:
+            self.writer.send(response)
+        except (TypeError, ValueError) as e: # Result is not JSON serializable
+            response = json_rpc.create_error_response(request_id, json_rpc.INTERNAL_ERROR, f"Result of '{method}' is not JSON serializable: {e}")
+            response["timing"] = timing
+            self.writer.send(response)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+        unload = self.dispatch.get("on_unload")
+        if unload:
+            try: unload()
+            except Exception: traceback.print_exc(file=sys.stderr)
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 3:
+        print("Usage: plugin_executor.py <plugins subdir> <plugin folder> <main class>", file=sys.stderr)
+        return 2
+    subdir, folder, main_class = argv[:3]
+    plugin_dir = os.path.join(subdir, folder)
+    protocol_out = _redirect_stdout_to_stderr()
+    writer = ResponseWriter(protocol_out)
+    try:
+        with open(os.path.join(plugin_dir, "config.json"), "r", encoding="utf-8") as f: config = json.load(f)
+        instance, import_ms, init_ms = _load_plugin(plugin_dir, main_class, config)
+        executor = PluginExecutor(instance, config, writer)
+    except Exception:
+        print(f"Failed to load plugin from {plugin_dir}:\n{traceback.format_exc()}", file=sys.stderr, flush=True)
+        writer.close()
+        return 1
+    writer.send(json_rpc.create_notification("ready", {
+        "hooks": detect_hooks(instance), "pid": os.getpid(), "python": sys.version.split()[0],
+        "max_concurrency": executor.max_concurrency, "methods": len(executor.dispatch),
+        "timing": {"import_ms": round(import_ms, 3), "init_ms": round(init_ms, 3),
+                   "startup_ms": round((time.perf_counter() - _PROCESS_STARTED) * 1000.0, 3)},
+    }))
+    try:
+        executor.serve(sys.stdin.buffer)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        executor.shutdown()
+        writer.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,19 @@ from abc import ABC, abstractmethod
 class PluginInterface(ABC):
     """
     Defines the interface for standard plugins that hook into the data flow.
+
+    The host only sends a hook to plugins that implement it. Declare the implemented hooks,
+    and whether each one mutates the value or only observes it, in the plugin's config.json:
+        "hooks": {"post_api": "mutate", "post_history": "observe"}
+    Plugins without a declaration report the hooks their class overrides when the executor starts;
+    set a `hook_modes` class attribute (e.g. {"post_history": "observe"}) to mark some of them as observers.
+    Observers receive the final value after all mutators ran; their return value is ignored.
+
+    Other optional config.json keys:
+        "required": true          - the request is aborted (not skipped) if this plugin's hooks run out of latency budget
+        "activation": "lazy"      - the process starts on first use instead of at application start
+        "idle_timeout": 300       - seconds unused after which a lazy plugin's process is stopped again
+        "max_concurrency": 4      - requests the executor runs in parallel; set 1 if the plugin is not thread-safe
     """
 
     # Add @abstractmethod decorator if you want to force subclasses to implement,
@@ -37,17 +50,21 @@ class PluginInterface(ABC):
     def post_history(self, chat_history: list) -> list:
         """
         Called after the API response has been appended to the chat history (but before saving).
-        Plugins can modify the chat history.
+        Plugins can modify the chat history. chat_history is a read-only sequence mirrored
+        incrementally from the host; build and return a new list to change it.
         Returns the (possibly modified) chat history.
         """
         # Return a copy by default to prevent accidental mutation if not overridden
         return list(chat_history)
 
-    # --- Optional Lifecycle Methods (Example - Add if implementing Improvement #5) ---
-    # def on_load(self, data_router):
-    #     """Called after all plugins are loaded."""
-    #     pass
-    #
+    # --- Optional Lifecycle Methods ---
+    def on_load(self):
+        """
+        Called after all plugins are loaded, and again whenever the plugin manager
+        restarts this plugin's process (the host replays lifecycle initialisation).
+        """
+        pass
+
     # def on_unload(self):
     #     """Called just before application exit or plugin unload."""
     #     pass
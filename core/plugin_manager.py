@@ -1,19 +1,49 @@
 import json
 import os
 from pathlib import Path
+import queue
 import subprocess
 import sys
 import threading
-from PyQt6.QtWidgets import QTabWidget, QVBoxLayout, QWidget, QCheckBox, QLabel # Keep relevant Qt imports
 from core.env import ROOT_DIR
 from core import logging
 from core import json_rpc # Added
+from core.plugin_metrics import PluginMetrics
+from core.observer_dispatcher import ObserverDispatcher
+from core import history_sync
 import time             # Added
 import uuid             # Added
 
 class PluginManager:
     DEFAULT_PLUGIN_TIMEOUT = 10  # seconds (Added)
 
+    # --- Supervisor settings ---
+    HEARTBEAT_INTERVAL = 5.0         # seconds between supervisor passes
+    HEARTBEAT_TIMEOUT = 3.0          # seconds a plugin has to answer a ping
+    MAX_CONSECUTIVE_FAILURES = 2     # missed heartbeats / call timeouts before a plugin is declared failed
+    RESTART_BACKOFF_BASE = 1.0       # seconds, doubled for every failure inside the crash-loop window
+    RESTART_BACKOFF_MAX = 60.0
+    CRASH_LOOP_WINDOW = 300.0        # seconds
+    CRASH_LOOP_MAX_FAILURES = 5      # failures inside the window before the plugin is quarantined
+    LIFECYCLE_INIT_METHODS = ("on_load",)
+    WATCH_INTERVAL = 0.25  # seconds between plugin directory scans (hot reload)
+    LOG_PAYLOAD_CHARS = 500 # request/response payloads are truncated to this in debug logs
+
+    HEALTH_HEALTHY = "healthy"
+    HEALTH_FAILED = "failed"           # dead or hung, waiting for a restart
+    HEALTH_QUARANTINED = "quarantined" # crash-looping, no further restarts
+    HEALTH_DISABLED = "disabled"       # switched off for exceeding a soft resource limit
+    HEALTH_INACTIVE = "inactive"       # lazy plugin without a running process; spawned on first call
+
+    # --- Activation ---
+    ACTIVATION_EAGER = "eager" # process starts with the application (default)
+    ACTIVATION_LAZY = "lazy"   # process starts on first dispatch; stops again after "idle_timeout" seconds unused
+
+    # --- Data-flow hooks ---
+    HOOK_NAMES = ("pre_history", "pre_api", "post_api", "post_history")
+    HOOK_MUTATE = "mutate"   # may modify the value or stop the pipeline
+    HOOK_OBSERVE = "observe" # only reads the value; its return value is ignored
+
     def __init__(self, data_router, project_config: dict):
         self.data_router = data_router
         self.project_config = project_config
@@ -22,10 +52,29 @@ class PluginManager:
         self.plugin_types = {}
         self.plugin_paths = {}
         self.plugin_stderr_threads = {}
+        self.plugin_stdout_threads = {}
+        self.plugin_health = {}
+        self.plugin_hooks = {} # plugin -> {hook: mode}; None until declared in config.json or the ready handshake
+        self.plugin_metrics = PluginMetrics()
+        self.observer_dispatcher = ObserverDispatcher(project_config.get("observer_workers"), project_config.get("observer_queue_size"), self.is_error_result)
+        self._lifecycle_lock = threading.RLock() # Guards process spawn/terminate against the supervisor
+        self._health_lock = threading.Lock()
+        self._supervisor_stop = threading.Event()
+        self._supervisor_wake = threading.Event() # Set when a restart is scheduled, so it runs at its due time
+        self._supervisor_thread = None
+        self._reloading = set() # plugins with a hot reload in progress
+        self._reload_lock = threading.Lock()
+        self._watcher_stop = threading.Event()
+        self._watcher_thread = None
         self.load_all_plugins()
+        self.start_supervisor()
+        if project_config.get("plugin_hot_reload", True): self.start_plugin_watcher()
 
     def __del__(self):
         logging.logger.info("PluginManager is being deleted, shutting down all plugins.")
+        self.stop_supervisor()
+        self.stop_plugin_watcher()
+        self.observer_dispatcher.shutdown()
         self.shutdown_all_plugins()
 
     def _read_stderr(self, plugin_name: str, stderr_pipe):
@@ -42,51 +91,134 @@ class PluginManager:
         finally:
             logging.logger.info(f"Stderr monitoring thread for {plugin_name} finished.")
 
-    def shutdown_all_plugins(self):
-        logging.logger.info(f"Shutting down all plugins. Current processes: {list(self.plugin_procs.keys())}")
-        plugin_names = list(self.plugin_procs.keys())
-        for plugin_name in plugin_names:
-            proc_info = self.plugin_procs.get(plugin_name)
-            if proc_info:
-                logging.logger.info(f"Terminating plugin: {plugin_name}")
-                process = proc_info['process']
-                if proc_info['stdin'] and not proc_info['stdin'].closed:
-                    try: proc_info['stdin'].close()
-                    except Exception as e: logging.logger.error(f"Error closing stdin for {plugin_name}: {e}")
-                if process.poll() is None:
-                    try:
-                        process.terminate()
-                        process.wait(timeout=2)
-                        logging.logger.info(f"Plugin {plugin_name} terminated.")
-                    except subprocess.TimeoutExpired:
-                        logging.logger.warning(f"Plugin {plugin_name} did not terminate gracefully, killing.")
-                        process.kill()
-                        try: process.wait(timeout=1)
-                        except subprocess.TimeoutExpired: logging.logger.error(f"Plugin {plugin_name} did not die after SIGKILL.")
-                    except Exception as e: logging.logger.error(f"Error during termination of {plugin_name}: {e}")
-                else: logging.logger.info(f"Plugin {plugin_name} already terminated (code {process.returncode}).")
-                for pipe_name in ['stdout', 'stderr']:
-                    pipe = proc_info.get(pipe_name)
-                    if pipe and not pipe.closed:
-                        try: pipe.close()
-                        except Exception as e: logging.logger.error(f"Error closing {pipe_name} for {plugin_name}: {e}")
-            thread = self.plugin_stderr_threads.pop(plugin_name, None)
-            if thread and thread.is_alive():
-                logging.logger.info(f"Joining stderr thread for {plugin_name}...")
+    def _read_stdout(self, plugin_name: str, proc_info: dict):
+        """Routes JSON-RPC responses from a plugin's stdout to the waiting callers by request id."""
+        stdout_pipe = proc_info['stdout']
+        try:
+            for line in iter(stdout_pipe.readline, ''):
+                line = line.strip()
+                if not line: continue
+                try:
+                    response_data = json_rpc.deserialize_message(line)
+                except json.JSONDecodeError:
+                    logging.logger.warning(f"[{plugin_name}-stdout] Non JSON-RPC output ignored: {line[:200]}")
+                    continue
+                if isinstance(response_data, dict) and "method" in response_data and "id" not in response_data:
+                    self._handle_plugin_notification(plugin_name, response_data, proc_info)
+                    continue
+                response_id = response_data.get("id") if isinstance(response_data, dict) else None
+                with proc_info['pending_lock']:
+                    waiter = proc_info['pending'].pop(response_id, None)
+                if waiter is None:
+                    logging.logger.warning(f"Discarding response from '{plugin_name}' with unknown or expired id {response_id}.")
+                    continue
+                waiter.put((response_data, len(line)))
+        except ValueError:
+            logging.logger.warning(f"Stdout pipe for {plugin_name} likely closed.")
+        except Exception as e:
+            logging.logger.error(f"Exception in _read_stdout for {plugin_name}: {e}")
+        finally:
+            # Release every caller still waiting on this process
+            with proc_info['pending_lock']:
+                orphaned = list(proc_info['pending'].items()); proc_info['pending'].clear()
+            for request_id, waiter in orphaned:
+                waiter.put((json_rpc.create_error_response(request_id, json_rpc.PLUGIN_ERROR, f"Plugin '{plugin_name}' closed its output stream."), 0))
+            if not proc_info.get('stopping'):
+                self._mark_plugin_failed(plugin_name, "stdout closed (process exited)", proc_info)
+            logging.logger.info(f"Stdout monitoring thread for {plugin_name} finished.")
+
+    def _spawn_plugin_process(self, plugin_name: str, plugin_full_path: Path, config: dict) -> dict:
+        """Spawns an executor process and its reader threads without registering it. Returns its proc_info."""
+        plugin_main_class = config.get("main_class", "PluginBase")
+        cmd = [sys.executable, str(ROOT_DIR / "core" / "plugin_executor.py"), str(plugin_full_path.parent), plugin_full_path.name, plugin_main_class]
+        creationflags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+        logging.logger.info(f"Launching '{plugin_name}': {' '.join(cmd)}")
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8', creationflags=creationflags, bufsize=1)
+        proc_info = {'process': proc, 'stdin': proc.stdin, 'stdout': proc.stdout, 'stderr': proc.stderr,
+                     'write_lock': threading.Lock(), 'pending': {}, 'pending_lock': threading.Lock(), 'stopping': False,
+                     # A fresh process has an empty history mirror, so sync state lives with the process
+                     'history_sync': history_sync.HistorySyncState(), 'history_lock': threading.Lock(),
+                     'reported_hooks': None, 'last_used': time.monotonic()}
+        proc_info['stderr_thread'] = threading.Thread(target=self._read_stderr, args=(plugin_name, proc.stderr), daemon=True)
+        proc_info['stdout_thread'] = threading.Thread(target=self._read_stdout, args=(plugin_name, proc_info), daemon=True)
+        proc_info['stderr_thread'].start(); proc_info['stdout_thread'].start()
+        return proc_info
+
+    def _register_plugin_process(self, plugin_name: str, proc_info: dict):
+        self.plugin_procs[plugin_name] = proc_info
+        self.plugin_stderr_threads[plugin_name] = proc_info['stderr_thread']
+        self.plugin_stdout_threads[plugin_name] = proc_info['stdout_thread']
+        # A ready handshake may have arrived before registration
+        if proc_info['reported_hooks'] is not None and (self.plugin_configs.get(plugin_name) or {}).get("hooks") is None:
+            self.plugin_hooks[plugin_name] = self._parse_hook_declaration(plugin_name, proc_info['reported_hooks'])
+
+    def _start_plugin_process(self, plugin_name: str):
+        """Spawns the executor process for an already registered plugin and starts its reader threads."""
+        proc_info = self._spawn_plugin_process(plugin_name, self.plugin_paths[plugin_name], self.plugin_configs[plugin_name])
+        self._register_plugin_process(plugin_name, proc_info)
+        return proc_info['process']
+
+    def _terminate_plugin_process(self, plugin_name: str, proc_info: dict = None):
+        """Stops the registered process of a plugin, or the given (possibly already replaced) proc_info."""
+        if proc_info is None: proc_info = self.plugin_procs.get(plugin_name)
+        if proc_info:
+            logging.logger.info(f"Terminating plugin: {plugin_name}")
+            proc_info['stopping'] = True
+            process = proc_info['process']
+            if proc_info['stdin'] and not proc_info['stdin'].closed:
+                try: proc_info['stdin'].close()
+                except Exception as e: logging.logger.error(f"Error closing stdin for {plugin_name}: {e}")
+            if process.poll() is None:
+                try:
+                    process.terminate()
+                    process.wait(timeout=2)
+                    logging.logger.info(f"Plugin {plugin_name} terminated.")
+                except subprocess.TimeoutExpired:
+                    logging.logger.warning(f"Plugin {plugin_name} did not terminate gracefully, killing.")
+                    process.kill()
+                    try: process.wait(timeout=1)
+                    except subprocess.TimeoutExpired: logging.logger.error(f"Plugin {plugin_name} did not die after SIGKILL.")
+                except Exception as e: logging.logger.error(f"Error during termination of {plugin_name}: {e}")
+            else: logging.logger.info(f"Plugin {plugin_name} already terminated (code {process.returncode}).")
+        # Readers hit EOF once the process is gone; join them before closing the pipes they read from
+        for threads, key in ((self.plugin_stderr_threads, 'stderr_thread'), (self.plugin_stdout_threads, 'stdout_thread')):
+            thread = proc_info.get(key) if proc_info else threads.get(plugin_name)
+            if threads.get(plugin_name) is thread: threads.pop(plugin_name, None)
+            if thread and thread.is_alive() and thread is not threading.current_thread():
+                logging.logger.info(f"Joining reader thread for {plugin_name}...")
                 thread.join(timeout=1)
-                if thread.is_alive(): logging.logger.warning(f"Stderr thread for {plugin_name} did not join.")
-        self.plugin_procs.clear(); self.plugin_configs.clear(); self.plugin_types.clear(); self.plugin_paths.clear(); self.plugin_stderr_threads.clear()
-        logging.logger.info("All plugins shut down and resources cleared.")
+                if thread.is_alive(): logging.logger.warning(f"Reader thread for {plugin_name} did not join.")
+        if proc_info:
+            for pipe_name in ['stdout', 'stderr']:
+                pipe = proc_info.get(pipe_name)
+                if pipe and not pipe.closed:
+                    try: pipe.close()
+                    except Exception as e: logging.logger.error(f"Error closing {pipe_name} for {plugin_name}: {e}")
+
+    def shutdown_all_plugins(self):
+        with self._lifecycle_lock:
+            logging.logger.info(f"Shutting down all plugins. Current processes: {list(self.plugin_procs.keys())}")
+            plugin_names = list(self.plugin_procs.keys())
+            for plugin_name in plugin_names:
+                self._terminate_plugin_process(plugin_name)
+            self.plugin_procs.clear(); self.plugin_configs.clear(); self.plugin_types.clear(); self.plugin_paths.clear(); self.plugin_stderr_threads.clear(); self.plugin_stdout_threads.clear(); self.plugin_hooks.clear()
+            with self._health_lock: self.plugin_health.clear()
+            logging.logger.info("All plugins shut down and resources cleared.")
 
     def load_all_plugins(self):
-        self.shutdown_all_plugins()
+        with self._lifecycle_lock:
+            self.shutdown_all_plugins()
+            for subdir_path, plugin_type in self._plugin_directories():
+                self._load_plugins_from_subdir(subdir_path, plugin_type)
+            logging.logger.info(f"Plugins loaded: {list(self.plugin_procs.keys())}")
+            for plugin_name in list(self.plugin_procs.keys()):
+                self._run_lifecycle_init(plugin_name)
+
+    def _plugin_directories(self) -> list:
+        """Returns [(absolute path, plugin type)] for the interface and extension plugin directories."""
         interfaces_rel_path = self.project_config.get("plugins_interfaces_dir", "plugins/interfaces")
         extensions_rel_path = self.project_config.get("plugins_extensions_dir", "plugins/extensions")
-        interfaces_abs_path = ROOT_DIR / interfaces_rel_path
-        extensions_abs_path = ROOT_DIR / extensions_rel_path
-        self._load_plugins_from_subdir(interfaces_abs_path, 'interface')
-        self._load_plugins_from_subdir(extensions_abs_path, 'extension')
-        logging.logger.info(f"Plugins loaded: {list(self.plugin_procs.keys())}")
+        return [(ROOT_DIR / interfaces_rel_path, 'interface'), (ROOT_DIR / extensions_rel_path, 'extension')]
 
     def _load_plugins_from_subdir(self, subdir_path: Path, plugin_type: str):
         if not subdir_path.is_dir():
@@ -94,31 +226,501 @@ class PluginManager:
             return
         logging.logger.info(f"Scanning for {plugin_type} plugins in: {subdir_path}")
         for item in subdir_path.iterdir():
-            if item.is_dir():
-                plugin_folder_name = item.name; plugin_full_path = item
-                config_path = plugin_full_path / "config.json"; plugin_file = plugin_full_path / "plugin.py"
-                if not config_path.is_file(): logging.logger.warning(f"Skipping '{plugin_folder_name}': Missing config.json"); continue
-                if not plugin_file.is_file(): logging.logger.warning(f"Skipping '{plugin_folder_name}': Missing plugin.py"); continue
-                try:
-                    with config_path.open('r', encoding='utf-8') as f: config = json.load(f)
-                    effective_plugin_name = config.get("name", plugin_folder_name)
-                    if effective_plugin_name in self.plugin_procs: logging.logger.error(f"Collision: '{effective_plugin_name}' loaded. Skip {plugin_full_path}"); continue
-                except Exception as e: logging.logger.error(f"Error loading config for '{plugin_folder_name}': {e}", exc_info=True); continue
-                try:
-                    plugin_main_class = config.get("main_class", "PluginBase")
-                    cmd = [sys.executable, str(ROOT_DIR / "core" / "plugin_executor.py"), str(subdir_path), plugin_folder_name, plugin_main_class]
-                    creationflags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
-                    logging.logger.info(f"Launching '{effective_plugin_name}': {' '.join(cmd)}")
-                    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8', creationflags=creationflags, bufsize=1)
-                    self.plugin_procs[effective_plugin_name] = {'process': proc, 'stdin': proc.stdin, 'stdout': proc.stdout, 'stderr': proc.stderr}
-                    self.plugin_configs[effective_plugin_name] = config; self.plugin_types[effective_plugin_name] = plugin_type; self.plugin_paths[effective_plugin_name] = plugin_full_path
-                    thread = threading.Thread(target=self._read_stderr, args=(effective_plugin_name, proc.stderr), daemon=True)
-                    thread.start(); self.plugin_stderr_threads[effective_plugin_name] = thread
-                    logging.logger.info(f"Launched {plugin_type} plugin: '{effective_plugin_name}' (PID: {proc.pid})")
-                except Exception as e:
-                    logging.logger.exception(f"Failed to launch plugin '{effective_plugin_name}' from {plugin_full_path}")
-                    if 'proc' in locals() and proc.poll() is None: proc.kill(); proc.wait()
-                    if effective_plugin_name in self.plugin_procs: del self.plugin_procs[effective_plugin_name]
+            if item.is_dir(): self._load_plugin_from_dir(item, plugin_type)
+
+    def _read_plugin_config(self, plugin_full_path: Path) -> dict:
+        """Validates a plugin folder and returns its config.json. Raises ValueError/OSError/JSONDecodeError."""
+        config_path = plugin_full_path / "config.json"; plugin_file = plugin_full_path / "plugin.py"
+        if not config_path.is_file(): raise ValueError("Missing config.json")
+        if not plugin_file.is_file(): raise ValueError("Missing plugin.py")
+        with config_path.open('r', encoding='utf-8') as f: return json.load(f)
+
+    @staticmethod
+    def _config_has_entry_point(config: dict, plugin_type: str) -> bool:
+        return plugin_type != 'interface' or bool(config.get("main_class"))
+
+    def has_executor_entry_point(self, plugin_name: str) -> bool:
+        """
+        False for interface plugins without a "main_class": they are UI code loaded in the application process,
+        so no executor process is spawned (it could only fail) and the supervisor ignores them.
+        """
+        return self._config_has_entry_point(self.plugin_configs.get(plugin_name) or {}, self.plugin_types.get(plugin_name))
+
+    def _load_plugin_from_dir(self, plugin_full_path: Path, plugin_type: str):
+        """Registers and launches one plugin folder. Returns the plugin name, or None if it was skipped."""
+        plugin_folder_name = plugin_full_path.name
+        try:
+            config = self._read_plugin_config(plugin_full_path)
+            effective_plugin_name = config.get("name", plugin_folder_name)
+            if effective_plugin_name in self.plugin_procs: logging.logger.error(f"Collision: '{effective_plugin_name}' loaded. Skip {plugin_full_path}"); return None
+        except ValueError as e: logging.logger.warning(f"Skipping '{plugin_folder_name}': {e}"); return None
+        except Exception as e: logging.logger.error(f"Error loading config for '{plugin_folder_name}': {e}", exc_info=True); return None
+        try:
+            self.plugin_configs[effective_plugin_name] = config; self.plugin_types[effective_plugin_name] = plugin_type; self.plugin_paths[effective_plugin_name] = plugin_full_path
+            self.plugin_hooks[effective_plugin_name] = self._parse_hook_declaration(effective_plugin_name, config.get("hooks"))
+            if not self.has_executor_entry_point(effective_plugin_name):
+                logging.logger.info(f"Registered {plugin_type} plugin: '{effective_plugin_name}' (no main_class; not spawned or supervised)")
+                return effective_plugin_name
+            if self.is_lazy_plugin(effective_plugin_name):
+                with self._health_lock: self.plugin_health[effective_plugin_name] = self._new_health_record(self.HEALTH_INACTIVE)
+                logging.logger.info(f"Registered lazy {plugin_type} plugin: '{effective_plugin_name}' (starts on first use)")
+                return effective_plugin_name
+            proc = self._start_plugin_process(effective_plugin_name)
+            with self._health_lock: self.plugin_health[effective_plugin_name] = self._new_health_record()
+            logging.logger.info(f"Launched {plugin_type} plugin: '{effective_plugin_name}' (PID: {proc.pid})")
+            return effective_plugin_name
+        except Exception as e:
+            logging.logger.exception(f"Failed to launch plugin '{effective_plugin_name}' from {plugin_full_path}")
+            proc_info = self.plugin_procs.pop(effective_plugin_name, None)
+            if proc_info and proc_info['process'].poll() is None: proc_info['stopping'] = True; proc_info['process'].kill(); proc_info['process'].wait()
+            for registry in (self.plugin_configs, self.plugin_types, self.plugin_paths, self.plugin_hooks): registry.pop(effective_plugin_name, None)
+            return None
+
+    # --- Hot reload ---
+    def reload_plugin(self, plugin_name: str) -> bool:
+        """
+        Replaces one plugin's process with a fresh one running the code and config currently on disk.
+        The new process is started, pinged and initialised next to the old one, then swapped in atomically;
+        the old process finishes its in-flight calls before it is terminated. Other plugins are untouched.
+        Returns True if the new process is serving calls.
+        """
+        plugin_full_path = self.plugin_paths.get(plugin_name); plugin_type = self.plugin_types.get(plugin_name)
+        if plugin_full_path is None:
+            logging.logger.warning(f"Cannot reload unknown plugin '{plugin_name}'.")
+            return False
+        with self._reload_lock:
+            if plugin_name in self._reloading: return False
+            self._reloading.add(plugin_name)
+        try:
+            started = time.monotonic()
+            try:
+                config = self._read_plugin_config(plugin_full_path)
+            except Exception as e:
+                logging.logger.error(f"Not reloading '{plugin_name}': {e}. The running version stays active.")
+                return False
+            new_name = config.get("name", plugin_full_path.name)
+            if new_name != plugin_name:
+                if new_name in self.plugin_paths:
+                    logging.logger.error(f"Not reloading '{plugin_name}': renamed to '{new_name}', which is already loaded.")
+                    return False
+                logging.logger.info(f"Plugin '{plugin_name}' was renamed to '{new_name}'; replacing it.")
+                self.unload_plugin(plugin_name)
+                return self.add_plugin(plugin_full_path, plugin_type) is not None
+
+            if not self._config_has_entry_point(config, plugin_type):
+                with self._lifecycle_lock:
+                    self.plugin_configs[plugin_name] = config
+                    self.plugin_hooks[plugin_name] = self._parse_hook_declaration(plugin_name, config.get("hooks"))
+                    old_proc_info = self.plugin_procs.pop(plugin_name, None)
+                    with self._health_lock: self.plugin_health.pop(plugin_name, None)
+                if old_proc_info: self._terminate_plugin_process(plugin_name, old_proc_info)
+                logging.logger.info(f"Reloaded plugin '{plugin_name}' (config only; no main_class).")
+                return True
+
+            if config.get("activation") == self.ACTIVATION_LAZY and plugin_name not in self.plugin_procs:
+                # Not running: the next activation picks up the new code anyway
+                with self._lifecycle_lock:
+                    self.plugin_configs[plugin_name] = config
+                    self.plugin_hooks[plugin_name] = self._parse_hook_declaration(plugin_name, config.get("hooks"))
+                    with self._health_lock: self.plugin_health[plugin_name] = self._new_health_record(self.HEALTH_INACTIVE)
+                logging.logger.info(f"Reloaded inactive lazy plugin '{plugin_name}' (config only).")
+                return True
+
+            try:
+                new_proc_info = self._spawn_plugin_process(plugin_name, plugin_full_path, config)
+            except Exception as e:
+                logging.logger.exception(f"Not reloading '{plugin_name}': could not start the new process. The running version stays active.")
+                return False
+            ping = self._send_request(plugin_name, "ping", None, self.DEFAULT_PLUGIN_TIMEOUT, new_proc_info, record_metrics=False)
+            if self.is_error_result(ping):
+                logging.logger.error(f"Not reloading '{plugin_name}': new process did not answer ({ping['error'].get('message')}). The running version stays active.")
+                self._terminate_plugin_process(plugin_name, new_proc_info)
+                return False
+            self._run_lifecycle_init(plugin_name, new_proc_info)
+
+            with self._lifecycle_lock:
+                old_proc_info = self.plugin_procs.get(plugin_name)
+                self.plugin_configs[plugin_name] = config
+                self.plugin_hooks[plugin_name] = self._parse_hook_declaration(plugin_name, config.get("hooks"))
+                self._register_plugin_process(plugin_name, new_proc_info)
+                with self._health_lock: self.plugin_health[plugin_name] = self._new_health_record()
+            logging.logger.info(f"Reloaded plugin '{plugin_name}' (PID: {new_proc_info['process'].pid}) in {(time.monotonic() - started) * 1000:.0f} ms.")
+
+            if old_proc_info:
+                old_proc_info['stopping'] = True # Its exit is expected now; do not report it to the supervisor
+                self._drain_plugin_process(plugin_name, old_proc_info)
+                self._terminate_plugin_process(plugin_name, old_proc_info)
+            return True
+        finally:
+            with self._reload_lock: self._reloading.discard(plugin_name)
+
+    def _drain_plugin_process(self, plugin_name: str, proc_info: dict):
+        """Waits (up to the default call timeout) until a replaced process has answered its in-flight calls."""
+        deadline = time.monotonic() + self.DEFAULT_PLUGIN_TIMEOUT
+        while time.monotonic() < deadline and proc_info['process'].poll() is None:
+            with proc_info['pending_lock']:
+                if not proc_info['pending']: return
+            time.sleep(0.01)
+        with proc_info['pending_lock']: in_flight = len(proc_info['pending'])
+        if in_flight: logging.logger.warning(f"Old process of '{plugin_name}' still had {in_flight} call(s) in flight when it was stopped.")
+
+    def add_plugin(self, plugin_full_path: Path, plugin_type: str):
+        """Loads a plugin folder that appeared after startup. Returns the plugin name or None."""
+        with self._lifecycle_lock:
+            plugin_name = self._load_plugin_from_dir(plugin_full_path, plugin_type)
+        if plugin_name and plugin_name in self.plugin_procs: self._run_lifecycle_init(plugin_name)
+        return plugin_name
+
+    def unload_plugin(self, plugin_name: str) -> bool:
+        """Stops a single plugin and forgets it; other plugins keep running."""
+        with self._lifecycle_lock:
+            if plugin_name not in self.plugin_paths: return False
+            proc_info = self.plugin_procs.pop(plugin_name, None)
+            for registry in (self.plugin_configs, self.plugin_types, self.plugin_paths, self.plugin_hooks): registry.pop(plugin_name, None)
+            with self._health_lock: self.plugin_health.pop(plugin_name, None)
+        if proc_info: self._terminate_plugin_process(plugin_name, proc_info)
+        self.plugin_metrics.reset(plugin_name)
+        logging.logger.info(f"Unloaded plugin '{plugin_name}'.")
+        return True
+
+    def start_plugin_watcher(self):
+        """Starts polling the plugin directories so changed plugins are reloaded individually (disable with "plugin_hot_reload": false)."""
+        if self._watcher_thread and self._watcher_thread.is_alive(): return
+        self._watcher_stop.clear()
+        self._watcher_thread = threading.Thread(target=self._watch_plugins, name="PluginWatcher", daemon=True)
+        self._watcher_thread.start()
+        logging.logger.info(f"Plugin file watcher started (polling every {self.WATCH_INTERVAL}s).")
+
+    def stop_plugin_watcher(self):
+        self._watcher_stop.set()
+        thread = self._watcher_thread
+        if thread and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout=self.WATCH_INTERVAL + 1)
+            if thread.is_alive(): logging.logger.warning("Plugin watcher thread did not join.")
+        self._watcher_thread = None
+
+    def _scan_plugin_tree(self) -> dict:
+        """Returns {plugin folder: (plugin type, signature)} for folders containing config.json and plugin.py."""
+        tree = {}
+        for subdir_path, plugin_type in self._plugin_directories():
+            try: items = [item for item in subdir_path.iterdir() if item.is_dir()]
+            except OSError: continue
+            for item in items:
+                if not (item / "config.json").is_file() or not (item / "plugin.py").is_file(): continue
+                entries = []
+                for dirpath, dirnames, filenames in os.walk(item):
+                    dirnames[:] = [d for d in dirnames if d != "__pycache__" and not d.startswith('.')]
+                    for filename in filenames:
+                        if filename.endswith(('.pyc', '.swp', '~')) or filename.startswith('.'): continue
+                        try: stat = os.stat(os.path.join(dirpath, filename))
+                        except OSError: continue
+                        entries.append((os.path.relpath(os.path.join(dirpath, filename), item), stat.st_mtime_ns, stat.st_size))
+                tree[item] = (plugin_type, tuple(sorted(entries)))
+        return tree
+
+    def _watch_plugins(self):
+        applied = self._scan_plugin_tree() # State the running plugins were loaded from
+        previous = applied
+        while not self._watcher_stop.wait(self.WATCH_INTERVAL):
+            try:
+                current = self._scan_plugin_tree()
+                names_by_path = {path: name for name, path in list(self.plugin_paths.items())}
+                for folder in set(applied) | set(current):
+                    # Act once a change has been stable for one interval, so half-written saves are not loaded
+                    if current.get(folder) == applied.get(folder) or current.get(folder) != previous.get(folder): continue
+                    applied[folder] = current.get(folder)
+                    if applied[folder] is None: del applied[folder]
+                    plugin_name = names_by_path.get(folder)
+                    if folder not in current:
+                        if plugin_name: logging.logger.info(f"Plugin folder removed: {folder}"); self.unload_plugin(plugin_name)
+                    elif plugin_name:
+                        logging.logger.info(f"Plugin '{plugin_name}' changed on disk; reloading.")
+                        self.reload_plugin(plugin_name)
+                    else:
+                        logging.logger.info(f"New plugin folder detected: {folder}")
+                        self.add_plugin(folder, current[folder][0])
+                previous = current
+            except Exception:
+                logging.logger.exception("Plugin watcher error")
+        logging.logger.info("Plugin file watcher stopped.")
+
+    # --- Supervisor ---
+    def _new_health_record(self, state: str = None) -> dict:
+        return {'state': state or self.HEALTH_HEALTHY, 'consecutive_failures': 0, 'failure_times': [], 'restart_count': 0,
+                'next_restart_at': None, 'last_heartbeat': None, 'heartbeat_latency_ms': None, 'last_error': None, 'limit_breaches': []}
+
+    def start_supervisor(self):
+        """Starts the background thread that heartbeats plugins and restarts failed ones."""
+        if self._supervisor_thread and self._supervisor_thread.is_alive(): return
+        self._supervisor_stop.clear()
+        self._supervisor_thread = threading.Thread(target=self._supervise_plugins, name="PluginSupervisor", daemon=True)
+        self._supervisor_thread.start()
+        logging.logger.info(f"Plugin supervisor started (heartbeat every {self.HEARTBEAT_INTERVAL}s).")
+
+    def stop_supervisor(self):
+        self._supervisor_stop.set(); self._supervisor_wake.set()
+        thread = self._supervisor_thread
+        if thread and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout=self.HEARTBEAT_TIMEOUT + 1)
+            if thread.is_alive(): logging.logger.warning("Plugin supervisor thread did not join.")
+        self._supervisor_thread = None
+
+    def _next_restart_due(self):
+        due = [health['next_restart_at'] for health in list(self.plugin_health.values()) if health['state'] == self.HEALTH_FAILED and health['next_restart_at'] is not None]
+        return min(due) if due else None
+
+    def _supervise_plugins(self):
+        # Heartbeats run every HEARTBEAT_INTERVAL; a scheduled restart wakes the supervisor at its own due time in between
+        next_heartbeat = time.monotonic() + self.HEARTBEAT_INTERVAL
+        while not self._supervisor_stop.is_set():
+            restart_due = self._next_restart_due()
+            wake_at = next_heartbeat if restart_due is None else min(next_heartbeat, restart_due)
+            self._supervisor_wake.wait(max(0.0, wake_at - time.monotonic()))
+            self._supervisor_wake.clear()
+            if self._supervisor_stop.is_set(): break
+            heartbeat = time.monotonic() >= next_heartbeat
+            if heartbeat: next_heartbeat = time.monotonic() + self.HEARTBEAT_INTERVAL
+            for plugin_name in list(self.plugin_health.keys()):
+                if self._supervisor_stop.is_set(): break
+                if not heartbeat:
+                    if (self.plugin_health.get(plugin_name) or {}).get('state') == self.HEALTH_FAILED: self._check_plugin_health(plugin_name)
+                    continue
+                try: self._check_plugin_health(plugin_name)
+                except Exception: logging.logger.exception(f"Supervisor error while checking plugin '{plugin_name}'")
+                try: self._sample_plugin_resources(plugin_name)
+                except Exception: logging.logger.exception(f"Supervisor error while sampling plugin '{plugin_name}'")
+        logging.logger.info("Plugin supervisor stopped.")
+
+    def _check_plugin_health(self, plugin_name: str):
+        health = self.plugin_health.get(plugin_name)
+        if not health or health['state'] in (self.HEALTH_QUARANTINED, self.HEALTH_DISABLED, self.HEALTH_INACTIVE): return
+        if health['state'] == self.HEALTH_FAILED:
+            if time.monotonic() >= health['next_restart_at']:
+                if self.is_lazy_plugin(plugin_name): # No eager restart; the next call activates it again
+                    with self._health_lock: health['state'] = self.HEALTH_INACTIVE; health['next_restart_at'] = None
+                else: self._restart_plugin(plugin_name)
+            return
+        if self._deactivate_if_idle(plugin_name): return
+        proc_info = self.plugin_procs.get(plugin_name)
+        if not proc_info or proc_info['process'].poll() is not None:
+            code = proc_info['process'].returncode if proc_info else None
+            self._mark_plugin_failed(plugin_name, f"process exited (code {code})", proc_info)
+            return
+        # Heartbeats are kept out of the call metrics (they would make idle plugins look busy); their round trip is in the health record
+        sent_at = time.monotonic()
+        result = self._send_request(plugin_name, "ping", None, self.HEARTBEAT_TIMEOUT, record_metrics=False)
+        if self.is_error_result(result):
+            logging.logger.warning(f"Heartbeat to '{plugin_name}' failed: {result['error'].get('message')}")
+            self._record_call_failure(plugin_name, f"missed heartbeat: {result['error'].get('message')}")
+        else:
+            with self._health_lock:
+                health['consecutive_failures'] = 0; health['last_heartbeat'] = time.time()
+                health['heartbeat_latency_ms'] = (time.monotonic() - sent_at) * 1000.0
+
+    def _record_call_failure(self, plugin_name: str, reason: str):
+        health = self.plugin_health.get(plugin_name)
+        if not health: return
+        with self._health_lock:
+            health['consecutive_failures'] += 1
+            declare_failed = health['consecutive_failures'] >= self.MAX_CONSECUTIVE_FAILURES
+        if declare_failed: self._mark_plugin_failed(plugin_name, reason)
+
+    def _mark_plugin_failed(self, plugin_name: str, reason: str, proc_info: dict = None):
+        """Takes a plugin out of rotation and schedules a restart, or quarantines it if it keeps crashing."""
+        health = self.plugin_health.get(plugin_name)
+        if not health: return
+        if proc_info is not None and self.plugin_procs.get(plugin_name) is not proc_info: return # Stale report about a replaced process
+        now = time.monotonic()
+        with self._health_lock:
+            if health['state'] != self.HEALTH_HEALTHY: return
+            health['last_error'] = reason
+            health['failure_times'] = [t for t in health['failure_times'] if now - t < self.CRASH_LOOP_WINDOW] + [now]
+            failures_in_window = len(health['failure_times'])
+            if failures_in_window >= self.CRASH_LOOP_MAX_FAILURES:
+                health['state'] = self.HEALTH_QUARANTINED; health['next_restart_at'] = None
+            else:
+                backoff = min(self.RESTART_BACKOFF_BASE * (2 ** (failures_in_window - 1)), self.RESTART_BACKOFF_MAX)
+                health['state'] = self.HEALTH_FAILED; health['next_restart_at'] = now + backoff
+        if health['state'] == self.HEALTH_QUARANTINED:
+            logging.logger.error(f"Plugin '{plugin_name}' quarantined after {failures_in_window} failures in {self.CRASH_LOOP_WINDOW:.0f}s. Last: {reason}")
+        else:
+            logging.logger.error(f"Plugin '{plugin_name}' failed ({reason}). Restart scheduled in {health['next_restart_at'] - now:.1f}s.")
+            self._supervisor_wake.set()
+        # Make sure a hung process does not linger while it waits for its restart
+        with self._lifecycle_lock:
+            if self.plugin_procs.get(plugin_name) is not None and (proc_info is None or self.plugin_procs.get(plugin_name) is proc_info):
+                self._terminate_plugin_process(plugin_name)
+
+    def _restart_plugin(self, plugin_name: str):
+        with self._lifecycle_lock:
+            health = self.plugin_health.get(plugin_name)
+            if not health or plugin_name not in self.plugin_paths: return
+            self._terminate_plugin_process(plugin_name)
+            try:
+                proc = self._start_plugin_process(plugin_name)
+            except Exception as e:
+                logging.logger.exception(f"Failed to restart plugin '{plugin_name}'")
+                self.plugin_procs.pop(plugin_name, None)
+                with self._health_lock: health['state'] = self.HEALTH_HEALTHY # Let _mark_plugin_failed reschedule with backoff
+                self._mark_plugin_failed(plugin_name, f"restart failed: {e}")
+                return
+            with self._health_lock:
+                health['state'] = self.HEALTH_HEALTHY; health['consecutive_failures'] = 0
+                health['next_restart_at'] = None; health['restart_count'] += 1
+            logging.logger.info(f"Restarted plugin '{plugin_name}' (PID: {proc.pid}, restart #{health['restart_count']}).")
+        self._run_lifecycle_init(plugin_name)
+
+    def _run_lifecycle_init(self, plugin_name: str, proc_info: dict = None):
+        """Replays the lifecycle initialisation calls a fresh plugin process expects."""
+        for method in self.LIFECYCLE_INIT_METHODS:
+            result = self._send_request(plugin_name, method, {}, self.DEFAULT_PLUGIN_TIMEOUT, proc_info)
+            if self.is_error_result(result):
+                if result['error'].get('code') == json_rpc.METHOD_NOT_FOUND:
+                    logging.logger.debug(f"Plugin '{plugin_name}' does not implement lifecycle method '{method}'.")
+                else:
+                    logging.logger.warning(f"Lifecycle method '{method}' failed for plugin '{plugin_name}': {result['error'].get('message')}")
+
+    def reset_plugin(self, plugin_name: str) -> bool:
+        """Clears a plugin's failure history (lifts a quarantine or limit-based disable) and restarts it immediately."""
+        health = self.plugin_health.get(plugin_name)
+        if not health: return False
+        with self._health_lock: health['failure_times'] = []; health['limit_breaches'] = []; health['state'] = self.HEALTH_FAILED; health['next_restart_at'] = time.monotonic()
+        self._restart_plugin(plugin_name)
+        return self.is_plugin_healthy(plugin_name)
+
+    # --- Lazy activation ---
+    def is_lazy_plugin(self, plugin_name: str) -> bool:
+        return (self.plugin_configs.get(plugin_name) or {}).get("activation", self.ACTIVATION_EAGER) == self.ACTIVATION_LAZY
+
+    def activate_plugin(self, plugin_name: str) -> bool:
+        """Starts the process of an inactive lazy plugin. Returns True if the plugin is (now) healthy."""
+        with self._lifecycle_lock:
+            health = self.plugin_health.get(plugin_name)
+            if not health or health['state'] != self.HEALTH_INACTIVE: return self.is_plugin_healthy(plugin_name)
+            started = time.monotonic()
+            try:
+                proc = self._start_plugin_process(plugin_name)
+            except Exception as e:
+                logging.logger.exception(f"Failed to activate lazy plugin '{plugin_name}'")
+                self.plugin_procs.pop(plugin_name, None)
+                with self._health_lock: health['state'] = self.HEALTH_HEALTHY # Let _mark_plugin_failed apply the usual backoff
+                self._mark_plugin_failed(plugin_name, f"activation failed: {e}")
+                return False
+            # Still inactive while on_load runs, so concurrent callers wait on the lock instead of racing it
+            self._run_lifecycle_init(plugin_name)
+            with self._health_lock: health['state'] = self.HEALTH_HEALTHY; health['consecutive_failures'] = 0
+            logging.logger.info(f"Activated lazy plugin '{plugin_name}' (PID: {proc.pid}) in {(time.monotonic() - started) * 1000:.0f} ms.")
+            return True
+
+    def warm_up_plugin(self, plugin_name: str, wait: bool = False) -> bool:
+        """Hint that a lazy plugin will be needed soon: activates it in the background (or inline with wait=True)."""
+        health = self.plugin_health.get(plugin_name)
+        if not health or health['state'] != self.HEALTH_INACTIVE: return self.is_plugin_healthy(plugin_name)
+        if wait: return self.activate_plugin(plugin_name)
+        threading.Thread(target=self.activate_plugin, args=(plugin_name,), name=f"PluginWarmUp-{plugin_name}", daemon=True).start()
+        return True
+
+    def warm_up_hook_subscribers(self, hooks):
+        """Warms up inactive lazy plugins subscribed to any of `hooks`."""
+        for hook in hooks:
+            for plugin_name, mode in self.get_hook_subscribers(hook):
+                if (self.plugin_health.get(plugin_name) or {}).get('state') == self.HEALTH_INACTIVE: self.warm_up_plugin(plugin_name)
+
+    def _deactivate_if_idle(self, plugin_name: str) -> bool:
+        """Stops a lazy plugin unused for longer than its "idle_timeout" (seconds). Returns True if it was stopped."""
+        idle_timeout = (self.plugin_configs.get(plugin_name) or {}).get("idle_timeout")
+        proc_info = self.plugin_procs.get(plugin_name)
+        if not idle_timeout or not proc_info or not self.is_lazy_plugin(plugin_name): return False
+        if time.monotonic() - proc_info['last_used'] < idle_timeout: return False
+        with self._lifecycle_lock:
+            health = self.plugin_health.get(plugin_name)
+            if self.plugin_procs.get(plugin_name) is not proc_info or not health or health['state'] != self.HEALTH_HEALTHY: return False
+            with proc_info['pending_lock']:
+                if proc_info['pending']: return False
+            with self._health_lock: health['state'] = self.HEALTH_INACTIVE
+            self._terminate_plugin_process(plugin_name)
+            self.plugin_procs.pop(plugin_name, None)
+        logging.logger.info(f"Stopped lazy plugin '{plugin_name}' after {idle_timeout}s idle.")
+        return True
+
+    # --- Resource accounting ---
+    def _sample_plugin_resources(self, plugin_name: str):
+        proc_info = self.plugin_procs.get(plugin_name)
+        if not proc_info or proc_info['process'].poll() is not None: return
+        sample = self.plugin_metrics.sample_process(plugin_name, proc_info['process'].pid)
+        self._check_plugin_limits(plugin_name, sample)
+
+    def _check_plugin_limits(self, plugin_name: str, sample: dict = None):
+        """
+        Applies the optional soft limits from the plugin's config.json, e.g.
+        "limits": {"max_rss_mb": 512, "max_cpu_percent": 90, "max_p95_latency_ms": 2000, "max_timeouts": 10, "action": "log"}
+        action "log" only warns (once per breach), "disable" takes the plugin out of rotation until reset_plugin().
+        """
+        limits = (self.plugin_configs.get(plugin_name) or {}).get("limits")
+        health = self.plugin_health.get(plugin_name)
+        if not isinstance(limits, dict) or not health or health['state'] != self.HEALTH_HEALTHY: return
+        totals = self.plugin_metrics.snapshot(plugin_name)[plugin_name]['totals']
+        breaches = []
+        if sample and limits.get("max_rss_mb") is not None and sample['rss_bytes'] > limits["max_rss_mb"] * 1024 * 1024:
+            breaches.append(f"RSS {sample['rss_bytes'] / (1024 * 1024):.0f} MB > {limits['max_rss_mb']} MB")
+        if sample and limits.get("max_cpu_percent") is not None and sample['cpu_percent'] is not None and sample['cpu_percent'] > limits["max_cpu_percent"]:
+            breaches.append(f"CPU {sample['cpu_percent']:.0f}% > {limits['max_cpu_percent']}%")
+        if limits.get("max_p95_latency_ms") is not None and totals['p95_latency_ms'] is not None and totals['p95_latency_ms'] > limits["max_p95_latency_ms"]:
+            breaches.append(f"p95 latency {totals['p95_latency_ms']:.0f} ms > {limits['max_p95_latency_ms']} ms")
+        if limits.get("max_timeouts") is not None and totals['timeouts'] > limits["max_timeouts"]:
+            breaches.append(f"{totals['timeouts']} timeouts > {limits['max_timeouts']}")
+        previous = health.get('limit_breaches') or []
+        with self._health_lock: health['limit_breaches'] = breaches
+        if not breaches: return
+        reason = "soft limit exceeded: " + "; ".join(breaches)
+        if limits.get("action", "log") == "disable": self.disable_plugin(plugin_name, reason)
+        elif breaches != previous: logging.logger.warning(f"Plugin '{plugin_name}' {reason}")
+
+    def disable_plugin(self, plugin_name: str, reason: str = "disabled by host"):
+        """Stops a plugin and keeps it out of hook dispatch until reset_plugin() is called."""
+        health = self.plugin_health.get(plugin_name)
+        if not health: return
+        with self._health_lock: health['state'] = self.HEALTH_DISABLED; health['last_error'] = reason; health['next_restart_at'] = None
+        logging.logger.error(f"Plugin '{plugin_name}' disabled: {reason}")
+        with self._lifecycle_lock: self._terminate_plugin_process(plugin_name)
+
+    def get_plugin_metrics(self, plugin_name: str = None) -> dict:
+        """
+        Query API for per-plugin accounting. Returns {plugin: {'methods', 'totals', 'process', 'health', 'observers', 'runtime'}};
+        latencies are in ms, payloads in characters of the serialized JSON line, RSS in bytes.
+        'runtime' is what the running executor reported in its ready notification (None if not running).
+        """
+        names = [plugin_name] if plugin_name is not None else list(self.plugin_paths.keys())
+        health = self.get_plugin_health()
+        result = {}
+        for name in names:
+            entry = self.plugin_metrics.snapshot(name)[name]
+            entry['health'] = health.get(name)
+            entry['observers'] = self.observer_dispatcher.snapshot(name)
+            entry['runtime'] = (self.plugin_procs.get(name) or {}).get('runtime')
+            result[name] = entry
+        return result
+
+    def reset_plugin_metrics(self, plugin_name: str = None):
+        self.plugin_metrics.reset(plugin_name)
+        self.observer_dispatcher.reset(plugin_name)
+
+    def is_plugin_healthy(self, plugin_name: str) -> bool:
+        health = self.plugin_health.get(plugin_name)
+        return bool(health) and health['state'] == self.HEALTH_HEALTHY and plugin_name in self.plugin_procs
+
+    def get_plugin_health(self, plugin_name: str = None):
+        """Returns a snapshot of the supervisor's health records (one plugin, or all keyed by name)."""
+        with self._health_lock:
+            if plugin_name is not None:
+                health = self.plugin_health.get(plugin_name)
+                return dict(health, failure_times=list(health['failure_times']), limit_breaches=list(health['limit_breaches'])) if health else None
+            return {name: dict(h, failure_times=list(h['failure_times']), limit_breaches=list(h['limit_breaches'])) for name, h in self.plugin_health.items()}
+
+    @staticmethod
+    def is_error_result(result) -> bool:
+        """True if a call_plugin_method() return value is a JSON-RPC error response rather than a result."""
+        return isinstance(result, dict) and "error" in result and result.get("jsonrpc") == json_rpc.JSONRPC_VERSION
 
     def list_plugins(self, plugin_type: str = None):
         if plugin_type: return [name for name, p_type in self.plugin_types.items() if p_type == plugin_type and name in self.plugin_procs]
@@ -127,70 +729,161 @@ class PluginManager:
     def get_plugin(self, plugin_name): return self.plugin_procs.get(plugin_name)
     def get_plugin_type(self, plugin_name): return self.plugin_types.get(plugin_name)
     def get_plugin_config(self, plugin_name): return self.plugin_configs.get(plugin_name)
-    def get_enabled_plugins(self): return list(self.plugin_procs.values())
+    def is_plugin_required(self, plugin_name) -> bool:
+        """Plugins declare "required": true in config.json when a request must not proceed without their hooks."""
+        return bool((self.plugin_configs.get(plugin_name) or {}).get("required", False))
+    def get_enabled_plugins(self): return [proc_info for name, proc_info in list(self.plugin_procs.items()) if self.is_plugin_healthy(name)]
+
+    # --- Hook capabilities ---
+    def _parse_hook_declaration(self, plugin_name: str, declaration):
+        """
+        Normalizes a hook declaration into {hook: mode}. Accepted forms:
+        {"post_api": "mutate", "post_history": "observe"} or ["post_api", ...] (all mutate).
+        Returns None when nothing usable was declared.
+        """
+        if declaration is None: return None
+        if isinstance(declaration, list): declaration = {hook: self.HOOK_MUTATE for hook in declaration}
+        if not isinstance(declaration, dict):
+            logging.logger.warning(f"Plugin '{plugin_name}' has an invalid 'hooks' declaration ({type(declaration).__name__}). Ignoring it.")
+            return None
+        hooks = {}
+        for hook, mode in declaration.items():
+            if hook not in self.HOOK_NAMES: logging.logger.warning(f"Plugin '{plugin_name}' declares unknown hook '{hook}'. Ignoring it."); continue
+            if mode not in (self.HOOK_MUTATE, self.HOOK_OBSERVE):
+                logging.logger.warning(f"Plugin '{plugin_name}' hook '{hook}' has unknown mode '{mode}'. Treating it as '{self.HOOK_MUTATE}'.")
+                mode = self.HOOK_MUTATE
+            hooks[hook] = mode
+        return hooks
+
+    def _handle_plugin_notification(self, plugin_name: str, message: dict, proc_info: dict = None):
+        method = message.get("method"); params = message.get("params") or {}
+        if method == "ready":
+            if proc_info is not None:
+                if "hooks" in params: proc_info['reported_hooks'] = params["hooks"]
+                proc_info['runtime'] = params # pid, python version, max_concurrency, startup timing
+            timing = params.get("timing") or {}
+            logging.logger.info(f"Plugin '{plugin_name}' ready in {timing.get('startup_ms', '?')} ms (import {timing.get('import_ms', '?')} ms, init {timing.get('init_ms', '?')} ms, concurrency {params.get('max_concurrency', '?')}).")
+            if proc_info is not None and self.plugin_procs.get(plugin_name) is not proc_info: return # Staged by a hot reload; applied on swap
+            # config.json declarations take precedence over what the plugin process reports about itself
+            if "hooks" in params and (self.plugin_configs.get(plugin_name) or {}).get("hooks") is None:
+                self.plugin_hooks[plugin_name] = self._parse_hook_declaration(plugin_name, params["hooks"])
+                logging.logger.info(f"Plugin '{plugin_name}' reported hooks: {self.plugin_hooks[plugin_name]}")
+        else:
+            logging.logger.debug(f"Unhandled notification '{method}' from plugin '{plugin_name}'.")
+
+    def get_plugin_hooks(self, plugin_name: str) -> dict:
+        """Returns {hook: mode} for a plugin. Undeclared plugins are assumed to mutate every hook."""
+        hooks = self.plugin_hooks.get(plugin_name)
+        return dict(hooks) if hooks is not None else {hook: self.HOOK_MUTATE for hook in self.HOOK_NAMES}
+
+    def get_hook_subscribers(self, hook: str, mode: str = None) -> list:
+        """Healthy (or inactive lazy) extension plugins implementing `hook`, in load order, as [(plugin_name, mode)]."""
+        subscribers = []
+        for plugin_name, plugin_type in list(self.plugin_types.items()):
+            if plugin_type != 'extension': continue
+            if not self.is_plugin_healthy(plugin_name) and (self.plugin_health.get(plugin_name) or {}).get('state') != self.HEALTH_INACTIVE: continue
+            hook_mode = self.get_plugin_hooks(plugin_name).get(hook)
+            if hook_mode is not None and (mode is None or hook_mode == mode): subscribers.append((plugin_name, hook_mode))
+        return subscribers
 
-    def call_plugin_method(self, plugin_name: str, method: str, params: dict = None, timeout_override: int = None):
+    def call_plugin_method(self, plugin_name: str, method: str, params: dict = None, timeout_override: float = None):
+        if (self.plugin_health.get(plugin_name) or {}).get('state') == self.HEALTH_INACTIVE: self.activate_plugin(plugin_name)
+        if plugin_name in self.plugin_health and not self.is_plugin_healthy(plugin_name):
+            # Fail fast instead of burning a timeout on a plugin the supervisor already knows is down
+            health = self.plugin_health.get(plugin_name) or {}
+            logging.logger.debug(f"Skipping '{method}' on unhealthy plugin '{plugin_name}' (state: {health.get('state')}).")
+            return json_rpc.create_error_response(str(uuid.uuid4()), json_rpc.PLUGIN_ERROR, f"Plugin '{plugin_name}' is unavailable ({health.get('state')}).")
         proc_info = self.plugin_procs.get(plugin_name)
+        if proc_info: proc_info['last_used'] = time.monotonic() # Heartbeats bypass this, so they do not count as use
+        current_timeout = timeout_override if timeout_override is not None else self.DEFAULT_PLUGIN_TIMEOUT
+        result = self._send_request(plugin_name, method, params, current_timeout)
+        # A timeout cut short by the caller's latency budget says nothing about the plugin's health
+        if self.is_error_result(result) and result['error'].get('code') == json_rpc.PLUGIN_TIMEOUT and current_timeout >= self.DEFAULT_PLUGIN_TIMEOUT:
+            self._record_call_failure(plugin_name, f"timeout calling '{method}'")
+        elif plugin_name in self.plugin_health and not self.is_error_result(result):
+            with self._health_lock: self.plugin_health[plugin_name]['consecutive_failures'] = 0
+        return result
+
+    def call_plugin_with_history(self, plugin_name: str, method: str, snapshot: history_sync.HistorySnapshot, extra_params: dict = None, timeout_override: float = None):
+        """
+        Calls a history hook, sending only the messages that changed since this plugin's last call
+        (see core/history_sync.py). Falls back to a full resync when the plugin reports a mismatch.
+        A returned history delta is expanded back into a full list.
+        """
+        if (self.plugin_health.get(plugin_name) or {}).get('state') == self.HEALTH_INACTIVE: self.activate_plugin(plugin_name)
+        proc_info = self.plugin_procs.get(plugin_name)
+        if not proc_info:
+            return self.call_plugin_method(plugin_name, method, {"chat_history": snapshot.messages, **(extra_params or {})}, timeout_override)
+        with proc_info['history_lock']: # Deltas must reach the mirror in version order
+            state = proc_info['history_sync']
+            for force_full in (False, True):
+                sync = state.build_delta(snapshot, force_full=force_full)
+                result = self.call_plugin_method(plugin_name, method, {"history_sync": sync, **(extra_params or {})}, timeout_override)
+                if self.is_error_result(result) and result['error'].get('code') == history_sync.HISTORY_OUT_OF_SYNC and not force_full:
+                    logging.logger.debug(f"History mirror of '{plugin_name}' out of sync ({result['error'].get('message')}); resending full history.")
+                    continue
+                break
+        if isinstance(result, dict) and "history_delta" in result and not self.is_error_result(result):
+            return history_sync.apply_history_delta(snapshot.messages, result["history_delta"])
+        return result
+
+    def _send_request(self, plugin_name: str, method: str, params: dict, current_timeout: float, proc_info: dict = None, record_metrics: bool = True):
+        if proc_info is None: proc_info = self.plugin_procs.get(plugin_name)
         request_id = str(uuid.uuid4())
 
         if not proc_info:
             logging.logger.error(f"Plugin '{plugin_name}' not found or not loaded.")
             return json_rpc.create_error_response(request_id, json_rpc.METHOD_NOT_FOUND, f"Plugin '{plugin_name}' not found or not running.")
 
-        process = proc_info['process']; stdin_pipe = proc_info['stdin']; stdout_pipe = proc_info['stdout']
+        process = proc_info['process']; stdin_pipe = proc_info['stdin']
 
         if process.poll() is not None:
             logging.logger.error(f"Plugin '{plugin_name}' process (PID: {process.pid}) terminated (code: {process.returncode}).")
             return json_rpc.create_error_response(request_id, json_rpc.PLUGIN_ERROR, f"Plugin '{plugin_name}' process not running.")
 
-        current_timeout = timeout_override if timeout_override is not None else self.DEFAULT_PLUGIN_TIMEOUT
         request_obj = json_rpc.create_request(method, params, request_id)
         serialized_request = json_rpc.serialize_message(request_obj)
-        
-        response_str = None
+        waiter = queue.Queue(maxsize=1)
+        start_time = time.monotonic(); outcome = 'error'; bytes_received = 0; exec_s = None
+
         try:
-            logging.logger.debug(f"To '{plugin_name}' (PID {process.pid}): {serialized_request}")
-            if stdin_pipe.closed:
-                logging.logger.error(f"Stdin pipe closed for plugin '{plugin_name}'. Cannot call '{method}'.")
-                return json_rpc.create_error_response(request_id, json_rpc.PLUGIN_ERROR, "Plugin stdin pipe closed.")
-            stdin_pipe.write(serialized_request + '\n'); stdin_pipe.flush()
-
-            start_time = time.monotonic()
-            while time.monotonic() - start_time < current_timeout:
-                if stdout_pipe.closed:
-                    logging.logger.error(f"Stdout pipe closed for plugin '{plugin_name}' during call to '{method}'.")
-                    return json_rpc.create_error_response(request_id, json_rpc.PLUGIN_ERROR, "Plugin stdout pipe closed.")
-                
-                response_str = stdout_pipe.readline().strip()
-                if response_str: logging.logger.debug(f"From '{plugin_name}': {response_str}"); break
-                
-                if process.poll() is not None: # Check if plugin died during our read attempt
-                    logging.logger.error(f"Plugin '{plugin_name}' terminated during call to '{method}' while awaiting response.")
-                    return json_rpc.create_error_response(request_id, json_rpc.PLUGIN_ERROR, "Plugin terminated during call.")
-                time.sleep(0.05) 
-            else: # Timeout
+            if logging.logger.isEnabledFor(logging.py_logging.DEBUG): # Payloads can be megabytes; never format them in full
+                logging.logger.debug(f"To '{plugin_name}' (PID {process.pid}): {serialized_request[:self.LOG_PAYLOAD_CHARS]}{'...' if len(serialized_request) > self.LOG_PAYLOAD_CHARS else ''}")
+            with proc_info['pending_lock']: proc_info['pending'][request_id] = waiter
+            with proc_info['write_lock']:
+                if stdin_pipe.closed:
+                    logging.logger.error(f"Stdin pipe closed for plugin '{plugin_name}'. Cannot call '{method}'.")
+                    return json_rpc.create_error_response(request_id, json_rpc.PLUGIN_ERROR, "Plugin stdin pipe closed.")
+                stdin_pipe.write(serialized_request + '\n'); stdin_pipe.flush()
+
+            try:
+                response_data, bytes_received = waiter.get(timeout=current_timeout)
+            except queue.Empty:
+                outcome = 'timeout'
                 logging.logger.warning(f"Timeout ({current_timeout}s) calling '{method}' on '{plugin_name}'. PID: {process.pid}")
                 return json_rpc.create_error_response(request_id, json_rpc.PLUGIN_TIMEOUT, f"Timeout on plugin '{plugin_name}'.")
 
-            if not response_str: # Should be caught by timeout, but safeguard
-                logging.logger.error(f"No response from '{plugin_name}' for '{method}'.")
-                return json_rpc.create_error_response(request_id, json_rpc.PLUGIN_ERROR, "No response from plugin.")
-
-            response_data = json_rpc.deserialize_message(response_str)
-            if response_data.get("id") != request_id: logging.logger.warning(f"Mismatched ID from '{plugin_name}'. Expected {request_id}, got {response_data.get('id')}.")
+            if logging.logger.isEnabledFor(logging.py_logging.DEBUG):
+                logging.logger.debug(f"From '{plugin_name}' for '{method}': {bytes_received} chars{': ' + str(response_data)[:self.LOG_PAYLOAD_CHARS] if bytes_received <= 4 * self.LOG_PAYLOAD_CHARS else ''}")
+            if not isinstance(response_data, dict):
+                logging.logger.error(f"Invalid response from '{plugin_name}' for '{method}': not an object. Resp: {response_data}")
+                return json_rpc.create_error_response(request_id, json_rpc.INTERNAL_ERROR, "Invalid response from plugin.", {"raw_response": str(response_data)})
+            timing = response_data.get("timing")
+            if isinstance(timing, dict) and isinstance(timing.get("exec_ms"), (int, float)): exec_s = timing["exec_ms"] / 1000.0
             if "error" in response_data: logging.logger.error(f"Plugin '{plugin_name}' error for '{method}': {response_data['error']}"); return response_data
-            if "result" in response_data: return response_data["result"]
+            if "result" in response_data: outcome = 'ok'; return response_data["result"]
             logging.logger.error(f"Invalid response from '{plugin_name}' for '{method}': missing 'result'. Resp: {response_data}")
-            return json_rpc.create_error_response(request_id, json_rpc.INTERNAL_ERROR, "Invalid response from plugin.", {"raw_response": response_str})
-        except json.JSONDecodeError as e:
-            logging.logger.error(f"JSON decode error from '{plugin_name}': {e}. Raw: '{str(response_str)}'")
-            return json_rpc.create_error_response(request_id, json_rpc.PARSE_ERROR, "Bad JSON from plugin.", {"raw_response": str(response_str)})
-        except BrokenPipeError as e:
+            return json_rpc.create_error_response(request_id, json_rpc.INTERNAL_ERROR, "Invalid response from plugin.", {"raw_response": str(response_data)})
+        except (BrokenPipeError, ValueError) as e: # ValueError: write to a pipe closed by a concurrent terminate
             logging.logger.error(f"Broken pipe with '{plugin_name}' (method: '{method}'): {e}. Process poll: {process.poll()}")
             return json_rpc.create_error_response(request_id, json_rpc.PLUGIN_ERROR, f"Broken pipe with '{plugin_name}'.")
         except Exception as e:
             logging.logger.exception(f"Generic error calling '{method}' on '{plugin_name}': {e}")
             return json_rpc.create_error_response(request_id, json_rpc.INTERNAL_ERROR, f"Host error calling '{plugin_name}': {str(e)}")
+        finally:
+            with proc_info['pending_lock']: proc_info['pending'].pop(request_id, None)
+            # Payload sizes are measured in characters of the serialized line (equal to bytes for ASCII JSON)
+            if record_metrics: self.plugin_metrics.record_call(plugin_name, method, time.monotonic() - start_time, outcome, len(serialized_request) + 1, bytes_received, exec_s)
 
 # Example usage (commented out)
 # if __name__ == '__main__':
@@ -200,11 +893,7 @@ class PluginManager:
 #     # Create dummy plugin dirs/files for testing if needed
 #     # (Path(ROOT_DIR) / "plugins/interfaces/example_plugin").mkdir(parents=True, exist_ok=True)
 #     # with open(Path(ROOT_DIR) / "plugins/interfaces/example_plugin/config.json", "w") as f: json.dump({"name": "Example", "main_class": "PluginBase"}, f)
-#     # with open(Path(ROOT_DIR) / "plugins/interfaces/example_plugin/plugin.py", "w") as f: f.write("class PluginBase:
-  def __init__(self, path, config):
-    print('Example plugin init')
-  def my_method(self, text):
-    return f'Plugin received: {{text}}'")
+#     # with open(Path(ROOT_DIR) / "plugins/interfaces/example_plugin/plugin.py", "w") as f: f.write("class PluginBase:\n  def __init__(self, path, config):\n    print('Example plugin init')\n  def my_method(self, text):\n    return f'Plugin received: {text}'\n")
 #     plugin_manager = PluginManager(None, pm_config)
 #     print(f"Loaded plugins: {plugin_manager.list_plugins()}")
 #     if "Example" in plugin_manager.list_plugins():
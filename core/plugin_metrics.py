@@ -0,0 +1,118 @@
+import os
+import sys
+import threading
+import time
+from core import logging
+
+class PluginMetrics:
+    """
+    Thread-safe per-plugin accounting used by the PluginManager.
+    Tracks per-method call counts, latency histograms, errors, timeouts and payload sizes,
+    the execution time the plugin process reports for each call (the rest of the latency is IPC overhead),
+    plus CPU time and resident memory of each plugin process sampled from /proc (Linux only).
+    """
+    # Upper bounds (ms) of the latency histogram buckets; one extra overflow bucket is kept at the end.
+    LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}    # plugin -> method -> stats dict
+        self._process = {}  # plugin -> process sample dict
+        self._proc_available = sys.platform.startswith("linux") and os.path.isdir("/proc")
+        self._clock_ticks = os.sysconf("SC_CLK_TCK") if self._proc_available else 100
+        self._page_size = os.sysconf("SC_PAGE_SIZE") if self._proc_available else 4096
+
+    def _new_method_stats(self) -> dict:
+        return {'calls': 0, 'errors': 0, 'timeouts': 0, 'total_latency_ms': 0.0, 'max_latency_ms': 0.0,
+                'histogram': [0] * (len(self.LATENCY_BUCKETS_MS) + 1),
+                'bytes_sent': 0, 'bytes_received': 0, 'max_request_bytes': 0, 'max_response_bytes': 0,
+                'total_exec_ms': 0.0, 'exec_samples': 0}
+
+    def record_call(self, plugin_name: str, method: str, latency_s: float, outcome: str, bytes_sent: int, bytes_received: int, exec_s: float = None):
+        """outcome is one of 'ok', 'error', 'timeout'. exec_s is the time the plugin itself reported, if any."""
+        latency_ms = latency_s * 1000.0
+        bucket = len(self.LATENCY_BUCKETS_MS)
+        for i, upper in enumerate(self.LATENCY_BUCKETS_MS):
+            if latency_ms <= upper: bucket = i; break
+        with self._lock:
+            stats = self._calls.setdefault(plugin_name, {}).get(method)
+            if stats is None: stats = self._calls[plugin_name][method] = self._new_method_stats()
+            stats['calls'] += 1
+            if outcome == 'timeout': stats['timeouts'] += 1
+            elif outcome != 'ok': stats['errors'] += 1
+            stats['total_latency_ms'] += latency_ms
+            stats['max_latency_ms'] = max(stats['max_latency_ms'], latency_ms)
+            stats['histogram'][bucket] += 1
+            stats['bytes_sent'] += bytes_sent; stats['bytes_received'] += bytes_received
+            stats['max_request_bytes'] = max(stats['max_request_bytes'], bytes_sent)
+            stats['max_response_bytes'] = max(stats['max_response_bytes'], bytes_received)
+            if exec_s is not None: stats['total_exec_ms'] += exec_s * 1000.0; stats['exec_samples'] += 1
+
+    def sample_process(self, plugin_name: str, pid: int):
+        """Reads CPU time and RSS for a plugin process from /proc. Returns the sample or None if unavailable."""
+        if not self._proc_available or pid is None: return None
+        try:
+            with open(f"/proc/{pid}/stat", "r") as f: stat = f.read()
+            # Fields after the parenthesised command name; utime/stime are fields 14/15 (1-based) of the full line
+            fields = stat[stat.rfind(')') + 2:].split()
+            cpu_seconds = (int(fields[11]) + int(fields[12])) / self._clock_ticks
+            with open(f"/proc/{pid}/statm", "r") as f: rss_bytes = int(f.read().split()[1]) * self._page_size
+        except (OSError, IndexError, ValueError) as e:
+            logging.logger.debug(f"Could not sample /proc for plugin '{plugin_name}' (PID {pid}): {e}")
+            return None
+        now = time.monotonic()
+        with self._lock:
+            previous = self._process.get(plugin_name)
+            cpu_percent = None
+            if previous and previous['pid'] == pid and now > previous['sampled_at']:
+                cpu_percent = 100.0 * (cpu_seconds - previous['cpu_seconds']) / (now - previous['sampled_at'])
+            sample = {'pid': pid, 'cpu_seconds': cpu_seconds, 'cpu_percent': cpu_percent, 'rss_bytes': rss_bytes, 'sampled_at': now}
+            self._process[plugin_name] = sample
+        return dict(sample)
+
+    def _percentile(self, stats: dict, q: float):
+        if not stats['calls']: return None
+        threshold = q * stats['calls']; cumulative = 0
+        for i, count in enumerate(stats['histogram']):
+            cumulative += count
+            if cumulative >= threshold:
+                return float(self.LATENCY_BUCKETS_MS[i]) if i < len(self.LATENCY_BUCKETS_MS) else stats['max_latency_ms']
+        return stats['max_latency_ms']
+
+    def _summarize(self, stats: dict) -> dict:
+        summary = {k: v for k, v in stats.items() if k != 'histogram'}
+        summary['histogram'] = list(stats['histogram'])
+        summary['avg_latency_ms'] = stats['total_latency_ms'] / stats['calls'] if stats['calls'] else None
+        summary['avg_exec_ms'] = stats['total_exec_ms'] / stats['exec_samples'] if stats['exec_samples'] else None
+        # Overhead only over calls that reported exec time, so timeouts do not skew it
+        summary['avg_overhead_ms'] = None
+        if stats['exec_samples'] and stats['exec_samples'] == stats['calls']:
+            summary['avg_overhead_ms'] = max(0.0, summary['avg_latency_ms'] - summary['avg_exec_ms'])
+        # Percentiles are bucket upper bounds (never above the observed max)
+        for label, q in (('p50_latency_ms', 0.50), ('p95_latency_ms', 0.95), ('p99_latency_ms', 0.99)):
+            value = self._percentile(stats, q)
+            summary[label] = min(value, stats['max_latency_ms']) if value is not None else None
+        return summary
+
+    def snapshot(self, plugin_name: str = None) -> dict:
+        """Returns {plugin: {'methods': {method: summary}, 'totals': summary, 'process': sample}}."""
+        with self._lock:
+            names = [plugin_name] if plugin_name is not None else sorted(set(self._calls) | set(self._process))
+            result = {}
+            for name in names:
+                methods = self._calls.get(name, {})
+                totals = self._new_method_stats()
+                for stats in methods.values():
+                    for key in ('calls', 'errors', 'timeouts', 'total_latency_ms', 'bytes_sent', 'bytes_received', 'total_exec_ms', 'exec_samples'): totals[key] += stats[key]
+                    for key in ('max_latency_ms', 'max_request_bytes', 'max_response_bytes'): totals[key] = max(totals[key], stats[key])
+                    totals['histogram'] = [a + b for a, b in zip(totals['histogram'], stats['histogram'])]
+                process = self._process.get(name)
+                result[name] = {'methods': {m: self._summarize(s) for m, s in methods.items()},
+                                'totals': self._summarize(totals),
+                                'process': dict(process) if process else None}
+            return result
+
+    def reset(self, plugin_name: str = None):
+        with self._lock:
+            if plugin_name is None: self._calls.clear(); self._process.clear()
+            else: self._calls.pop(plugin_name, None); self._process.pop(plugin_name, None)
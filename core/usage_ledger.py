@@ -0,0 +1,112 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+from core import logging
+from core.env import ROOT_DIR
+
+USAGE_LEDGER_PATH = ROOT_DIR / "storage" / "usage_ledger.sqlite3"
+DEFAULT_RETENTION_DAYS = 180
+
+# Columns summary() can group by; "day" is the call's local date
+GROUP_COLUMNS = {"api": "api", "model": "model", "plugin": "plugin", "conversation": "conversation",
+                 "day": "date(ts, 'unixepoch', 'localtime')"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    ts REAL NOT NULL,
+    api TEXT NOT NULL,
+    model TEXT NOT NULL DEFAULT '',
+    plugin TEXT NOT NULL DEFAULT '',
+    conversation TEXT NOT NULL DEFAULT '',
+    mode TEXT NOT NULL DEFAULT 'call',
+    ok INTEGER NOT NULL,
+    input_tokens INTEGER,
+    output_tokens INTEGER,
+    cached_tokens INTEGER,
+    reasoning_tokens INTEGER,
+    latency REAL,
+    ttft REAL,
+    finish_reason TEXT
+);
+CREATE INDEX IF NOT EXISTS calls_ts ON calls (ts);
+"""
+
+class UsageLedger:
+    """
+    Records one row per inference call (tokens, latency, time to first token, finish reason, success) in a
+    small SQLite file, storage/usage_ledger.sqlite3, and aggregates it for capacity planning and latency
+    regressions: summary(group_by=("api", "model")) and the like. Calls are attributed to the request's
+    "project_id" (conversation) and "plugin" (the UI or plugin the request came from, set by DataRouter).
+    Ledger failures are logged and never affect the call being recorded.
+    """
+    def __init__(self, path=USAGE_LEDGER_PATH, retention_days: Optional[float] = DEFAULT_RETENTION_DAYS):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.retention_days = retention_days
+        self._opened = False
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        # Caller holds the lock. Opened on first use; one connection shared by all threads under the lock.
+        if self._opened: return self._conn
+        self._opened = True
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            if self.retention_days:
+                conn.execute("DELETE FROM calls WHERE ts < ?", (time.time() - self.retention_days * 86400,))
+            self._conn = conn
+        except sqlite3.Error as e:
+            logging.logger.error(f"Usage ledger {self.path} unavailable, usage will not be recorded: {e}")
+        return self._conn
+
+    def record(self, api: str, model: Optional[str], usage: Optional[Dict[str, Any]] = None, latency: Optional[float] = None,
+               time_to_first_token: Optional[float] = None, finish_reason: Optional[str] = None, ok: bool = True,
+               plugin: Optional[str] = None, conversation: Optional[str] = None, mode: str = "call"):
+        """Adds one call. usage uses the normalized keys of api/inference_result.py."""
+        usage = usage or {}
+        row = (time.time(), api, model or "", plugin or "", str(conversation or ""), mode, int(bool(ok)),
+               usage.get("input_tokens"), usage.get("output_tokens"), usage.get("cached_tokens"), usage.get("reasoning_tokens"),
+               latency, time_to_first_token, finish_reason)
+        with self._lock:
+            conn = self._connection()
+            if conn is None: return
+            try:
+                conn.execute("INSERT INTO calls VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+            except sqlite3.Error as e:
+                logging.logger.warning(f"Could not record usage in {self.path}: {e}")
+
+    def summary(self, group_by: Iterable[str] = ("api", "model"), since: Optional[float] = None, until: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Aggregates per group (any of "api", "model", "plugin", "conversation", "day"): calls, errors, token
+        totals, average/max latency, average time to first token and average output tokens per second.
+        since/until are epoch seconds.
+        """
+        group_by = list(group_by)
+        unknown = [column for column in group_by if column not in GROUP_COLUMNS]
+        if unknown: raise ValueError(f"Cannot group usage by {unknown}; choose from {list(GROUP_COLUMNS)}.")
+        selected = [f"{GROUP_COLUMNS[column]} AS {column}" for column in group_by]
+        query = (f"SELECT {', '.join(selected + [''])}"
+                 "COUNT(*) AS calls, SUM(1 - ok) AS errors, "
+                 "SUM(input_tokens) AS input_tokens, SUM(output_tokens) AS output_tokens, SUM(cached_tokens) AS cached_tokens, "
+                 "AVG(CASE WHEN ok THEN latency END) AS avg_latency, MAX(CASE WHEN ok THEN latency END) AS max_latency, "
+                 "AVG(CASE WHEN ok THEN ttft END) AS avg_ttft, "
+                 "AVG(CASE WHEN ok AND output_tokens > 0 AND latency > COALESCE(ttft, 0) THEN output_tokens / (latency - COALESCE(ttft, 0)) END) AS avg_tokens_per_second "
+                 "FROM calls WHERE ts >= ? AND ts < ?")
+        if group_by: query += f" GROUP BY {', '.join(GROUP_COLUMNS[column] for column in group_by)} ORDER BY calls DESC"
+        with self._lock:
+            conn = self._connection()
+            if conn is None: return []
+            cursor = conn.execute(query, (since or 0, until or float("inf")))
+            columns = [description[0] for description in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None: self._conn.close()
+            self._conn = None; self._opened = False
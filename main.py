@@ -58,6 +58,7 @@ class MainWindow(QMainWindow):
         self.data_router.apiErrorOccurred.connect(self._handle_api_error)
         self.data_router.showMessageRequest.connect(self._handle_show_message)
         self.data_router.clearDisplayRequest.connect(self._handle_clear_display)
+        self.data_router.mapReduceProgress.connect(self._handle_map_reduce_progress)
 
         self._load_and_set_ui()
 
@@ -134,6 +135,14 @@ class MainWindow(QMainWindow):
         else:
              logging.logger.warning("Received clearDisplayRequest signal, but no UI instance is active.")
 
+    @pyqtSlot(dict)
+    def _handle_map_reduce_progress(self, progress: dict):
+        if self.current_ui_instance:
+            try:
+                self.current_ui_instance.handle_core_event("map_reduce_progress", progress)
+            except Exception as e:
+                logging.logger.exception(f"Error in UI instance ({type(self.current_ui_instance).__name__}) handling 'map_reduce_progress' event")
+
     def _load_ui_plugin(self, ui_plugin_name: str) -> Optional[UIBase]:
         logging.logger.info(f"Attempting to load configured UI plugin: '{ui_plugin_name}' from interfaces")
         ui_instance = None
@@ -258,6 +267,7 @@ def main():
         # Pass project_config to PluginManager
         plugin_manager = PluginManager(data_router, project_config)
         api_interface = APIInterface()
+        app.aboutToQuit.connect(api_interface.close) # Close pooled API connections on exit
 
         # --- Dummy ChatManager (TEMPORARY) ---
         # TODO: Replace with ProjectManager in Phase 3
@@ -86,6 +86,16 @@ class DefaultChatUI(QWidget, UIBase): # Changed from QMainWindow
             if icon_str == "question": icon = QMessageBox.Icon.Question
             if icon_str == "system": icon = QMessageBox.Icon.Information
             self._show_internal_message(message, title, icon)
+        elif event_type == "map_reduce_progress":
+            stage = data.get("stage")
+            if stage == "partial":
+                text = data.get("text", "")
+                preview = text if len(text) <= 500 else text[:500] + "..."
+                self._display_formatted_message(f"Part {data.get('index', 0) + 1}/{data.get('total')}: {preview}", "system")
+            elif stage == "map" and data.get("done") == 0:
+                self._display_formatted_message(f"Input is too long for one request; processing it in {data.get('total')} parts...", "system")
+            elif stage == "reduce" and data.get("done") == 0:
+                self._display_formatted_message("Combining the partial results...", "system")
         else:
              print(f"DefaultChatUI received unhandled event: {event_type}")
 
@@ -0,0 +1,10 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path: sys.path.insert(0, ROOT)
+
+from core import logging
+# Keep test runs out of storage/system.log (console output is still captured by pytest)
+logging.py_logging.getLogger().removeHandler(logging.file_handler)
+logging.file_handler.close()
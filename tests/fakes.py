@@ -0,0 +1,236 @@
+"""Local stand-ins for provider clients, so adapter behaviour can be tested without network access or API keys."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+# --- Plugin observers ---
+class FakeObserverCalls:
+    """
+    Builds calls for ObserverDispatcher.submit that record the order they ran in. While `gate` is cleared every
+    call blocks on it, like a slow plugin; `running` is set once one has started. `overlaps` counts calls of
+    the same plugin that ran at the same time.
+    """
+    def __init__(self):
+        self.ran = []
+        self.gate = threading.Event(); self.gate.set()
+        self.running = threading.Event()
+        self.overlaps = 0
+        self._busy = set()
+        self._lock = threading.Lock()
+
+    def call(self, plugin_name, label, result=None, error=None, duration=0.0):
+        def run():
+            with self._lock:
+                if plugin_name in self._busy: self.overlaps += 1
+                self._busy.add(plugin_name)
+            self.running.set()
+            self.gate.wait(10)
+            time.sleep(duration)
+            with self._lock: self.ran.append(label); self._busy.discard(plugin_name)
+            if error is not None: raise error
+            return result
+        return run
+
+# --- Gemini (google-genai) ---
+def gemini_part(text=None, thought=False, **fields):
+    return SimpleNamespace(text=text, thought=thought, **fields)
+
+def gemini_chunk(*parts, finish_reason=None, usage=None, model_version="gemini-test-001"):
+    candidate = SimpleNamespace(content=SimpleNamespace(parts=list(parts)), finish_reason=finish_reason)
+    return SimpleNamespace(candidates=[candidate], usage_metadata=usage, model_version=model_version)
+
+class FakeGeminiStream:
+    """What client.models.generate_content_stream returns: an iterator over chunks with close(). `error` is raised by the first read."""
+    def __init__(self, chunks, error=None):
+        self._chunks = iter(chunks)
+        self._error = error
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.closed: raise StopIteration
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+        return next(self._chunks)
+
+    def close(self):
+        self.closed = True
+
+class FakeGeminiModels:
+    def __init__(self):
+        self.stream_chunks = []
+        self.stream_errors = [] # Raised by the first read of the next streams, in turn (the SDK stream is lazy)
+        self.streams = []
+        self.calls = []
+
+    def generate_content_stream(self, model, contents, config):
+        self.calls.append({"model": model, "contents": contents, "config": config})
+        stream = FakeGeminiStream(self.stream_chunks, self.stream_errors.pop(0) if self.stream_errors else None)
+        self.streams.append(stream)
+        return stream
+
+class FakeGeminiCaches:
+    """client.caches: cached contents expiring `ttl` seconds after creation or update."""
+    def __init__(self, clock):
+        self.clock = clock
+        self.created = []
+        self.updated = []
+
+    def _cached(self, name, ttl):
+        return SimpleNamespace(name=name, expire_time=SimpleNamespace(timestamp=lambda: self.clock() + float(ttl.rstrip("s"))))
+
+    def create(self, model, config):
+        self.created.append({"model": model, "config": config})
+        return self._cached(f"cachedContents/{len(self.created)}", config.ttl)
+
+    def update(self, name, config):
+        self.updated.append(name)
+        return self._cached(name, config.ttl)
+
+class FakeGeminiFiles:
+    """client.files: records uploads; `delays` maps a file name to seconds its upload takes."""
+    def __init__(self, delays=None):
+        self.delays = delays or {}
+        self.uploaded = []
+        self.threads = set()
+        self._lock = threading.Lock()
+
+    def upload(self, file, config):
+        name = config.display_name
+        time.sleep(self.delays.get(name, 0))
+        with self._lock:
+            self.uploaded.append(name)
+            self.threads.add(threading.current_thread().name)
+            number = len(self.uploaded)
+        return SimpleNamespace(name=f"files/{number}", uri=f"https://files.test/{number}/{name}", mime_type=config.mime_type, expiration_time=None)
+
+class FakeGeminiClient:
+    def __init__(self, clock=time.time):
+        self.models = FakeGeminiModels()
+        self.caches = FakeGeminiCaches(clock)
+        self.files = FakeGeminiFiles()
+
+# --- OpenAI ---
+def openai_chunk(content=None, finish_reason=None, usage=None, model="gpt-test"):
+    choices = [] if content is None and finish_reason is None else [SimpleNamespace(index=0, finish_reason=finish_reason, delta=SimpleNamespace(content=content))]
+    return SimpleNamespace(choices=choices, usage=usage, model=model)
+
+class FakeOpenAIStreamResponse:
+    """
+    A streamed chat completion. With `hold_after`, iteration blocks after that many chunks, like a read waiting on
+    the socket, until close() is called; close() then makes the blocked read fail the way a closed connection does.
+    """
+    def __init__(self, chunks, hold_after=None):
+        self._chunks = list(chunks)
+        self._hold_after = hold_after
+        self._sent = 0
+        self._closed = threading.Event()
+        self.waiting = threading.Event() # Set while a read is blocked
+
+    @property
+    def closed(self):
+        return self._closed.is_set()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._hold_after is not None and self._sent >= self._hold_after:
+            self.waiting.set()
+            self._closed.wait(10)
+            raise ConnectionError("response closed while reading")
+        if self.closed: raise ConnectionError("response closed")
+        if self._sent >= len(self._chunks): raise StopIteration
+        self._sent += 1
+        return self._chunks[self._sent - 1]
+
+    def close(self):
+        self._closed.set()
+
+class FakeOpenAIClient:
+    def __init__(self, response):
+        self.requests = []
+        def create(**kwargs):
+            self.requests.append(kwargs)
+            return response
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+# --- Gemini File API, resumable protocol ---
+class StubResumableUploadServer:
+    """
+    Local HTTP server speaking the File API's resumable upload protocol (start/query/upload/finalize), for
+    ResumableUploader(base_url=server.url). Test hooks:
+      - `failures`: a list of (status, accepted_bytes) applied to the next upload commands in turn; the server
+        keeps `accepted_bytes` of the chunk and answers `status`, like a connection dropped mid-chunk;
+      - drop_sessions() forgets every session, as when the server expires them.
+    `chunks` records (session, offset, length) of every successful upload command, `commands` every command.
+    """
+    GRANULARITY = 256
+
+    def __init__(self):
+        self.sessions = {} # id -> {"size", "mime_type", "data"}
+        self.finished = {} # session id -> file bytes
+        self.failures = []
+        self.chunks = []
+        self.commands = []
+        self._lock = threading.Lock()
+        server = self
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args): pass
+            def do_POST(self): server._handle(self)
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown(); self._httpd.server_close()
+
+    def drop_sessions(self):
+        with self._lock: self.sessions.clear()
+
+    def _reply(self, handler, status, headers=None, body=b""):
+        handler.send_response(status)
+        for name, value in (headers or {}).items(): handler.send_header(name, value)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _handle(self, handler):
+        data = handler.rfile.read(int(handler.headers.get("Content-Length") or 0))
+        command = handler.headers.get("X-Goog-Upload-Command", "")
+        with self._lock:
+            self.commands.append(command)
+            if command == "start":
+                session_id = str(len(self.commands))
+                self.sessions[session_id] = {"size": int(handler.headers["X-Goog-Upload-Header-Content-Length"]),
+                                             "mime_type": handler.headers["X-Goog-Upload-Header-Content-Type"], "data": bytearray()}
+                return self._reply(handler, 200, {"X-Goog-Upload-URL": f"{self.url}/upload/sessions/{session_id}",
+                                                  "X-Goog-Upload-Chunk-Granularity": str(self.GRANULARITY)})
+            session_id = handler.path.rsplit("/", 1)[-1]
+            session = self.sessions.get(session_id)
+            if session is None: return self._reply(handler, 404)
+            if command == "query":
+                return self._reply(handler, 200, {"X-Goog-Upload-Status": "active", "X-Goog-Upload-Size-Received": str(len(session["data"]))})
+            offset = int(handler.headers["X-Goog-Upload-Offset"])
+            if offset != len(session["data"]): return self._reply(handler, 400)
+            if self.failures:
+                status, accepted = self.failures.pop(0)
+                session["data"] += data[:accepted]
+                return self._reply(handler, status)
+            session["data"] += data
+            self.chunks.append((session_id, offset, len(data)))
+            if "finalize" not in command: return self._reply(handler, 200, {"X-Goog-Upload-Status": "active"})
+            del self.sessions[session_id]
+            self.finished[session_id] = bytes(session["data"])
+            file_info = {"name": f"files/{session_id}", "uri": f"{self.url}/files/{session_id}", "mimeType": session["mime_type"],
+                         "expirationTime": "2030-01-01T00:00:00Z"}
+            self._reply(handler, 200, {"X-Goog-Upload-Status": "final"}, json.dumps({"file": file_info}).encode("utf-8"))
@@ -0,0 +1,45 @@
+import json
+import sys
+import types
+import pytest
+from core.api_interface import APIInterface
+
+API_NAME = "load_retry_test_api" # No such module under api/, so importing its adapter fails
+
+@pytest.fixture
+def api_dir(tmp_path):
+    api_path = tmp_path / API_NAME
+    api_path.mkdir()
+    (api_path / "api.py").write_text("", encoding="utf-8")
+    (api_path / "config.json").write_text(json.dumps({"generation_parameters": {}}), encoding="utf-8")
+    return tmp_path
+
+@pytest.fixture
+def interface(api_dir):
+    interface = APIInterface(api_dir=api_dir, manifest_path=None)
+    yield interface
+    interface.close()
+
+def install_adapter(monkeypatch):
+    module = types.ModuleType(f"api.{API_NAME}.api")
+    module.get_adapter_instance = lambda api_config, projects_base_path: types.SimpleNamespace(config=api_config)
+    monkeypatch.setitem(sys.modules, module.__name__, module)
+
+def test_failed_load_is_not_retried_within_the_interval(interface, monkeypatch):
+    with pytest.raises(RuntimeError, match="failed to load"): interface.get_adapter(API_NAME)
+    install_adapter(monkeypatch)
+    with pytest.raises(RuntimeError, match="failed to load"): interface.get_adapter(API_NAME)
+    assert interface.warm_up_adapter(API_NAME, wait=True) is False
+
+def test_failed_load_is_retried_after_the_interval(interface, monkeypatch):
+    assert interface.warm_up_adapter(API_NAME, wait=True) is False
+    install_adapter(monkeypatch) # e.g. the missing SDK was installed meanwhile
+    monkeypatch.setattr(interface, "LOAD_RETRY_INTERVAL", 0)
+    assert interface.warm_up_adapter(API_NAME, wait=True) is True
+    assert interface.get_adapter(API_NAME) is not None and API_NAME not in interface.load_errors
+
+def test_changed_config_clears_the_load_error_and_is_reread(interface, api_dir, monkeypatch):
+    with pytest.raises(RuntimeError): interface.get_adapter(API_NAME)
+    install_adapter(monkeypatch)
+    (api_dir / API_NAME / "config.json").write_text(json.dumps({"generation_parameters": {}, "fixed": True}), encoding="utf-8")
+    assert interface.get_adapter(API_NAME).config["fixed"] is True
@@ -0,0 +1,48 @@
+import json
+from core import batch_jobs
+from core.batch_jobs import BATCH_SUCCEEDED, BatchJobTracker
+
+class FakeBatchAdapter:
+    def __init__(self):
+        self.fetches = 0
+
+    def submit_batch(self, requests, display_name):
+        self.request_ids = [request_id for request_id, _ in requests]
+        return {"provider_job_id": "batches/1", "state": BATCH_SUCCEEDED}
+
+    def get_batch_status(self, provider_job_id):
+        return {"state": BATCH_SUCCEEDED}
+
+    def fetch_batch_results(self, provider_job_id):
+        self.fetches += 1
+        return {request_id: {"text": f"answer {request_id}"} for request_id in self.request_ids}
+
+    def cancel_batch(self, provider_job_id):
+        pass
+
+def tracker(root, adapter):
+    return BatchJobTracker(lambda api_name: adapter, root / "storage" / "batch_jobs.json", root / "storage" / "batch_results")
+
+def test_results_path_is_stored_relative_to_the_root_and_survives_a_move(tmp_path, monkeypatch):
+    adapter = FakeBatchAdapter()
+    monkeypatch.setattr(batch_jobs, "ROOT_DIR", tmp_path / "install")
+    job = tracker(tmp_path / "install", adapter).submit("gemini", {"a": {}, "b": {}})
+    results = tracker(tmp_path / "install", adapter).results(job["job_id"])
+    assert results == {"a": {"text": "answer a"}, "b": {"text": "answer b"}}
+    stored = json.loads((tmp_path / "install" / "storage" / "batch_jobs.json").read_text(encoding="utf-8"))
+    assert stored[job["job_id"]]["results_path"] == f"storage/batch_results/{job['job_id']}.json"
+    (tmp_path / "install").rename(tmp_path / "moved")
+    monkeypatch.setattr(batch_jobs, "ROOT_DIR", tmp_path / "moved")
+    assert tracker(tmp_path / "moved", adapter).results(job["job_id"]) == results
+    assert adapter.fetches == 1
+
+def test_absolute_results_path_from_an_older_job_list_is_still_read(tmp_path, monkeypatch):
+    adapter = FakeBatchAdapter()
+    monkeypatch.setattr(batch_jobs, "ROOT_DIR", tmp_path / "install")
+    jobs = tracker(tmp_path / "install", adapter)
+    job = jobs.submit("gemini", {"a": {}})
+    results_file = tmp_path / "elsewhere.json"
+    results_file.write_text(json.dumps({"a": {"text": "old"}}), encoding="utf-8")
+    jobs._jobs[job["job_id"]]["results_path"] = str(results_file)
+    assert jobs.results(job["job_id"]) == {"a": {"text": "old"}}
+    assert adapter.fetches == 0
@@ -0,0 +1,60 @@
+import threading
+from types import SimpleNamespace
+import pytest
+pytest.importorskip("openai")
+from api.chatgpt.api import ChatGPTAdapter
+from tests.fakes import FakeOpenAIClient, FakeOpenAIStreamResponse, openai_chunk
+
+REQUEST = {"model_name": "gpt-test", "temperature": 0.7, "top_p": 0.95, "max_output_tokens": 256,
+           "messages": [{"role": "user", "content": "Hello"}]}
+USAGE = {"prompt_tokens": 4, "completion_tokens": 3, "total_tokens": 7}
+
+@pytest.fixture
+def make_adapter(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    def make(response):
+        adapter = ChatGPTAdapter({}, "unused")
+        adapter.client = FakeOpenAIClient(response)
+        return adapter
+    return make
+
+def test_stream_yields_deltas_and_takes_usage_from_the_final_chunk(make_adapter):
+    response = FakeOpenAIStreamResponse([openai_chunk("  Hel"), openai_chunk("lo"), openai_chunk(finish_reason="stop"), openai_chunk(usage=SimpleNamespace(**USAGE))])
+    adapter = make_adapter(response)
+    stream = adapter.run_inference_stream(REQUEST)
+    assert list(stream) == ["Hel", "lo"]
+    assert stream.finish_reason == "stop"
+    assert stream.usage == USAGE
+    assert adapter.client.requests[0]["stream"] is True
+    assert adapter.client.requests[0]["stream_options"] == {"include_usage": True}
+    assert response.closed
+
+def test_stream_without_finish_reason_is_an_error(make_adapter):
+    stream = make_adapter(FakeOpenAIStreamResponse([openai_chunk("partial")])).run_inference_stream(REQUEST)
+    assert next(stream) == "partial"
+    with pytest.raises(ConnectionError):
+        next(stream)
+
+def test_cancel_closes_the_response_and_unblocks_a_waiting_read(make_adapter):
+    response = FakeOpenAIStreamResponse([openai_chunk("first "), openai_chunk("never sent")], hold_after=1)
+    stream = make_adapter(response).run_inference_stream(REQUEST)
+    assert next(stream) == "first "
+    received = []
+    reader = threading.Thread(target=lambda: received.extend(stream))
+    reader.start()
+    assert response.waiting.wait(5) # The reader is blocked waiting for the next chunk
+    stream.cancel() # Runs the on_cancel callback: response.close
+    reader.join(5)
+    assert not reader.is_alive()
+    assert response.closed
+    assert received == []
+    assert stream.finish_reason == "cancelled"
+    assert stream.text == "first"
+
+def test_cancel_before_the_request_is_sent_closes_the_response_at_once(make_adapter):
+    response = FakeOpenAIStreamResponse([openai_chunk("unused"), openai_chunk(finish_reason="stop")])
+    stream = make_adapter(response).run_inference_stream(REQUEST)
+    stream.cancel()
+    assert list(stream) == []
+    assert response.closed
+    assert stream.finish_reason == "cancelled"
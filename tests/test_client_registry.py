@@ -0,0 +1,19 @@
+import threading
+from api.client_registry import ClientRegistry
+
+def test_same_account_shares_one_client_and_no_background_thread_is_started():
+    registry = ClientRegistry()
+    threads_before = set(threading.enumerate())
+    first = registry.get("test", "key", "https://example.test/", lambda http_client: object())
+    assert registry.get("test", "key", "https://example.test", lambda http_client: object()) is first
+    assert registry.get("test", "other-key", None, lambda http_client: object()) is not first
+    assert set(threading.enumerate()) == threads_before # Idle connections expire inside httpx
+    registry.close_all()
+
+def test_stats_tolerate_clients_without_a_readable_pool():
+    registry = ClientRegistry()
+    registry.get("test", "key", None, lambda http_client: object())
+    with registry._lock:
+        for entry in registry._entries.values(): entry["http_client"] = object() # Pool internals laid out differently
+    [stats] = registry.stats().values()
+    assert stats["connections"] == 0 and stats["idle"] == 0
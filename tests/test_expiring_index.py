@@ -0,0 +1,50 @@
+import json
+import time
+from api.gemini.expiring_index import ExpiringIndex
+
+def entry(name, expires_in):
+    return {"name": name, "expires_at": time.time() + expires_in}
+
+def test_entry_within_the_expiry_margin_is_not_returned_but_kept(tmp_path):
+    index = ExpiringIndex(tmp_path / "index.json")
+    index.store("k", entry("caches/1", ExpiringIndex.EXPIRY_MARGIN / 2))
+    assert index.lookup("k") is None # Could expire while a request uses it
+    assert index.lookup("k", margin=0)["name"] == "caches/1" # Still valid, so it was not dropped
+
+def test_entry_outside_the_margin_is_returned_as_a_copy(tmp_path):
+    index = ExpiringIndex(tmp_path / "index.json")
+    index.store("k", entry("caches/1", 3600))
+    found = index.lookup("k")
+    found["name"] = "changed"
+    assert index.lookup("k")["name"] == "caches/1"
+
+def test_expired_entry_is_removed_on_lookup_and_from_disk(tmp_path):
+    path = tmp_path / "index.json"
+    index = ExpiringIndex(path)
+    index.store("live", entry("caches/1", 3600))
+    index.store("dead", entry("caches/2", 3600))
+    index._entries["dead"]["expires_at"] = time.time() - 1
+    assert index.lookup("dead", margin=0) is None
+    assert set(json.loads(path.read_text(encoding="utf-8"))) == {"live"}
+
+def test_entries_persist_across_instances_without_expired_ones(tmp_path):
+    path = tmp_path / "index.json"
+    path.write_text(json.dumps({"live": entry("caches/1", 3600), "dead": entry("caches/2", -10), "junk": "not an entry"}), encoding="utf-8")
+    index = ExpiringIndex(path)
+    assert index.lookup("live")["name"] == "caches/1"
+    assert index.lookup("dead", margin=0) is None and index.lookup("junk", margin=0) is None
+
+def test_store_prunes_expired_entries_and_remove_drops_by_name(tmp_path):
+    index = ExpiringIndex(tmp_path / "index.json")
+    index.store("a", entry("caches/1", 3600))
+    index.store("b", entry("caches/1", 3600))
+    index._entries["a"]["expires_at"] = time.time() - 1
+    index.store("c", entry("caches/2", 3600))
+    assert set(index._entries) == {"b", "c"}
+    index.remove("caches/1")
+    assert index.lookup("b") is None and index.lookup("c")["name"] == "caches/2"
+
+def test_unreadable_index_starts_empty(tmp_path):
+    path = tmp_path / "index.json"
+    path.write_text("{truncated", encoding="utf-8")
+    assert ExpiringIndex(path).lookup("anything") is None
@@ -0,0 +1,89 @@
+import time
+import pytest
+genai_types = pytest.importorskip("google.genai.types")
+from api.gemini.context_cache import GeminiContextCache
+from api.gemini.expiring_index import ExpiringIndex
+from tests.fakes import FakeGeminiClient
+
+MODEL = "models/gemini-test"
+SYSTEM = [{"role": "system", "content": "You are terse."}]
+
+class Clock:
+    def __init__(self): self.now = time.time()
+    def __call__(self): return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "time", clock)
+    return clock
+
+@pytest.fixture
+def make_cache(tmp_path, clock):
+    def make(client=None):
+        client = client or FakeGeminiClient(clock)
+        # Each test message is ~17 estimated tokens: two of them are enough for a cache, one is not
+        return GeminiContextCache(client, {"context_cache": {"min_tokens": 30, "ttl_seconds": 3600}}, ExpiringIndex(tmp_path / "cache.json"))
+    return make
+
+def conversation(turns):
+    sources = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i}: " + "x" * 60} for i in range(turns)]
+    contents = [{"role": "user" if s["role"] == "user" else "model", "parts": (genai_types.Part.from_text(text=s["content"]),)} for s in sources]
+    return contents, sources
+
+def prepare(cache, turns):
+    contents, sources = conversation(turns)
+    return cache.prepare(MODEL, contents, sources, None, SYSTEM), contents
+
+def test_long_prefix_is_cached_without_the_newest_turn(make_cache):
+    cache = make_cache()
+    (name, rest), contents = prepare(cache, 3)
+    assert name == "cachedContents/1"
+    assert rest == contents[2:]
+    assert len(cache.client.caches.created[0]["config"].contents) == 2
+
+def test_next_turn_reuses_the_cache_until_the_uncached_part_is_large(make_cache):
+    cache = make_cache()
+    prepare(cache, 3)
+    (name, rest), contents = prepare(cache, 4) # One new turn in the prefix (~17 tokens): below the minimum
+    assert name == "cachedContents/1" and rest == contents[2:]
+    (name, rest), contents = prepare(cache, 5) # Two new turns (~34 tokens): a longer cache is created
+    assert name == "cachedContents/2" and rest == contents[4:]
+    assert len(cache.client.caches.created) == 2
+
+def test_cache_is_reused_across_instances_through_the_index(make_cache):
+    first = make_cache()
+    prepare(first, 3)
+    (name, rest), contents = prepare(make_cache(first.client), 4)
+    assert name == "cachedContents/1" and rest == contents[2:]
+    assert len(first.client.caches.created) == 1
+
+def test_expired_cache_is_replaced(make_cache, clock):
+    cache = make_cache()
+    prepare(cache, 3)
+    clock.now += 3600 - ExpiringIndex.EXPIRY_MARGIN / 2 # Inside the expiry margin
+    (name, rest), contents = prepare(cache, 3)
+    assert name == "cachedContents/2"
+    assert len(cache.client.caches.created) == 2
+
+def test_cache_close_to_expiry_is_extended(make_cache, clock):
+    cache = make_cache()
+    prepare(cache, 3)
+    clock.now += 3600 * 0.8 # Less than a quarter of the TTL left, but outside the margin
+    (name, _), _ = prepare(cache, 3)
+    assert name == "cachedContents/1"
+    assert cache.client.caches.updated == ["cachedContents/1"]
+
+def test_small_conversations_are_not_cached(make_cache):
+    cache = make_cache()
+    contents, sources = conversation(3)
+    cache.min_tokens = 10000
+    assert cache.prepare(MODEL, contents, sources, None, SYSTEM) == (None, contents)
+    assert cache.client.caches.created == []
+
+def test_invalidated_cache_is_not_used_again(make_cache):
+    cache = make_cache()
+    prepare(cache, 3)
+    cache.invalidate("cachedContents/1")
+    (name, _), _ = prepare(cache, 3)
+    assert name == "cachedContents/2"
@@ -0,0 +1,58 @@
+import pytest
+pytest.importorskip("google.genai")
+from api.gemini.api import GeminiAdapter
+from tests.fakes import FakeGeminiClient, gemini_chunk, gemini_part
+
+REQUEST = {"model_name": "gemini-test", "temperature": 1.0, "top_p": 0.95, "top_k": 40, "max_output_tokens": 256,
+           "messages": [{"role": "user", "content": "Hello"}]}
+
+@pytest.fixture
+def adapter(monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    adapter = GeminiAdapter({"context_cache": {"enabled": False}}, "unused")
+    adapter.client = FakeGeminiClient()
+    adapter.context_cache = None
+    return adapter
+
+def deltas(adapter, chunk):
+    return list(adapter._chunk_text_deltas(chunk))
+
+def test_chunk_text_deltas_continue_the_open_part(adapter):
+    assert deltas(adapter, gemini_chunk(gemini_part("Hel"))) == [("Hel", False)]
+
+def test_chunk_text_deltas_split_parts_and_skip_thoughts_and_non_text(adapter):
+    chunk = gemini_chunk(gemini_part("a"), gemini_part("thinking", thought=True), gemini_part("b"), gemini_part(None, function_call={}), gemini_part("c"))
+    assert deltas(adapter, chunk) == [("a", False), ("b", True), ("c", True)]
+
+def test_chunk_text_deltas_fall_back_to_chunk_text(adapter):
+    from types import SimpleNamespace
+    assert deltas(adapter, SimpleNamespace(candidates=[], text="plain")) == [("plain", False)]
+    assert deltas(adapter, SimpleNamespace(candidates=None, text=None)) == []
+
+def test_stream_assembles_parts_across_chunks_and_reports_final_metadata(adapter):
+    adapter.client.models.stream_chunks = [
+        gemini_chunk(gemini_part("  Hello")), gemini_chunk(gemini_part(", world")),
+        gemini_chunk(gemini_part(None, function_call={}), gemini_part("Second part"), finish_reason="STOP", usage={"prompt_token_count": 3, "candidates_token_count": 5})]
+    stream = adapter.run_inference_stream(REQUEST)
+    assert list(stream) == ["Hello", ", world", "Second part"]
+    assert stream.finish_reason == "STOP"
+    assert stream.usage == {"prompt_token_count": 3, "candidates_token_count": 5}
+    assert stream.metadata["parts"] == ["  Hello, world", "Second part"]
+    assert adapter.client.models.streams[0].closed
+
+def test_cancel_stops_at_the_next_chunk_and_closes_the_sdk_stream(adapter):
+    adapter.client.models.stream_chunks = [gemini_chunk(gemini_part(f"chunk{i} ")) for i in range(10)]
+    stream = adapter.run_inference_stream(REQUEST)
+    assert next(stream) == "chunk0 "
+    stream.cancel()
+    assert list(stream) == []
+    assert stream.finish_reason == "CANCELLED"
+    assert stream.text == "chunk0"
+    assert adapter.client.models.streams[0].closed
+
+def test_closing_the_stream_early_closes_the_sdk_stream(adapter):
+    adapter.client.models.stream_chunks = [gemini_chunk(gemini_part(f"chunk{i} ")) for i in range(10)]
+    stream = adapter.run_inference_stream(REQUEST)
+    next(stream)
+    stream.close()
+    assert adapter.client.models.streams[0].closed
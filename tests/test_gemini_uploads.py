@@ -0,0 +1,121 @@
+import pytest
+pytest.importorskip("google.genai")
+from api.gemini import api as gemini_api
+from api.gemini.api import GeminiAdapter
+from api.gemini.expiring_index import ExpiringIndex
+from api.gemini.upload_manager import UploadService
+from tests.fakes import FakeGeminiClient, FakeGeminiFiles, gemini_chunk, gemini_part
+
+CONFIG = {"base64_upload_threshold": 16, "upload_concurrency": 4, "resumable_upload": {"enabled": False}}
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    client = FakeGeminiClient()
+    service = UploadService(client=client, config=dict(CONFIG), index=ExpiringIndex(tmp_path / "index.json"))
+    service.upload_dir = str(tmp_path)
+    yield service
+    service.close()
+
+def write(service, name, data):
+    with open(f"{service.upload_dir}/{name}", "wb") as f: f.write(data)
+
+def uris(parts):
+    return [part.file_data.file_uri for part in parts]
+
+def test_files_are_processed_concurrently_and_returned_in_list_order(service):
+    service.client.files = FakeGeminiFiles(delays={"a.pdf": 0.3, "b.pdf": 0.15, "c.pdf": 0})
+    for name in ("a.pdf", "b.pdf", "c.pdf"): write(service, name, name.encode() * 16)
+    parts = service.process_files(["a.pdf", "b.pdf", "c.pdf"])
+    assert [uri.rsplit("/", 1)[1] for uri in uris(parts)] == ["a.pdf", "b.pdf", "c.pdf"]
+    assert service.client.files.uploaded == ["c.pdf", "b.pdf", "a.pdf"] # Finished in reverse, on separate workers
+    assert len(service.client.files.threads) == 3
+
+def test_file_attached_twice_is_processed_once(service):
+    write(service, "a.pdf", b"a" * 64)
+    parts = service.process_files(["a.pdf", "a.pdf"])
+    assert service.client.files.uploaded == ["a.pdf"]
+    assert uris(parts)[0] == uris(parts)[1]
+
+def test_identical_bytes_under_another_name_reuse_the_upload(service):
+    write(service, "report.pdf", b"x" * 64)
+    write(service, "copy of report.pdf", b"x" * 64)
+    write(service, "other.pdf", b"y" * 64)
+    first = service.process_files(["report.pdf"])
+    assert service.process_files(["copy of report.pdf"]) == first
+    service.process_files(["other.pdf"])
+    assert service.client.files.uploaded == ["report.pdf", "other.pdf"]
+
+def test_small_files_are_sent_inline(service):
+    write(service, "tiny.png", b"png")
+    [part] = service.process_files(["tiny.png"])
+    assert part.inline_data.data == b"png" and part.inline_data.mime_type == "image/png"
+    assert service.client.files.uploaded == []
+
+def adapter_using(service, monkeypatch):
+    monkeypatch.setattr(gemini_api, "get_upload_service", lambda: service)
+    adapter = GeminiAdapter({"context_cache": {"enabled": False}}, "unused")
+    adapter.client = service.client
+    adapter.context_cache = None
+    return adapter
+
+class RecordingOptimizer:
+    def __init__(self):
+        self.models = []
+
+    def available(self):
+        return True
+
+    def optimize(self, file_path, mime_type, content_hash, model=None):
+        self.models.append(model)
+        return [(file_path, mime_type)]
+
+def test_adapter_sends_message_files_after_the_text_optimized_for_the_request_model(service, monkeypatch):
+    service.optimizer = RecordingOptimizer()
+    adapter = adapter_using(service, monkeypatch)
+    write(service, "scan.pdf", b"s" * 64)
+    adapter.client.models.stream_chunks = [gemini_chunk(gemini_part("ok"), finish_reason="STOP")]
+    request = {"model_name": "gemini-test", "messages": [{"role": "user", "content": "Summarize", "files": ["scan.pdf"]},
+                                                         {"role": "assistant", "content": "Done"},
+                                                         {"role": "user", "content": None, "files": ["scan.pdf"]}]}
+    assert list(adapter.run_inference_stream(request)) == ["ok"]
+    contents = adapter.client.models.calls[0]["contents"]
+    assert [part.text for part in contents[0]["parts"][:1]] == ["Summarize"]
+    assert uris(contents[0]["parts"][1:]) == uris(contents[2]["parts"])
+    assert service.optimizer.models == ["gemini-test", "gemini-test"]
+    assert service.client.files.uploaded == ["scan.pdf"]
+
+def test_missing_file_fails_the_request_before_any_upload(service, monkeypatch):
+    adapter = adapter_using(service, monkeypatch)
+    write(service, "here.pdf", b"h" * 64)
+    with pytest.raises(FileNotFoundError):
+        adapter._build_request({"model_name": "gemini-test", "messages": [{"role": "user", "content": "x", "files": ["here.pdf", "gone.pdf"]}]})
+    assert service.client.files.uploaded == []
+
+def test_file_rejected_by_the_api_is_forgotten_uploaded_again_and_the_call_retried_once(service, monkeypatch):
+    adapter = adapter_using(service, monkeypatch)
+    write(service, "scan.pdf", b"s" * 64)
+    write(service, "notes.pdf", b"n" * 64)
+    request = {"model_name": "gemini-test", "messages": [{"role": "user", "content": "Compare", "files": ["scan.pdf", "notes.pdf"]}]}
+    adapter.client.models.stream_chunks = [gemini_chunk(gemini_part("ok"), finish_reason="STOP")]
+    assert list(adapter.run_inference_stream(request)) == ["ok"]
+    stale_uri, kept_uri = uris(adapter.client.models.calls[0]["contents"][0]["parts"][1:])
+    stale_id = stale_uri.rsplit("/", 1)[1]
+    adapter.client.models.stream_errors = [RuntimeError(f"403 PERMISSION_DENIED. You do not have permission to access the File {stale_id} or it may not exist.")]
+    assert list(adapter.run_inference_stream(request)) == ["ok"]
+    failed, retried = (uris(call["contents"][0]["parts"][1:]) for call in adapter.client.models.calls[1:])
+    assert failed == [stale_uri, kept_uri]
+    assert retried[0] != stale_uri and retried[1] == kept_uri # Only the rejected file was uploaded again
+    first_uploads, reuploads = service.client.files.uploaded[:2], service.client.files.uploaded[2:]
+    assert sorted(first_uploads) == ["notes.pdf", "scan.pdf"] and reuploads == ["scan.pdf"] # The first two upload concurrently
+
+def test_unrelated_errors_and_a_second_file_error_are_not_retried(service, monkeypatch):
+    adapter = adapter_using(service, monkeypatch)
+    write(service, "scan.pdf", b"s" * 64)
+    request = {"model_name": "gemini-test", "messages": [{"role": "user", "content": "x", "files": ["scan.pdf"]}]}
+    adapter.client.models.stream_errors = [RuntimeError("500 INTERNAL")]
+    with pytest.raises(RuntimeError, match="500 INTERNAL"): list(adapter.run_inference_stream(request))
+    file_error = RuntimeError("404 NOT_FOUND. File not found.")
+    adapter.client.models.stream_errors = [file_error, file_error]
+    with pytest.raises(RuntimeError, match="File not found"): list(adapter.run_inference_stream(request))
+    assert len(adapter.client.models.calls) == 3 # One retry for the file error, none for the other
@@ -0,0 +1,152 @@
+import json
+import pytest
+from core import history_sync
+from core.history_sync import HistoryMirror, HistoryOutOfSync, HistorySnapshot, HistorySyncState, apply_history_delta
+from core.plugin_manager import PluginManager
+
+def messages(*contents):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": content} for i, content in enumerate(contents)]
+
+def sync_pair():
+    return HistorySyncState(), HistoryMirror()
+
+def send(state, mirror, chat_id, history, force_full=False):
+    delta = state.build_delta(HistorySnapshot(chat_id, history), force_full=force_full)
+    return delta, list(mirror.apply(delta))
+
+def mirror_contents(mirror):
+    return list(history_sync.LazyHistoryView(mirror.messages))
+
+# --- Host state and plugin mirror ---
+def test_first_call_is_a_full_snapshot():
+    state, mirror = sync_pair()
+    delta, view = send(state, mirror, "chat", messages("a", "b"))
+    assert delta["full"] and delta["version"] == 1
+    assert view == messages("a", "b") and mirror.version == 1
+
+def test_appended_messages_are_sent_as_a_delta():
+    state, mirror = sync_pair()
+    history = messages(*"abcdef")
+    send(state, mirror, "chat", history)
+    delta, view = send(state, mirror, "chat", history + messages("g"))
+    assert not delta["full"] and delta["base_version"] == 1 and delta["length"] == 7
+    assert [index for index, _ in delta["changes"]] == [6]
+    assert view == history + messages("g")
+
+def test_message_edited_in_place_is_the_only_change():
+    state, mirror = sync_pair()
+    history = messages(*"abcdef")
+    send(state, mirror, "chat", history)
+    edited = [dict(m) for m in history]
+    edited[2]["content"] = "C"
+    delta, view = send(state, mirror, "chat", edited)
+    assert not delta["full"] and delta["changes"] == [[2, edited[2]]]
+    assert view == edited
+
+def test_truncated_history_is_a_delta_with_a_shorter_length():
+    state, mirror = sync_pair()
+    history = messages(*"abcdef")
+    send(state, mirror, "chat", history)
+    delta, view = send(state, mirror, "chat", history[:4])
+    assert not delta["full"] and delta["length"] == 4 and delta["changes"] == []
+    assert view == history[:4]
+
+def test_more_than_the_resync_ratio_changed_sends_a_full_snapshot():
+    state, mirror = sync_pair()
+    history = messages(*"abcd")
+    send(state, mirror, "chat", history)
+    changed = messages("a", "B", "C", "D") # 3 of 4 changed, over FULL_RESYNC_RATIO
+    delta, view = send(state, mirror, "chat", changed)
+    assert delta["full"] and view == changed
+
+def test_chat_switch_and_forced_resync_send_full_snapshots():
+    state, mirror = sync_pair()
+    send(state, mirror, "chat-1", messages("a", "b"))
+    delta, view = send(state, mirror, "chat-2", messages("a", "b"))
+    assert delta["full"] and mirror.chat_id == "chat-2"
+    delta, _ = send(state, mirror, "chat-2", messages("a", "b"), force_full=True)
+    assert delta["full"] and mirror.version == 3
+
+def test_mirror_rejects_deltas_it_cannot_apply():
+    state, mirror = sync_pair()
+    send(state, mirror, "chat", messages("a", "b"))
+    with pytest.raises(HistoryOutOfSync): # Version gap: a delta was lost
+        mirror.apply({"full": False, "chat_id": "chat", "base_version": 5, "version": 6, "length": 2, "changes": []})
+    with pytest.raises(HistoryOutOfSync): # Other chat
+        mirror.apply({"full": False, "chat_id": "other", "base_version": 1, "version": 2, "length": 2, "changes": []})
+    with pytest.raises(HistoryOutOfSync): # Change past the end leaves a gap
+        mirror.apply({"full": False, "chat_id": "chat", "base_version": 1, "version": 2, "length": 4, "changes": [[3, {"content": "x"}]]})
+    with pytest.raises(HistoryOutOfSync): # Length does not match what the changes produce
+        mirror.apply({"full": False, "chat_id": "chat", "base_version": 1, "version": 2, "length": 3, "changes": []})
+    with pytest.raises(HistoryOutOfSync): # No mirror yet (e.g. the plugin restarted)
+        HistoryMirror().apply({"full": False, "chat_id": "chat", "base_version": 1, "version": 2, "length": 2, "changes": []})
+    assert mirror.version == 1 and mirror_contents(mirror) == messages("a", "b") # Rejected deltas leave the mirror as it was
+
+def test_views_handed_out_earlier_are_not_changed_by_later_deltas_or_by_plugins():
+    state, mirror = sync_pair()
+    history = messages("a", "b")
+    view = mirror.apply(state.build_delta(HistorySnapshot("chat", history)))
+    send(state, mirror, "chat", history + messages("c"))
+    view[0]["content"] = "changed by plugin"
+    assert len(view) == 2 and mirror_contents(mirror) == history + messages("c")
+
+def test_returned_history_round_trips_as_a_delta():
+    state, mirror = sync_pair()
+    history = messages("a", "b", "c")
+    view = mirror.apply(state.build_delta(HistorySnapshot("chat", history)))
+    returned = list(view)
+    returned[1] = {"role": "assistant", "content": "B"}
+    returned.append({"role": "assistant", "content": "d"})
+    history_delta = mirror.diff(view, returned)
+    assert history_delta == {"length": 4, "changes": [[1, returned[1]], [3, returned[3]]]}
+    assert apply_history_delta(history, history_delta) == returned
+    assert mirror.diff(view, view) == {"length": 3, "changes": []}
+    assert apply_history_delta(history, {"length": 1, "changes": []}) == history[:1]
+
+# --- Through a plugin process ---
+HISTORY_PLUGIN = '''class PluginBase:
+    def __init__(self, plugin_path, config):
+        self.config = config
+
+    def post_history(self, chat_history):
+        return list(chat_history) + [{"role": "assistant", "content": f"seen {len(chat_history)}"}]
+'''
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(PluginManager, "HEARTBEAT_INTERVAL", 30.0)
+    plugin_dir = tmp_path / "extensions" / "history"
+    plugin_dir.mkdir(parents=True)
+    (plugin_dir / "plugin.py").write_text(HISTORY_PLUGIN, encoding="utf-8")
+    (plugin_dir / "config.json").write_text(json.dumps({"name": "history", "hooks": {}}), encoding="utf-8")
+    (tmp_path / "interfaces").mkdir()
+    manager = PluginManager(None, {"plugins_interfaces_dir": str(tmp_path / "interfaces"), "plugins_extensions_dir": str(tmp_path / "extensions"),
+                                   "plugin_hot_reload": False})
+    sent = []
+    call_plugin_method = manager.call_plugin_method
+    def recording_call(plugin_name, method, params=None, timeout_override=None):
+        if isinstance(params, dict) and "history_sync" in params: sent.append(params["history_sync"])
+        return call_plugin_method(plugin_name, method, params, timeout_override)
+    monkeypatch.setattr(manager, "call_plugin_method", recording_call)
+    manager.sent_syncs = sent
+    yield manager
+    manager.stop_supervisor()
+    manager.shutdown_all_plugins()
+
+def call(manager, history):
+    return manager.call_plugin_with_history("history", "post_history", HistorySnapshot("chat", history), timeout_override=10)
+
+def test_plugin_gets_deltas_after_the_first_call_and_its_returned_delta_is_expanded(manager):
+    history = messages("a", "b")
+    assert call(manager, history) == history + [{"role": "assistant", "content": "seen 2"}]
+    longer = history + messages("c")
+    assert call(manager, longer) == longer + [{"role": "assistant", "content": "seen 3"}]
+    assert [sync["full"] for sync in manager.sent_syncs] == [True, False]
+
+def test_out_of_sync_mirror_gets_one_full_resync(manager):
+    history = messages("a", "b")
+    call(manager, history)
+    manager.plugin_procs["history"]["history_sync"].version += 5 # The host lost track of the mirror's version
+    longer = history + messages("c")
+    assert call(manager, longer) == longer + [{"role": "assistant", "content": "seen 3"}]
+    assert [sync["full"] for sync in manager.sent_syncs] == [True, False, True]
@@ -0,0 +1,62 @@
+import threading
+import pytest
+from core import map_reduce
+from core.deadline import Deadline
+from core.map_reduce import MapReduceJob
+
+SETTINGS = {"threshold_tokens": 50, "chunk_tokens": 40, "overlap_tokens": 0, "max_concurrency": 2, "requests_per_minute": None, "max_retries": 0}
+LONG_TEXT = "\n\n".join(f"Paragraph {i}: " + "word " * 30 for i in range(4))
+
+def conversation():
+    return [{"role": "system", "content": "Be brief."}, {"role": "user", "content": "Earlier question"},
+            {"role": "assistant", "content": "Earlier answer"}, {"role": "user", "content": LONG_TEXT}]
+
+class RecordingInfer:
+    def __init__(self):
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def __call__(self, request_data):
+        with self._lock: self.requests.append(request_data)
+        return "reduced" if "Below are the results" in request_data["messages"][-1]["content"] else "partial"
+
+def test_map_reduce_is_opt_in():
+    assert map_reduce.load_settings(None) is None
+    assert map_reduce.load_settings({"map_reduce": {"threshold_tokens": 1000}}) is None
+    assert map_reduce.load_settings({"map_reduce": {"enabled": True}})["threshold_tokens"] == map_reduce.DEFAULT_SETTINGS["threshold_tokens"]
+
+def test_map_calls_keep_system_messages_and_reduce_gets_the_conversation():
+    infer = RecordingInfer()
+    assert MapReduceJob(infer, {"model_name": "m", "messages": conversation()}, SETTINGS).run() == "reduced"
+    map_requests, [reduce_request] = infer.requests[:-1], infer.requests[-1:]
+    assert len(map_requests) > 1
+    assert all([m["content"] for m in r["messages"][:-1]] == ["Be brief."] for r in map_requests)
+    assert [m["content"] for m in reduce_request["messages"][:-1]] == ["Be brief.", "Earlier question", "Earlier answer"]
+
+def test_job_ignores_the_interactive_request_timeout_and_uses_its_own_budget():
+    infer = RecordingInfer()
+    base_request = {"model_name": "m", "messages": conversation(), "request_timeout": 0.5}
+    MapReduceJob(infer, base_request, SETTINGS).run()
+    assert all("request_timeout" not in r for r in infer.requests)
+    infer.requests.clear()
+    MapReduceJob(infer, base_request, dict(SETTINGS, time_budget=600)).run()
+    assert all(500 < r["request_timeout"] <= 600 for r in infer.requests)
+
+def test_expired_job_deadline_stops_the_job():
+    job = MapReduceJob(RecordingInfer(), {"messages": conversation()}, SETTINGS, deadline=Deadline(0.001))
+    job.deadline.expires_at = 0
+    with pytest.raises(map_reduce.DeadlineExceeded, match="Map-reduce time budget"): job.run()
+
+def test_media_duration_is_probed_once_per_file_version(tmp_path, monkeypatch):
+    probes = []
+    monkeypatch.setattr(map_reduce.shutil, "which", lambda name: "/usr/bin/ffprobe" if name == "ffprobe" else None)
+    monkeypatch.setattr(map_reduce.subprocess, "run", lambda args, **kwargs: probes.append(args[-1]) or type("Result", (), {"stdout": "12.5\n"})())
+    map_reduce._probe_duration.cache_clear()
+    path = tmp_path / "talk.mp3"
+    path.write_bytes(b"a" * 10)
+    assert map_reduce.media_duration(str(path)) == map_reduce.media_duration(str(path)) == 12.5
+    assert len(probes) == 1
+    path.write_bytes(b"b" * 20) # Replaced: new size, so probed again
+    map_reduce.media_duration(str(path))
+    assert len(probes) == 2
+    assert map_reduce.media_duration(str(tmp_path / "missing.mp3")) is None
@@ -0,0 +1,71 @@
+import time
+import pytest
+from core.observer_dispatcher import ObserverDispatcher
+from tests.fakes import FakeObserverCalls
+
+def is_error(result):
+    return isinstance(result, dict) and "error" in result
+
+@pytest.fixture
+def calls():
+    return FakeObserverCalls()
+
+@pytest.fixture
+def make_dispatcher():
+    dispatchers = []
+    def make(**kwargs):
+        dispatchers.append(ObserverDispatcher(is_error=is_error, **kwargs))
+        return dispatchers[-1]
+    yield make
+    for dispatcher in dispatchers: dispatcher.shutdown(wait=True)
+
+def wait_idle(dispatcher, timeout=10):
+    deadline = time.monotonic() + timeout
+    while dispatcher.pending_count() and time.monotonic() < deadline: time.sleep(0.005)
+    assert dispatcher.pending_count() == 0
+
+def test_full_queue_drops_new_notifications_and_counts_them(make_dispatcher, calls):
+    dispatcher = make_dispatcher(max_workers=1, max_pending=2)
+    calls.gate.clear() # The first observer blocks, like a slow plugin
+    assert dispatcher.submit("slow", "post_history", calls.call("slow", "slow-1"))
+    assert calls.running.wait(5)
+    assert dispatcher.submit("slow", "post_history", calls.call("slow", "slow-2"))
+    assert not dispatcher.submit("slow", "post_history", calls.call("slow", "slow-3"))
+    assert not dispatcher.submit("other", "post_api", calls.call("other", "other-1")) # The bound is shared by all plugins
+    assert dispatcher.pending_count() == 2
+    calls.gate.set()
+    wait_idle(dispatcher)
+    assert calls.ran == ["slow-1", "slow-2"] # Queued ones still run; only the overflow is dropped
+    slow = dispatcher.snapshot("slow")
+    assert (slow["submitted"], slow["completed"], slow["dropped"], slow["errors"]) == (2, 2, 1, 0)
+    assert dispatcher.snapshot("other")["dropped"] == 1
+    assert dispatcher.submit("other", "post_api", calls.call("other", "other-2")) # Room again once drained
+    wait_idle(dispatcher)
+
+def test_each_plugin_sees_its_notifications_one_at_a_time_in_order(make_dispatcher, calls):
+    dispatcher = make_dispatcher(max_workers=4, max_pending=100)
+    for turn in range(15):
+        for plugin_name in ("a", "b", "c"):
+            assert dispatcher.submit(plugin_name, "post_history", calls.call(plugin_name, (plugin_name, turn), duration=0.001))
+    wait_idle(dispatcher)
+    for plugin_name in ("a", "b", "c"):
+        assert [turn for name, turn in calls.ran if name == plugin_name] == list(range(15))
+    assert calls.overlaps == 0
+
+def test_a_failing_observer_is_isolated_and_counted(make_dispatcher, calls):
+    dispatcher = make_dispatcher(max_workers=2, max_pending=10)
+    assert dispatcher.submit("broken", "post_api", calls.call("broken", "raises", error=RuntimeError("host-side bug"))) # Never raised to the caller
+    assert dispatcher.submit("broken", "post_api", calls.call("broken", "error result", result={"error": {"message": "plugin failed"}}))
+    assert dispatcher.submit("broken", "post_api", calls.call("broken", "after errors"))
+    assert dispatcher.submit("healthy", "post_api", calls.call("healthy", "healthy"))
+    wait_idle(dispatcher)
+    assert sorted(calls.ran) == sorted(["raises", "error result", "after errors", "healthy"])
+    broken = dispatcher.snapshot("broken")
+    assert (broken["completed"], broken["errors"], broken["last_error"]) == (3, 2, "plugin failed")
+    assert dispatcher.snapshot("healthy")["errors"] == 0
+
+def test_notifications_after_shutdown_are_dropped(make_dispatcher, calls):
+    dispatcher = make_dispatcher()
+    dispatcher.shutdown(wait=True)
+    assert not dispatcher.submit("late", "post_api", calls.call("late", "late"))
+    assert calls.ran == [] and dispatcher.snapshot("late")["dropped"] == 1
@@ -0,0 +1,73 @@
+import json
+import time
+import pytest
+from core.plugin_manager import PluginManager
+
+CRASHING_PLUGIN = '''import os
+
+class PluginBase:
+    def __init__(self, plugin_path, config):
+        self.config = config
+
+    def echo(self, payload):
+        return payload
+
+    def crash(self):
+        os._exit(1)
+'''
+
+UI_PLUGIN = '''raise ImportError("UI plugins are loaded by the application, never by the executor")
+'''
+
+def _write_plugin(directory, source, config):
+    directory.mkdir(parents=True)
+    (directory / "plugin.py").write_text(source, encoding="utf-8")
+    (directory / "config.json").write_text(json.dumps(config), encoding="utf-8")
+
+def _wait_for(predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate(): return True
+        time.sleep(0.01)
+    return False
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    # A heartbeat far longer than the restart backoff: a restart must not wait for the next heartbeat
+    monkeypatch.setattr(PluginManager, "HEARTBEAT_INTERVAL", 30.0)
+    _write_plugin(tmp_path / "extensions" / "echo", CRASHING_PLUGIN, {"name": "echo", "hooks": {}})
+    _write_plugin(tmp_path / "interfaces" / "ui", UI_PLUGIN, {"name": "ui"})
+    manager = PluginManager(None, {"plugins_interfaces_dir": str(tmp_path / "interfaces"), "plugins_extensions_dir": str(tmp_path / "extensions"),
+                                   "plugin_hot_reload": False})
+    yield manager
+    manager.stop_supervisor()
+    manager.shutdown_all_plugins()
+
+def ping_ok(manager, name):
+    return manager.is_plugin_healthy(name) and not PluginManager.is_error_result(manager.call_plugin_method(name, "echo", {"payload": "ok"}, 2))
+
+def test_restart_runs_at_its_backoff_not_the_next_heartbeat(manager):
+    assert _wait_for(lambda: ping_ok(manager, "echo"), 10)
+    crashed_at = time.monotonic()
+    manager.call_plugin_method("echo", "crash", None, 2)
+    assert _wait_for(lambda: not manager.is_plugin_healthy("echo"), 5)
+    assert _wait_for(lambda: ping_ok(manager, "echo"), 10)
+    recovered_in = time.monotonic() - crashed_at
+    assert recovered_in < manager.RESTART_BACKOFF_BASE + 2.0
+    assert manager.get_plugin_health("echo")['restart_count'] == 1
+
+def test_interface_plugin_without_main_class_is_not_spawned_or_supervised(manager):
+    assert not manager.has_executor_entry_point("ui")
+    assert manager.get_plugin_type("ui") == "interface"
+    assert manager.get_plugin("ui") is None
+    assert manager.get_plugin_health("ui") is None
+    assert manager.has_executor_entry_point("echo")
+
+def test_heartbeats_are_not_counted_as_plugin_calls(manager):
+    assert _wait_for(lambda: ping_ok(manager, "echo"), 10)
+    manager.reset_plugin_metrics("echo")
+    for _ in range(3): manager._check_plugin_health("echo")
+    metrics = manager.get_plugin_metrics("echo")["echo"]
+    assert "ping" not in metrics["methods"]
+    assert metrics["totals"]["calls"] == 0
+    assert metrics["health"]["heartbeat_latency_ms"] is not None
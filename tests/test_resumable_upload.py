@@ -0,0 +1,84 @@
+import os
+import urllib.error
+import pytest
+from api.gemini.expiring_index import ExpiringIndex
+from api.gemini.resumable_upload import ResumableUploader
+from tests.fakes import StubResumableUploadServer
+
+CONFIG = {"resumable_upload": {"threshold": 0, "chunk_size": 1024, "max_retries": 2, "timeout": 5}}
+DATA = os.urandom(3000) # Three chunks: 1024, 1024, 952
+
+class Crash(Exception):
+    pass
+
+@pytest.fixture
+def server():
+    with StubResumableUploadServer() as server: yield server
+
+@pytest.fixture
+def upload_file(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(DATA)
+    return str(path)
+
+def uploader(server, tmp_path, **settings):
+    config = {"resumable_upload": dict(CONFIG["resumable_upload"], **settings)}
+    uploader = ResumableUploader("test-key", config, server.url, ExpiringIndex(tmp_path / "sessions.json"))
+    uploader.RETRY_BACKOFF_BASE = 0
+    return uploader
+
+def test_upload_is_sent_in_chunks_and_returns_the_file(server, tmp_path, upload_file):
+    progress = []
+    result = uploader(server, tmp_path).upload(upload_file, "video/mp4", "key", progress=lambda sent, total: progress.append(sent))
+    assert list(server.finished.values()) == [DATA]
+    assert [(offset, length) for _, offset, length in server.chunks] == [(0, 1024), (1024, 1024), (2048, 952)]
+    assert progress == [0, 1024, 2048, 3000]
+    assert result["name"].startswith("files/") and result["mime_type"] == "video/mp4" and result["expires_at"]
+    assert ExpiringIndex(tmp_path / "sessions.json").lookup("key") is None # Finished sessions are forgotten
+
+def test_upload_interrupted_by_a_restart_resumes_at_the_server_offset(server, tmp_path, upload_file):
+    def crash_after_first_chunk(sent, total):
+        if sent >= 1024: raise Crash()
+    with pytest.raises(Crash):
+        uploader(server, tmp_path).upload(upload_file, "video/mp4", "key", progress=crash_after_first_chunk)
+    uploader(server, tmp_path).upload(upload_file, "video/mp4", "key") # New instance: session comes from disk
+    assert server.commands.count("start") == 1
+    assert [offset for _, offset, _ in server.chunks] == [0, 1024, 2048] # No byte sent twice
+    assert list(server.finished.values()) == [DATA]
+
+def test_failed_chunk_is_retried_from_what_the_server_received(server, tmp_path, upload_file):
+    server.failures = [(503, 256)] # First chunk: 256 bytes arrive, then the request fails
+    uploader(server, tmp_path).upload(upload_file, "video/mp4", "key")
+    assert "query" in server.commands
+    assert [(offset, length) for _, offset, length in server.chunks] == [(256, 1024), (1280, 1024), (2304, 696)]
+    assert list(server.finished.values()) == [DATA]
+
+def test_chunk_failing_past_max_retries_fails_the_upload(server, tmp_path, upload_file):
+    server.failures = [(503, 0)] * 3
+    with pytest.raises(urllib.error.HTTPError):
+        uploader(server, tmp_path, max_retries=2).upload(upload_file, "video/mp4", "key")
+    assert server.finished == {}
+
+def test_chunk_rejected_with_a_client_error_is_not_retried(server, tmp_path, upload_file):
+    server.failures = [(403, 0)]
+    with pytest.raises(urllib.error.HTTPError):
+        uploader(server, tmp_path).upload(upload_file, "video/mp4", "key")
+    assert "query" not in server.commands
+
+def test_stored_session_unknown_to_the_server_starts_over(server, tmp_path, upload_file):
+    def crash_after_first_chunk(sent, total):
+        if sent >= 1024: raise Crash()
+    with pytest.raises(Crash):
+        uploader(server, tmp_path).upload(upload_file, "video/mp4", "key", progress=crash_after_first_chunk)
+    server.drop_sessions()
+    uploader(server, tmp_path).upload(upload_file, "video/mp4", "key")
+    assert server.commands.count("start") == 2
+    assert list(server.finished.values()) == [DATA]
+
+def test_session_lost_mid_upload_restarts_once(server, tmp_path, upload_file):
+    dropped = []
+    def drop_after_first_chunk(sent, total):
+        if sent >= 1024 and not dropped: dropped.append(sent); server.drop_sessions()
+    uploader(server, tmp_path).upload(upload_file, "video/mp4", "key", progress=drop_after_first_chunk)
+    assert server.commands.count("start") == 2
+    assert list(server.finished.values()) == [DATA]
@@ -0,0 +1,56 @@
+import pytest
+pytest.importorskip("PyQt6")
+from core.api_interface import APIInterface
+from core.data_router import DataRouter
+from core.usage_ledger import UsageLedger
+
+class FakeChatManager:
+    current_file = "chat-1"
+
+    def __init__(self):
+        self.history = []
+
+    def append_message(self, message):
+        self.history.append(message)
+
+    def get_chat_history(self):
+        return list(self.history)
+
+class FakePluginManager:
+    """A plugin manager with no hook subscribers."""
+    HOOK_MUTATE, HOOK_OBSERVE = "mutate", "observe"
+
+    def __init__(self, project_config):
+        self.project_config = project_config
+
+    def get_hook_subscribers(self, hook_name, mode):
+        return []
+
+    def warm_up_hook_subscribers(self, hook_names):
+        pass
+
+@pytest.fixture
+def router(tmp_path):
+    api_interface = APIInterface(manifest_path=None)
+    api_interface.usage_ledger = UsageLedger(tmp_path / "usage.sqlite3")
+    router = DataRouter()
+    router.api_interface, router.chat_manager = api_interface, FakeChatManager()
+    router.active_api_name, router.active_model_name = "stub", "stub-fast"
+    yield router
+    api_interface.usage_ledger.close()
+
+def run_turn(router, text, **kwargs):
+    router.handle_user_input(text, **kwargs)
+    router.threadpool.waitForDone(30000)
+
+def test_chat_turns_are_attributed_to_the_selected_ui(router):
+    router.plugin_manager = FakePluginManager({"selected_ui": "default_chat_ui"})
+    run_turn(router, "Hello")
+    summary = router.api_interface.usage_summary(group_by=("plugin",))
+    assert [(row["plugin"], row["calls"]) for row in summary] == [("default_chat_ui", 1)]
+
+def test_explicit_origin_is_recorded_and_the_default_without_a_plugin_manager_is_chat(router):
+    run_turn(router, "Hello")
+    run_turn(router, "Summarize this", origin="summarizer")
+    summary = router.api_interface.usage_summary(group_by=("plugin",))
+    assert sorted((row["plugin"], row["calls"]) for row in summary) == [("chat", 1), ("summarizer", 1)]